@@ -0,0 +1,72 @@
+import click
+from frappe.commands import get_site, pass_context
+
+
+@click.command("rebuild-dahua-event-index")
+@click.option("--device", help="Dahua device SN (default: all devices)")
+@click.option("--month", help="Month as YYYY-MM (default: all months)")
+@pass_context
+def rebuild_dahua_event_index(context, device=None, month=None):
+    """Rebuild the Bloom-filter index of stored Dahua event ids."""
+    import frappe
+    from jazira_app.dahua.event_index import event_index
+
+    site = get_site(context)
+    frappe.init(site=site)
+    frappe.connect()
+    try:
+        counts = event_index.rebuild(device_sn=device, month=month)
+        for name in sorted(counts):
+            click.echo(f"{name}: {counts[name]} events")
+        click.echo(f"Rebuilt {len(counts)} partition(s)")
+    finally:
+        frappe.destroy()
+
+
+@click.command("bench-dahua")
+@click.option("--mode", type=click.Choice(["direct", "http"]), default="direct")
+@click.option("--devices", type=int, default=3, help="Simulated devices")
+@click.option("--events", type=int, default=1000, help="Total events")
+@click.option("--concurrency", type=int, default=4, help="Worker threads")
+@click.option("--batch", type=int, default=1, help="Events per request (>1 uses the batch endpoint)")
+@click.option("--employees", type=int, default=20, help="Distinct UserIDs")
+@click.option("--company", help="Company for the BENCH-* devices and employees")
+@click.option("--url", help="Site URL for http mode")
+@click.option("--secret", help="X-DAHUA-SECRET for http mode")
+@click.option("--fake-redis", is_flag=True, help="Use an in-process fakeredis server")
+@click.option("--keep", is_flag=True, help="Keep the inserted checkins")
+@pass_context
+def bench_dahua(context, **kwargs):
+    """Load-test the Dahua webhook ingest path (use a test site)."""
+    import frappe
+    from jazira_app.dahua import benchmark
+
+    site = get_site(context)
+    frappe.init(site=site)
+    frappe.connect()
+    try:
+        click.echo(frappe.as_json(benchmark.run(**kwargs)))
+    finally:
+        frappe.destroy()
+
+
+@click.command("bench-sales-import")
+@click.option("--rows", type=int, default=50000, help="Rows in the generated sales report")
+@pass_context
+def bench_sales_import(context, rows=50000):
+    """Benchmark the daily sales import parsers and date loop (time and peak memory)."""
+    import frappe
+    from jazira_app.jazira_app.utils.benchmark import benchmark_excel_parsers, benchmark_date_loop
+
+    site = get_site(context)
+    frappe.init(site=site)
+    frappe.connect()
+    try:
+        report = benchmark_excel_parsers(rows)
+        report["date_loop"] = benchmark_date_loop(rows)
+        click.echo(frappe.as_json(report))
+    finally:
+        frappe.destroy()
+
+
+commands = [rebuild_dahua_event_index, bench_dahua, bench_sales_import]
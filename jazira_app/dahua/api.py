@@ -2,19 +2,34 @@
 Dahua Access Control Webhook API for ERPNext HRMS
 
 Endpoint: /api/method/jazira_app.dahua.api.receive_event
+Batch:    /api/method/jazira_app.dahua.api.receive_events_batch
 
 This module handles webhook events from Dahua access control devices and creates
 Employee Checkin records in ERPNext HRMS. It supports:
 - Standard IN/OUT (AttendanceState 1, 2)
 - Temporary OUT/RETURN (AttendanceState 5, 3)
-- Dual-layer deduplication (Redis + DB unique constraint)
+- Dual-layer deduplication (atomic Redis claim + DB unique constraint)
+- Bloom-filter event index for offline replays (see event_index.py)
 - Multi-company device mapping
+- Batch ingestion for Offline replays (bulk insert, one commit)
+- Two-tier device/employee resolution cache (see cache.py)
+- Optional async ingest mode (Redis queue + scheduled consumer)
+- Optional checkin write-behind buffer (Redis list + periodic bulk flush)
+- Sampled per-stage latency metrics (see metrics.py) and per-device debug logs
 """
 
+import time
+
 import frappe
 from frappe import _
+from frappe.utils import cint, get_datetime, now_datetime
 from datetime import datetime
-import pytz
+
+from jazira_app.dahua import metrics
+from jazira_app.dahua.cache import resolution_cache
+from jazira_app.dahua.event_index import event_index
+from jazira_app.dahua.queue import RedisQueue
+from jazira_app.jazira_app.services.timezone_service import timezone_service
 
 
 # =============================================================================
@@ -34,22 +49,68 @@ STATE_MAPPING = {
 VALID_STATES = frozenset({1, 2, 3, 5})
 TEMP_STATES = frozenset({3, 5})  # States accepted via Pulse (not just Offline)
 
-# Redis cache settings
+# Redis dedup settings
 CACHE_PREFIX = "dahua:event:"
-CACHE_TTL = 120  # seconds
+CACHE_TTL = 7 * 24 * 3600  # seconds, default window; override with "dahua_dedup_ttl"
+DEDUP_SINCE_KEY = "dahua:dedup:since"  # when Redis started holding dedup keys
+
+# Batch ingestion limits (offline replays arrive in bursts of a few hundred)
+MAX_BATCH_SIZE = 1000
+
+# Async ingest mode (site_config: "dahua_async_ingest": 1)
+INGEST_QUEUE_KEY = "dahua:ingest"
+INGEST_BATCH_SIZE = 200  # override with "dahua_ingest_batch_size"
+INGEST_MAX_SECONDS = 50  # per scheduler run, keeps the job under the 1 min cron
+
+ingest_queue = RedisQueue(INGEST_QUEUE_KEY)
+
+# Checkin write-behind buffer (site_config: "dahua_write_behind": 1)
+CHECKIN_BUFFER_KEY = "dahua:checkin_buffer"
+FLUSH_SIZE = 500  # rows per bulk insert, override with "dahua_flush_size"
+
+checkin_buffer = RedisQueue(CHECKIN_BUFFER_KEY)
+
+# Employee Checkin columns written by the bulk insert path
+CHECKIN_FIELDS = (
+    "employee",
+    "employee_name",
+    "time",
+    "log_type",
+    "device_id",
+    "dahua_event_id",
+    "dahua_attendance_state",
+    "checkin_source",
+    "checkin_reason",
+    "shift",
+    "shift_start",
+    "shift_end",
+    "shift_actual_start",
+    "shift_actual_end",
+)
 
 
 # =============================================================================
-# DEBUG LOGGING (set to False in production)
+# DEBUG LOGGING (opt-in per device)
 # =============================================================================
 
-DEBUG_MODE = True  # Set to False in production
-
-def _debug_log(message: str):
-    """Log debug message if DEBUG_MODE is enabled."""
-    if DEBUG_MODE:
-        frappe.logger().info(f"[DAHUA DEBUG] {message}")
-        print(f"[DAHUA DEBUG] {message}")
+def _debug_log(message: str, *args, sn: str | None = None):
+    """
+    Log a debug message for devices listed in site_config.json:
+    
+        "dahua_debug_devices": ["BE0FE78PAJD287F"]   (or "*" for all devices)
+    
+    Arguments are formatted lazily (logging %-style), so on devices without
+    debugging a call costs one config lookup.
+    """
+    devices = frappe.conf.get("dahua_debug_devices")
+    if not devices:
+        return
+    
+    sn = sn or getattr(frappe.local, "dahua_sn", None)
+    if devices != "*" and sn not in devices:
+        return
+    
+    frappe.logger("dahua").info("[DAHUA DEBUG] [%s] " + message, sn, *args)
 
 
 # =============================================================================
@@ -77,13 +138,25 @@ def receive_event():
         "Index": 0
     }
     
+    In async ingest mode the event is only validated, deduplicated in Redis
+    and queued; drain_ingest_queue writes it to Employee Checkin.
+    
     Returns:
-        HTTP 200: Event processed successfully
+        HTTP 200: Event processed successfully (or queued in async mode)
         HTTP 202: Event intentionally ignored (filtered)
         HTTP 400: Invalid JSON
         HTTP 401: Invalid secret (if configured)
         HTTP 500: Server error
     """
+    metrics.begin()
+    try:
+        return _receive_event()
+    finally:
+        metrics.end()
+
+
+def _receive_event() -> dict:
+    """Body of receive_event (timed by metrics.begin/end)."""
     # Optional secret validation
     if not _validate_secret():
         frappe.local.response.http_status_code = 401
@@ -91,7 +164,8 @@ def receive_event():
     
     # Parse JSON payload
     try:
-        data = frappe.request.get_json(force=True)
+        with metrics.stage("parse"):
+            data = frappe.request.get_json(force=True)
     except Exception as e:
         frappe.local.response.http_status_code = 400
         return {"error": "Invalid JSON", "detail": str(e)}
@@ -100,18 +174,25 @@ def receive_event():
         frappe.local.response.http_status_code = 400
         return {"error": "Empty payload"}
     
-    _debug_log(f"Raw payload: {data}")
+    _debug_log("Raw payload: %s", data, sn=_payload_sn(data))
+    
+    # Accept fast, persist later (drain_ingest_queue)
+    if _async_ingest_enabled():
+        return _enqueue_event(data)
     
     # Process the single event (Dahua sends one event per request)
     try:
         result = _process_event(data)
         if result:
-            frappe.db.commit()
+            with metrics.stage("commit"):
+                frappe.db.commit()
             return {"status": "processed", "message": "Checkin created"}
         else:
             frappe.local.response.http_status_code = 202
             return {"status": "ignored"}
     except Exception as e:
+        # Also releases the event's claim, so the device retry is stored
+        frappe.db.rollback()
         frappe.log_error(
             title="Dahua Event Processing Error",
             message=f"Payload: {data}\nError: {str(e)}"
@@ -120,6 +201,80 @@ def receive_event():
         return {"error": str(e)}
 
 
+@frappe.whitelist(allow_guest=True)
+def receive_events_batch():
+    """
+    Batch webhook endpoint for Dahua Access Control events.
+    
+    Endpoint: /api/method/jazira_app.dahua.api.receive_events_batch
+    
+    Accepts a JSON array of payloads in the same shape as receive_event
+    (or {"events": [...]}). Devices and employees are resolved once per
+    batch, duplicates are filtered in a single Redis + DB round trip and
+    the checkins are written with one multi-row insert and one commit.
+    
+    Returns:
+        HTTP 200: {"status": "ok", "processed": n, "results": [...]}
+            where results[i] describes payload i:
+            {"index": i, "status": "processed|duplicate|ignored", "reason": ..., "event_id": ...}
+        HTTP 400: Invalid JSON / not a list
+        HTTP 401: Invalid secret (if configured)
+        HTTP 413: More than MAX_BATCH_SIZE events
+        HTTP 500: Server error
+    """
+    metrics.begin()
+    try:
+        return _receive_events_batch()
+    finally:
+        metrics.end()
+
+
+def _receive_events_batch() -> dict:
+    """Body of receive_events_batch (timed by metrics.begin/end)."""
+    if not _validate_secret():
+        frappe.local.response.http_status_code = 401
+        return {"error": "Unauthorized"}
+    
+    try:
+        with metrics.stage("parse"):
+            data = frappe.request.get_json(force=True)
+    except Exception as e:
+        frappe.local.response.http_status_code = 400
+        return {"error": "Invalid JSON", "detail": str(e)}
+    
+    if isinstance(data, dict):
+        data = data.get("events")
+    
+    if not isinstance(data, list) or not data:
+        frappe.local.response.http_status_code = 400
+        return {"error": "Expected a non-empty list of events"}
+    
+    if len(data) > MAX_BATCH_SIZE:
+        frappe.local.response.http_status_code = 413
+        return {"error": f"Batch too large, max {MAX_BATCH_SIZE} events"}
+    
+    _debug_log("Batch payload: %s events", len(data), sn="*")
+    
+    try:
+        results = _process_events_batch(data)
+        with metrics.stage("commit"):
+            frappe.db.commit()
+    except Exception as e:
+        frappe.db.rollback()
+        frappe.log_error(
+            title="Dahua Batch Processing Error",
+            message=f"Events: {len(data)}\nError: {str(e)}"
+        )
+        frappe.local.response.http_status_code = 500
+        return {"error": str(e)}
+    
+    return {
+        "status": "ok",
+        "processed": sum(1 for r in results if r["status"] == "processed"),
+        "results": results
+    }
+
+
 # =============================================================================
 # EVENT PROCESSING
 # =============================================================================
@@ -134,66 +289,167 @@ def _process_event(data: dict) -> bool:
     Returns:
         True if Employee Checkin created, False if event was filtered/ignored
     """
+    with metrics.stage("parse"):
+        event = _parse_event(data)
+    if not event:
+        return False
+    
+    device_sn = event["device_sn"]
+    attendance_state = event["attendance_state"]
+    
+    # Filter 4: Device must be mapped and active
+    with metrics.stage("device_lookup"):
+        device = _get_active_device(device_sn)
+    if not device:
+        _debug_log("REJECTED: Device SN '%s' not found or inactive", device_sn)
+        return False
+    
+    _debug_log("Device found: %s", device)
+    
+    # Filter 5: Resolve employee and validate company
+    user_id = event["user_id"]
+    with metrics.stage("employee_resolve"):
+        employee = _resolve_employee(user_id, device.company)
+    if not employee:
+        _debug_log("REJECTED: Employee not found for UserID '%s' in company '%s'", user_id, device.company)
+        return False
+    
+    _debug_log("Employee resolved: %s", employee)
+    
+    event_id = event["event_id"]
+    _debug_log("Event ID: %s", event_id)
+    
+    # Claim the event (atomic Redis SET NX, DB fallback only when needed)
+    with metrics.stage("dedup"):
+        claimed = _claim_event(event_id, event["epoch"], device_sn=device_sn)
+    if not claimed:
+        _debug_log("REJECTED: Duplicate event %s", event_id)
+        return False
+    
+    checkin_time = _convert_epoch_to_local(event["epoch"])
+    _debug_log("Checkin time: %s", checkin_time)
+    
+    # Get log_type and reason from mapping
+    mapping = STATE_MAPPING[attendance_state]
+    
+    # Write-behind: the scheduler flushes the buffer with one bulk insert
+    if _write_behind_enabled():
+        with metrics.stage("insert"):
+            buffered = checkin_buffer.push({
+                "employee": employee,
+                "time": checkin_time,
+                "log_type": mapping["log_type"],
+                "device_id": device_sn,
+                "dahua_event_id": event_id,
+                "dahua_attendance_state": attendance_state,
+                "checkin_source": "Dahua",
+                "checkin_reason": mapping["reason"],
+            })
+        if buffered >= _flush_size():
+            # A full batch is waiting, don't hold it until the next cron tick
+            frappe.enqueue(
+                "jazira_app.dahua.api.flush_checkin_buffer",
+                queue="short",
+                job_id="dahua-checkin-flush",
+                deduplicate=True,
+            )
+        _debug_log("BUFFERED: Checkin for %s queued for bulk flush", employee)
+        return True
+    
+    # Create Employee Checkin
+    try:
+        with metrics.stage("insert"):
+            _create_checkin(
+                employee=employee,
+                time=checkin_time,
+                log_type=mapping["log_type"],
+                device_id=device_sn,
+                event_id=event_id,
+                attendance_state=attendance_state,
+                reason=mapping["reason"]
+            )
+        event_index.add([(device_sn, event_id, checkin_time)])
+        _debug_log(
+            "SUCCESS: Created checkin for %s, log_type=%s, reason=%s",
+            employee, mapping["log_type"], mapping["reason"]
+        )
+        return True
+    except frappe.DuplicateEntryError:
+        # Stored before the Redis window (claim keeps it marked as seen)
+        _debug_log("DUPLICATE: Checkin already exists for event %s", event_id)
+        return False
+    except Exception as e:
+        # Same punch stored under another event id (ids from before the
+        # canonical format): HRMS validate_duplicate_log refuses the insert.
+        # Same (employee, time) rule as the bulk insert path.
+        if isinstance(e, frappe.ValidationError) and frappe.db.exists(
+            "Employee Checkin", {"employee": employee, "time": checkin_time}
+        ):
+            _debug_log("DUPLICATE: Checkin for %s at %s already exists", employee, checkin_time)
+            return False
+        _release_events([event_id])
+        frappe.log_error(
+            title="Dahua Checkin Creation Error",
+            message=f"Employee: {employee}\nEvent ID: {event_id}\nError: {str(e)}"
+        )
+        raise
+
+
+def _parse_event(data: dict) -> dict | None:
+    """
+    Apply payload-level filters and extract the fields needed for a checkin.
+    
+    Does not touch the database, so it is shared by the single, batch and
+    queued ingestion paths.
+    
+    Args:
+        data: Full webhook payload
+        
+    Returns:
+        Dict with device_sn, user_id, attendance_state, action, epoch and
+        event_id, or None if the event should be ignored
+    """
+    if not isinstance(data, dict):
+        _debug_log("REJECTED: Payload is not an object")
+        return None
+    
     # Filter 1: Code must be "AccessControl"
     code = data.get("Code", "")
     if code != "AccessControl":
-        _debug_log(f"REJECTED: Code is '{code}', expected 'AccessControl'")
-        return False
+        _debug_log("REJECTED: Code is '%s', expected 'AccessControl'", code)
+        return None
     
     # Get Data block
     event_data = data.get("Data", {})
     if not event_data:
         _debug_log("REJECTED: No 'Data' in payload")
-        return False
+        return None
     
     # Extract key fields
     device_sn = event_data.get("SN", "")
     attendance_state = event_data.get("AttendanceState")
     action = data.get("Action", "")  # "Pulse" or could indicate Offline
     
-    _debug_log(f"Event: SN={device_sn}, AttendanceState={attendance_state}, Action={action}")
+    # Per-device debug logging (see _debug_log)
+    frappe.local.dahua_sn = device_sn
+    
+    _debug_log("Event: SN=%s, AttendanceState=%s, Action=%s", device_sn, attendance_state, action)
     
     # Filter 2: Must be a valid AttendanceState
     if attendance_state not in VALID_STATES:
-        _debug_log(f"REJECTED: AttendanceState {attendance_state} not in {VALID_STATES}")
-        return False
+        _debug_log("REJECTED: AttendanceState %s not in %s", attendance_state, VALID_STATES)
+        return None
     
     # Filter 3: For Pulse events, only accept TEMP states (3, 5) for normal IN/OUT
     # NOTE: Based on observed data, device sends Pulse for all events
     # We'll accept all valid states from Pulse since that's what the device sends
     # If Offline events are also sent later, deduplication will handle it
     
-    # Filter 4: Device must be mapped and active
-    device = _get_active_device(device_sn)
-    if not device:
-        _debug_log(f"REJECTED: Device SN '{device_sn}' not found or inactive")
-        return False
-    
-    _debug_log(f"Device found: {device}")
-    
-    # Filter 5: Resolve employee and validate company
     user_id = str(event_data.get("UserID", "")).strip()
     if not user_id:
         _debug_log("REJECTED: No UserID in event")
-        return False
-    
-    employee = _resolve_employee(user_id, device.company)
-    if not employee:
-        _debug_log(f"REJECTED: Employee not found for UserID '{user_id}' in company '{device.company}'")
-        return False
-    
-    _debug_log(f"Employee resolved: {employee}")
-    
-    # Generate deterministic event_id for deduplication
-    event_id = _generate_event_id(device_sn, event_data, action, attendance_state)
-    _debug_log(f"Event ID: {event_id}")
-    
-    # Check for duplicate (Redis fast path + DB fallback)
-    if _is_duplicate(event_id):
-        _debug_log(f"REJECTED: Duplicate event {event_id}")
-        return False
+        return None
     
-    # Convert UTC epoch to system timezone
     # Pulse events use UTC/RealUTC, Offline events use CreateTimeRealUTC/CreateTime
     epoch = (
         event_data.get("UTC") or 
@@ -204,45 +460,325 @@ def _process_event(data: dict) -> bool:
     )
     if not epoch:
         _debug_log("REJECTED: No timestamp in event (checked UTC, RealUTC, CreateTimeRealUTC, CreateTime)")
-        return False
+        return None
     
-    checkin_time = _convert_epoch_to_local(epoch)
-    _debug_log(f"Checkin time: {checkin_time}")
+    return {
+        "device_sn": device_sn,
+        "user_id": user_id,
+        "attendance_state": attendance_state,
+        "action": action,
+        "epoch": epoch,
+        # Deterministic event_id for deduplication
+        "event_id": _generate_event_id(device_sn, event_data, action, attendance_state),
+    }
+
+
+def _process_events_batch(payloads: list, check_redis: bool = True) -> list[dict]:
+    """
+    Process a batch of Dahua events with set-based lookups.
     
-    # Get log_type and reason from mapping
-    mapping = STATE_MAPPING[attendance_state]
+    Devices, employees and duplicates are resolved with one query each for
+    the whole batch (duplicates via one pipelined Redis claim), and all new checkins are written with a single
+    multi-row insert. The caller is responsible for committing.
     
-    # Create Employee Checkin
-    try:
-        _create_checkin(
-            employee=employee,
-            time=checkin_time,
-            log_type=mapping["log_type"],
-            device_id=device_sn,
-            event_id=event_id,
-            attendance_state=attendance_state,
-            reason=mapping["reason"]
-        )
-        _mark_processed(event_id)
-        _debug_log(f"SUCCESS: Created checkin for {employee}, log_type={mapping['log_type']}, reason={mapping['reason']}")
-        return True
-    except frappe.DuplicateEntryError:
-        # Race condition: record already created by another request
-        _mark_processed(event_id)
-        _debug_log(f"DUPLICATE: Checkin already exists for event {event_id}")
-        return False
-    except Exception as e:
-        frappe.log_error(
-            title="Dahua Checkin Creation Error",
-            message=f"Employee: {employee}\nEvent ID: {event_id}\nError: {str(e)}"
+    Args:
+        payloads: List of webhook payloads
+        check_redis: False when the events were already claimed in Redis
+            (async ingest), so only the DB is consulted for duplicates
+        
+    Returns:
+        Per-event status list, aligned with payloads
+    """
+    results = [None] * len(payloads)
+    parsed = []
+    
+    with metrics.stage("parse"):
+        for index, payload in enumerate(payloads):
+            event = _parse_event(payload)
+            if event:
+                parsed.append((index, event))
+            else:
+                results[index] = _event_result(index, "ignored", "filtered")
+    
+    with metrics.stage("device_lookup"):
+        devices = _get_active_devices({event["device_sn"] for _, event in parsed})
+    
+    with metrics.stage("employee_resolve"):
+        employees = _resolve_employees({
+            (event["user_id"], devices[event["device_sn"]].company)
+            for _, event in parsed
+            if event["device_sn"] in devices
+        })
+    
+    pending = []
+    seen = set()
+    for index, event in parsed:
+        device = devices.get(event["device_sn"])
+        if not device:
+            results[index] = _event_result(index, "ignored", "device_not_found", event["event_id"])
+            continue
+        
+        employee = employees.get((event["user_id"], device.company))
+        if not employee:
+            results[index] = _event_result(index, "ignored", "employee_not_found", event["event_id"])
+            continue
+        
+        event_id = event["event_id"]
+        if event_id in seen:
+            results[index] = _event_result(index, "duplicate", event_id=event_id)
+            continue
+        
+        seen.add(event_id)
+        pending.append((index, event, employee))
+    
+    with metrics.stage("dedup"):
+        claimed = _claim_events(
+            [(event["event_id"], event["epoch"], event["device_sn"]) for _, event, _ in pending],
+            check_redis=check_redis
         )
-        raise
+    
+    new_events = []
+    for index, event, employee in pending:
+        if event["event_id"] not in claimed:
+            results[index] = _event_result(index, "duplicate", event_id=event["event_id"])
+        else:
+            new_events.append((index, event, employee))
+    
+    times = timezone_service.epochs_to_local([event["epoch"] for _, event, _ in new_events])
+    
+    rows = []
+    for (index, event, employee), checkin_time in zip(new_events, times):
+        mapping = STATE_MAPPING[event["attendance_state"]]
+        rows.append((index, {
+            "employee": employee,
+            "time": checkin_time,
+            "log_type": mapping["log_type"],
+            "device_id": event["device_sn"],
+            "dahua_event_id": event["event_id"],
+            "dahua_attendance_state": event["attendance_state"],
+            "checkin_source": "Dahua",
+            "checkin_reason": mapping["reason"],
+        }))
+    
+    with metrics.stage("insert"):
+        try:
+            inserted = _bulk_insert_checkins([row for _, row in rows])
+        except Exception:
+            if check_redis:
+                _release_events(claimed)
+            raise
+    
+    _index_inserted([row for _, row in rows], inserted)
+    
+    for index, row in rows:
+        event_id = row["dahua_event_id"]
+        status = "processed" if event_id in inserted else "duplicate"
+        results[index] = _event_result(index, status, event_id=event_id)
+    _debug_log("BATCH: %s of %s events inserted", len(inserted), len(payloads), sn="*")
+    
+    return results
+
+
+def _event_result(index: int, status: str, reason: str | None = None, event_id: str | None = None) -> dict:
+    """Build one entry of the batch status array."""
+    return {"index": index, "status": status, "reason": reason, "event_id": event_id}
+
+
+# =============================================================================
+# ASYNC INGEST (accept fast, persist later)
+# =============================================================================
+
+def _async_ingest_enabled() -> bool:
+    """Async ingest mode is opt-in via site_config "dahua_async_ingest"."""
+    return bool(cint(frappe.conf.get("dahua_async_ingest")))
+
+
+def _enqueue_event(data: dict) -> dict:
+    """
+    Validate, claim and queue a single event without touching the database.
+    
+    The Redis key is claimed with SET NX (_claim_event), so concurrent
+    retries of the same event are dropped here. The dahua_event_id unique constraint remains the
+    final guard when the consumer writes the checkin.
+    """
+    event = _parse_event(data)
+    if not event:
+        frappe.local.response.http_status_code = 202
+        return {"status": "ignored"}
+    
+    event_id = event["event_id"]
+    if not _claim_event(event_id, event["epoch"], db_fallback=False):
+        _debug_log("REJECTED: Duplicate event %s", event_id)
+        frappe.local.response.http_status_code = 202
+        return {"status": "ignored"}
+    
+    ingest_queue.push({"payload": data, "received_at": time.time()})
+    return {"status": "queued", "event_id": event_id}
+
+
+def drain_ingest_queue():
+    """
+    Scheduler job: persist queued webhook events in batches.
+    
+    At-least-once: items stay in the processing list until their batch is
+    committed; a crashed run is recovered by the next one and re-inserted
+    rows are absorbed by the dahua_event_id unique constraint. Payloads that
+    fail on their own are moved to the dead-letter list.
+    """
+    batch_size = cint(frappe.conf.get("dahua_ingest_batch_size")) or INGEST_BATCH_SIZE
+    deadline = time.monotonic() + INGEST_MAX_SECONDS
+    
+    with ingest_queue.lock() as acquired:
+        if not acquired:
+            return
+        
+        # Recover items claimed by a consumer that died before ack
+        items = ingest_queue.pending()
+        while True:
+            if not items:
+                items = ingest_queue.claim(batch_size)
+            if not items:
+                break
+            
+            _persist_queued_events(items)
+            ingest_queue.ack()
+            items = []
+            
+            if time.monotonic() > deadline:
+                break
+
+
+def _persist_queued_events(items: list):
+    """
+    Write one claimed batch; on failure retry one by one to isolate bad payloads.
+    
+    The webhook claimed every queued event in Redis (_enqueue_event). Events
+    dropped here (device or employee not found, dead-lettered) were never
+    stored, so their claims are released and a later push is accepted.
+    """
+    try:
+        results = _process_events_batch([item["payload"] for item in items], check_redis=False)
+        frappe.db.commit()
+        _release_dropped(results)
+        return
+    except Exception:
+        frappe.db.rollback()
+    
+    for item in items:
+        try:
+            results = _process_events_batch([item["payload"]], check_redis=False)
+            frappe.db.commit()
+            _release_dropped(results)
+        except Exception as e:
+            frappe.db.rollback()
+            ingest_queue.dead_letter(item, str(e))
+            event = _parse_event(item["payload"])
+            if event:
+                _release_events([event["event_id"]])
+            frappe.log_error(
+                title="Dahua Ingest Dead Letter",
+                message=f"Payload: {item.get('payload')}\nError: {str(e)}"
+            )
+
+
+def _release_dropped(results: list):
+    """Release the claims of queued events the batch ignored instead of storing."""
+    _release_events([
+        result["event_id"] for result in results
+        if result["status"] == "ignored" and result["event_id"]
+    ])
+
+
+# =============================================================================
+# CHECKIN WRITE-BEHIND BUFFER
+# =============================================================================
+
+def _write_behind_enabled() -> bool:
+    """Whether validated checkins are buffered in Redis (site_config "dahua_write_behind")."""
+    return bool(cint(frappe.conf.get("dahua_write_behind")))
+
+
+def _flush_size() -> int:
+    return cint(frappe.conf.get("dahua_flush_size")) or FLUSH_SIZE
+
+
+def flush_checkin_buffer():
+    """
+    Scheduler job: bulk-insert buffered checkins, FLUSH_SIZE rows at a time.
+    
+    Drains what is buffered once per cron tick (bounded by
+    INGEST_MAX_SECONDS) and returns, a full batch between ticks is flushed
+    by the short job enqueued from the push side. Crash-safe the same way
+    as drain_ingest_queue: rows stay in the processing list until their
+    flush is committed, the next run re-flushes them and INSERT IGNORE on
+    the dahua_event_id unique constraint drops rows that already landed.
+    """
+    flush_size = _flush_size()
+    deadline = time.monotonic() + INGEST_MAX_SECONDS
+    
+    with checkin_buffer.lock() as acquired:
+        if not acquired:
+            return
+        
+        # Recover rows claimed by a flush that died before ack
+        items = checkin_buffer.pending()
+        while time.monotonic() < deadline:
+            if not items:
+                items = checkin_buffer.claim(flush_size)
+            if not items:
+                break
+            _flush_checkins(items)
+            checkin_buffer.ack()
+            items = []
+
+
+def _flush_checkins(items: list):
+    """Write one claimed batch; on failure retry row by row to isolate bad rows."""
+    rows = [dict(item, time=get_datetime(item["time"])) for item in items]
+    
+    try:
+        inserted = _bulk_insert_checkins(rows)
+        frappe.db.commit()
+        _index_inserted(rows, inserted)
+        return
+    except Exception:
+        frappe.db.rollback()
+    
+    for row in rows:
+        try:
+            inserted = _bulk_insert_checkins([row])
+            frappe.db.commit()
+            _index_inserted([row], inserted)
+        except Exception as e:
+            frappe.db.rollback()
+            # Let a re-sent event through again
+            _release_events([row["dahua_event_id"]])
+            checkin_buffer.dead_letter(row, str(e))
+            frappe.log_error(
+                title="Dahua Checkin Buffer Dead Letter",
+                message=f"Row: {row}\nError: {str(e)}"
+            )
+
+
+def _index_inserted(rows: list, inserted: set):
+    """Add inserted rows to the persistent event index."""
+    event_index.add(
+        (row["device_id"], row["dahua_event_id"], row["time"])
+        for row in rows if row["dahua_event_id"] in inserted
+    )
 
 
 # =============================================================================
 # HELPER FUNCTIONS
 # =============================================================================
 
+def _payload_sn(data) -> str | None:
+    """Device SN of a raw payload, if present (used before parsing)."""
+    if isinstance(data, dict) and isinstance(data.get("Data"), dict):
+        return data["Data"].get("SN")
+    return None
+
+
 def _validate_secret() -> bool:
     """
     Validate optional shared secret from request header or body.
@@ -279,6 +815,8 @@ def _get_active_device(sn: str):
     """
     Get device record if it exists and is active.
     
+    Served from the resolution cache; the database is only hit on a miss.
+    
     Args:
         sn: Device serial number
         
@@ -288,17 +826,59 @@ def _get_active_device(sn: str):
     if not sn:
         return None
     
-    return frappe.db.get_value(
+    device = resolution_cache.get("device", sn, lambda: _load_active_devices([sn]).get(sn))
+    return frappe._dict(device) if device else None
+
+
+def _get_active_devices(sns: set) -> dict:
+    """
+    Bulk variant of _get_active_device for batch ingestion.
+    
+    Args:
+        sns: Device serial numbers
+        
+    Returns:
+        Dict of device_sn -> {name, company} for active devices only
+    """
+    sns = [sn for sn in sns if sn]
+    if not sns:
+        return {}
+    
+    devices = resolution_cache.get_many("device", sns, _load_active_devices)
+    return {sn: frappe._dict(device) for sn, device in devices.items() if device}
+
+
+def _load_active_devices(sns: list) -> dict:
+    """Load active devices by serial number from the database."""
+    devices = frappe.get_all(
         "Dahua Device",
-        {"device_sn": sn, "is_active": 1},
-        ["name", "company"],
-        as_dict=True
+        filters={"device_sn": ["in", list(sns)], "is_active": 1},
+        fields=["name", "company", "device_sn"]
     )
+    return {d.device_sn: {"name": d.name, "company": d.company} for d in devices}
 
 
 def _resolve_employee(user_id: str, device_company: str) -> str | None:
     """
-    Resolve Dahua UserID to ERPNext Employee.
+    Resolve Dahua UserID to ERPNext Employee (cached, see _lookup_employee).
+    
+    Args:
+        user_id: UserID from Dahua device
+        device_company: Company the device is mapped to
+        
+    Returns:
+        Employee name if found and company matches, else None
+    """
+    return resolution_cache.get(
+        "employee",
+        _employee_cache_key(user_id, device_company),
+        lambda: _lookup_employee(user_id, device_company)
+    )
+
+
+def _lookup_employee(user_id: str, device_company: str) -> str | None:
+    """
+    Resolve Dahua UserID to ERPNext Employee from the database.
     
     Resolution priority:
     1. Employee.name == user_id (direct document name match)
@@ -315,9 +895,9 @@ def _resolve_employee(user_id: str, device_company: str) -> str | None:
     if frappe.db.exists("Employee", user_id):
         emp_company = frappe.db.get_value("Employee", user_id, "company")
         if emp_company == device_company:
-            _debug_log(f"Employee matched by name: {user_id}")
+            _debug_log("Employee matched by name: %s", user_id)
             return user_id
-        _debug_log(f"Employee {user_id} found but company mismatch: {emp_company} != {device_company}")
+        _debug_log("Employee %s found but company mismatch: %s != %s", user_id, emp_company, device_company)
         return None
     
     # Priority 2: Standard HRMS attendance_device_id field (Attendance & Leaves tab)
@@ -327,18 +907,90 @@ def _resolve_employee(user_id: str, device_company: str) -> str | None:
         "name"
     )
     if emp_name:
-        _debug_log(f"Employee matched by attendance_device_id: {emp_name}")
+        _debug_log("Employee matched by attendance_device_id: %s", emp_name)
         return emp_name
     
-    _debug_log(f"No employee found for UserID '{user_id}' in company '{device_company}'")
+    _debug_log("No employee found for UserID '%s' in company '%s'", user_id, device_company)
     return None
 
 
+def _resolve_employees(pairs: set) -> dict:
+    """
+    Bulk variant of _resolve_employee for batch ingestion.
+    
+    Args:
+        pairs: Set of (user_id, device_company) tuples
+        
+    Returns:
+        Dict of (user_id, device_company) -> Employee name for resolved pairs
+    """
+    if not pairs:
+        return {}
+    
+    keys = {_employee_cache_key(user_id, company): (user_id, company) for user_id, company in pairs}
+    
+    def load(missing: list) -> dict:
+        found = _lookup_employees({keys[key] for key in missing})
+        return {_employee_cache_key(*pair): employee for pair, employee in found.items()}
+    
+    employees = resolution_cache.get_many("employee", list(keys), load)
+    return {keys[key]: employee for key, employee in employees.items() if employee}
+
+
+def _lookup_employees(pairs: set) -> dict:
+    """
+    Database side of _resolve_employees.
+    
+    Applies the same priority rules as _lookup_employee with two queries.
+    """
+    user_ids = list({user_id for user_id, _ in pairs})
+    
+    # Priority 1: Direct name match
+    company_by_name = dict(frappe.get_all(
+        "Employee",
+        filters={"name": ["in", user_ids]},
+        fields=["name", "company"],
+        as_list=True
+    ))
+    
+    # Priority 2: Standard HRMS attendance_device_id field
+    by_device_id = {}
+    for emp in frappe.get_all(
+        "Employee",
+        filters={"attendance_device_id": ["in", user_ids]},
+        fields=["name", "company", "attendance_device_id"]
+    ):
+        by_device_id.setdefault((emp.attendance_device_id, emp.company), emp.name)
+    
+    resolved = {}
+    for user_id, company in pairs:
+        if user_id in company_by_name:
+            # Name match wins even on company mismatch (same as _lookup_employee)
+            if company_by_name[user_id] == company:
+                resolved[(user_id, company)] = user_id
+        elif (user_id, company) in by_device_id:
+            resolved[(user_id, company)] = by_device_id[(user_id, company)]
+    
+    return resolved
+
+
+def _employee_cache_key(user_id: str, company: str) -> str:
+    """Resolution cache key for a (UserID, company) pair."""
+    return f"{user_id}|{company}"
+
+
 def _generate_event_id(sn: str, data: dict, action: str, state: int) -> str:
     """
     Generate deterministic event ID for deduplication.
     
-    Format: {sn}-{BlockId}-{UserID}-{state}
+    Format: {sn}-{UserID}-{epoch}-{state}
+    
+    Built only from fields that a pushed event and the same record pulled
+    from the device log (pull_sync.py) both carry, so either path
+    deduplicates the other. BlockId (push) and RecNo (pull) are counters of
+    different streams and are not used. The epoch is taken from the same
+    clock on both sides: UTC (push) pairs with CreateTime (record), the
+    RealUTC fields are only used when those are missing.
     
     Args:
         sn: Device serial number
@@ -349,69 +1001,194 @@ def _generate_event_id(sn: str, data: dict, action: str, state: int) -> str:
     Returns:
         Unique event identifier string
     """
-    user_id = str(data.get("UserID", ""))
-    block_id = str(data.get("BlockId", "0"))
+    user_id = str(data.get("UserID", "")).strip()
+    epoch = cint(
+        data.get("UTC") or
+        data.get("CreateTime") or
+        data.get("RealUTC") or
+        data.get("CreateTimeRealUTC") or
+        0
+    )
     
-    return f"{sn}-{block_id}-{user_id}-{state}"
+    return f"{sn}-{user_id}-{epoch}-{state}"
+
 
+def _dedup_ttl() -> int:
+    """Redis dedup window in seconds (site_config "dahua_dedup_ttl")."""
+    return cint(frappe.conf.get("dahua_dedup_ttl")) or CACHE_TTL
 
-def _is_duplicate(event_id: str) -> bool:
+
+def _claim_event(
+    event_id: str,
+    epoch: float | None = None,
+    db_fallback: bool = True,
+    device_sn: str | None = None
+) -> bool:
     """
-    Check if event was already processed using dual-layer deduplication.
+    Atomically claim an event for processing (SET key 1 NX EX ttl).
     
-    Layer 1: Redis cache (fast, short-lived)
-    Layer 2: Database unique constraint (persistent)
+    Only one worker wins the claim per event_id, which closes the race
+    between checking and inserting. The database is consulted only when
+    Redis cannot be trusted to know the event (see _needs_db_check) and
+    the event index cannot prove the event is new. A won claim is released
+    again if the transaction rolls back (see _release_on_rollback).
     
     Args:
         event_id: Unique event identifier
+        epoch: Event time, used to detect events older than the Redis window
+        db_fallback: False to skip the database (async ingest edge)
+        device_sn: Device serial, selects the event index partition
         
     Returns:
-        True if duplicate, False if new event
+        True if this caller owns the event (new), False if duplicate
     """
-    cache_key = f"{CACHE_PREFIX}{event_id}"
+    if not frappe.cache().set(f"{CACHE_PREFIX}{event_id}", "1", ex=_dedup_ttl(), nx=True):
+        return False
+    _release_on_rollback([event_id])
     
-    # Fast path: Check Redis
-    if frappe.cache().get(cache_key):
-        return True
+    if db_fallback and _needs_db_check(epoch):
+        if _definitely_new([(event_id, epoch, device_sn)])[0]:
+            return True
+        # The key stays set: a stored event is a duplicate for the whole window
+        return not frappe.db.exists("Employee Checkin", {"dahua_event_id": event_id})
     
-    # Slow path: Check database
-    if frappe.db.exists("Employee Checkin", {"dahua_event_id": event_id}):
-        # Refresh cache to speed future checks
-        frappe.cache().set(cache_key, "1", ex=CACHE_TTL)
-        return True
+    return True
+
+
+def _claim_events(events: list, check_redis: bool = True) -> set:
+    """
+    Pipelined multi-key variant of _claim_event for batch paths.
     
-    return False
+    Args:
+        events: List of (event_id, epoch, device_sn) tuples
+        check_redis: False when the events were already claimed at enqueue
+            time (async ingest); the event index / database is then always
+            consulted
+        
+    Returns:
+        Set of event_ids claimed as new
+    """
+    if not events:
+        return set()
+    
+    if check_redis:
+        ttl = _dedup_ttl()
+        pipe = frappe.cache().pipeline()
+        for event_id, _, _ in events:
+            pipe.set(f"{CACHE_PREFIX}{event_id}", "1", ex=ttl, nx=True)
+        claimed = [event for event, won in zip(events, pipe.execute()) if won]
+        _release_on_rollback([event_id for event_id, _, _ in claimed])
+        to_check = [event for event in claimed if _needs_db_check(event[1])]
+    else:
+        claimed = events
+        to_check = list(events)
+    
+    # Only events the index cannot prove new go to the database
+    to_check = [
+        event[0] for event, new in zip(to_check, _definitely_new(to_check)) if not new
+    ]
+    
+    new = {event_id for event_id, _, _ in claimed}
+    if to_check:
+        new.difference_update(frappe.get_all(
+            "Employee Checkin",
+            filters={"dahua_event_id": ["in", to_check]},
+            pluck="dahua_event_id"
+        ))
+    
+    return new
+
+
+def _release_events(event_ids):
+    """Drop claims for events that were not stored, so a retry can proceed."""
+    if event_ids:
+        frappe.cache().delete(*[f"{CACHE_PREFIX}{event_id}" for event_id in event_ids])
+
+
+def _release_on_rollback(event_ids: list):
+    """
+    Release won claims if the transaction that stores their checkins rolls back.
+    
+    Covers every failure after the claim (insert, event index, commit, the
+    pull-sync mark): otherwise the claim would outlive the rolled-back
+    checkin for the whole dedup TTL and the device retry would be dropped
+    as a duplicate. A commit resets the callback, the claim then stands.
+    """
+    if event_ids:
+        frappe.db.after_rollback.add(lambda: _release_events(event_ids))
+
+
+def _definitely_new(events: list) -> list[bool]:
+    """
+    Ask the event index which events were certainly never stored.
+    
+    Args:
+        events: List of (event_id, epoch, device_sn) tuples
+        
+    Returns:
+        List aligned with events; False also for events without SN or epoch
+    """
+    known = [(i, event) for i, event in enumerate(events) if event[1] and event[2]]
+    result = [False] * len(events)
+    if not known:
+        return result
+    
+    times = timezone_service.epochs_to_local([event[1] for _, event in known])
+    answers = event_index.definitely_new([
+        (event[2], event[0], local_time) for (_, event), local_time in zip(known, times)
+    ])
+    for (i, _), answer in zip(known, answers):
+        result[i] = answer
+    return result
+
+
+def _needs_db_check(epoch: float | None) -> bool:
+    """
+    Whether a won claim still has to be confirmed against the database.
+    
+    A missing key proves the event is new only if Redis has been keeping
+    keys for a full TTL window (no restart/flush since) and the event itself
+    falls inside that window. Offline replays older than the TTL, and
+    everything right after a Redis restart, fall back to the DB.
+    """
+    ttl = _dedup_ttl()
+    if epoch and epoch < time.time() - ttl:
+        return True
+    return not _dedup_warm(ttl)
 
 
-def _mark_processed(event_id: str):
-    """Mark event as processed in Redis cache."""
-    cache_key = f"{CACHE_PREFIX}{event_id}"
-    frappe.cache().set(cache_key, "1", ex=CACHE_TTL)
+def _dedup_warm(ttl: int) -> bool:
+    """True once Redis has held dedup keys for at least one TTL window."""
+    warm = getattr(frappe.local, "dahua_dedup_warm", None)
+    if warm:
+        return True
+    
+    now = time.time()
+    redis = frappe.cache()
+    pipe = redis.pipeline()
+    # First writer after a restart/flush records when tracking started
+    pipe.set(DEDUP_SINCE_KEY, now, nx=True)
+    pipe.get(DEDUP_SINCE_KEY)
+    _, since = pipe.execute()
+    
+    warm = now - float(since or now) >= ttl
+    frappe.local.dahua_dedup_warm = warm
+    return warm
 
 
 def _convert_epoch_to_local(epoch: int) -> datetime:
     """
     Convert Unix epoch (UTC) to ERPNext system timezone.
     
+    The site timezone is cached per worker by timezone_service.
+    
     Args:
         epoch: Unix timestamp in seconds (UTC)
         
     Returns:
         Naive datetime in system timezone for ERPNext storage
     """
-    # Get system timezone from ERPNext settings
-    system_tz_name = frappe.db.get_single_value("System Settings", "time_zone") or "UTC"
-    
-    # Convert epoch to UTC datetime
-    utc_dt = datetime.utcfromtimestamp(epoch)
-    utc_dt = pytz.UTC.localize(utc_dt)
-    
-    # Convert to system timezone
-    system_tz = pytz.timezone(system_tz_name)
-    local_dt = utc_dt.astimezone(system_tz)
-    
-    # Return naive datetime (ERPNext expects this)
-    return local_dt.replace(tzinfo=None)
+    return timezone_service.epoch_to_local(epoch)
 
 
 def _create_checkin(
@@ -450,6 +1227,148 @@ def _create_checkin(
     doc.insert()
 
 
+def _bulk_insert_checkins(rows: list[dict]) -> set:
+    """
+    Insert many Employee Checkin records with a single multi-row INSERT.
+    
+    Skips the per-document ORM cycle. The controller effects that matter
+    downstream are replayed here: employee_name is fetched in one query,
+    shift fields are filled via fetch_shift() and the (employee, time)
+    duplicate-log rule is enforced set-wise. INSERT IGNORE lets the
+    dahua_event_id unique constraint absorb races with other workers.
+    
+    Args:
+        rows: Checkin field dicts (employee, time, log_type, dahua_event_id, ...)
+        
+    Returns:
+        Set of dahua_event_ids actually inserted
+    """
+    if not rows:
+        return set()
+    
+    employees = list({row["employee"] for row in rows})
+    
+    # Same rule as EmployeeCheckin.validate_duplicate_log, for the whole batch
+    existing = {
+        (c.employee, c.time)
+        for c in frappe.get_all(
+            "Employee Checkin",
+            filters={
+                "employee": ["in", employees],
+                "time": ["in", list({row["time"] for row in rows})]
+            },
+            fields=["employee", "time"]
+        )
+    }
+    unique_rows = []
+    for row in rows:
+        key = (row["employee"], row["time"])
+        if key not in existing:
+            existing.add(key)
+            unique_rows.append(row)
+    
+    if not unique_rows:
+        return set()
+    
+    employee_info = {
+        e.name: e
+        for e in frappe.get_all(
+            "Employee",
+            filters={"name": ["in", employees]},
+            fields=["name", "employee_name", "default_shift"]
+        )
+    }
+    
+    meta = frappe.get_meta("Employee Checkin")
+    fields = [f for f in CHECKIN_FIELDS if meta.has_field(f)]
+    names = _make_checkin_names(len(unique_rows))
+    now = now_datetime()
+    user = frappe.session.user
+    
+    shift_employees = _employees_with_shifts(employee_info)
+    
+    values = []
+    for name, row in zip(names, unique_rows):
+        doc = frappe.new_doc("Employee Checkin")
+        doc.update(row)
+        info = employee_info.get(row["employee"])
+        doc.employee_name = info.employee_name if info else None
+        # Shift Auto Attendance only picks up checkins with shift set;
+        # employees without any shift would resolve to none anyway
+        if row["employee"] in shift_employees:
+            doc.fetch_shift()
+        values.append((name, now, now, user, user, 0, *(doc.get(f) for f in fields)))
+    
+    frappe.db.bulk_insert(
+        "Employee Checkin",
+        fields=["name", "creation", "modified", "owner", "modified_by", "docstatus", *fields],
+        values=values,
+        ignore_duplicates=True
+    )
+    
+    return set(frappe.get_all(
+        "Employee Checkin",
+        filters={"name": ["in", names]},
+        pluck="dahua_event_id"
+    ))
+
+
+def _employees_with_shifts(employee_info: dict) -> set:
+    """
+    Employees whose checkins need fetch_shift(): a default shift or an
+    active Shift Assignment. Empty when HRMS shift handling is not installed.
+    """
+    from frappe.model.base_document import get_controller
+    
+    if not hasattr(get_controller("Employee Checkin"), "fetch_shift"):
+        return set()
+    
+    with_shift = {name for name, info in employee_info.items() if info.default_shift}
+    with_shift.update(frappe.get_all(
+        "Shift Assignment",
+        filters={"employee": ["in", list(employee_info)], "docstatus": 1, "status": "Active"},
+        pluck="employee",
+        distinct=True
+    ))
+    return with_shift
+
+
+def _make_checkin_names(count: int) -> list[str]:
+    """
+    Reserve `count` Employee Checkin names in one series update.
+    
+    Falls back to random hashes if the doctype is not named by a
+    trailing-number series (e.g. EMP-CKIN-.MM.-.YYYY.-.######).
+    """
+    from frappe.model.naming import parse_naming_series
+    
+    autoname = frappe.get_meta("Employee Checkin").autoname or ""
+    parts = autoname.split(".")
+    if ":" in autoname or not parts[-1].startswith("#"):
+        return [frappe.generate_hash(length=10) for _ in range(count)]
+    
+    prefix = parse_naming_series(parts[:-1], doctype="Employee Checkin")
+    digits = len(parts[-1])
+    start = _reserve_series(prefix, count)
+    
+    return [f"{prefix}{number:0{digits}d}" for number in range(start, start + count)]
+
+
+def _reserve_series(key: str, count: int) -> int:
+    """Advance a naming series by `count` and return the first reserved number."""
+    current = frappe.db.sql(
+        "SELECT `current` FROM `tabSeries` WHERE `name` = %s FOR UPDATE", (key,)
+    )
+    if current and current[0][0] is not None:
+        frappe.db.sql(
+            "UPDATE `tabSeries` SET `current` = `current` + %s WHERE `name` = %s", (count, key)
+        )
+        return int(current[0][0]) + 1
+    
+    frappe.db.sql("INSERT INTO `tabSeries` (`name`, `current`) VALUES (%s, %s)", (key, count))
+    return 1
+
+
 # =============================================================================
 # UTILITY FUNCTIONS (for testing/debugging)
 # =============================================================================
@@ -469,4 +1388,46 @@ def test_employee_resolution(user_id: str, company: str) -> dict:
     employee = _resolve_employee(user_id, company)
     if employee:
         return {"status": "found", "employee": employee}
-    return {"status": "not_found"}
\ No newline at end of file
+    return {"status": "not_found"}
+
+
+@frappe.whitelist()
+def ingest_queue_status() -> dict:
+    """Async ingest queue, processing and dead-letter lengths."""
+    frappe.only_for("System Manager")
+    return ingest_queue.stats()
+
+
+@frappe.whitelist(methods=["POST"])
+def requeue_ingest_dead_letters() -> dict:
+    """Move dead-lettered events back onto the async ingest queue."""
+    frappe.only_for("System Manager")
+    return {"requeued": ingest_queue.requeue_dead()}
+
+
+@frappe.whitelist()
+def checkin_buffer_status() -> dict:
+    """Write-behind buffer, processing and dead-letter lengths."""
+    frappe.only_for("System Manager")
+    return checkin_buffer.stats()
+
+
+@frappe.whitelist(methods=["POST"])
+def requeue_checkin_buffer_dead_letters() -> dict:
+    """Move dead-lettered checkin rows back into the write-behind buffer."""
+    frappe.only_for("System Manager")
+    return {"requeued": checkin_buffer.requeue_dead()}
+
+
+@frappe.whitelist()
+def dahua_metrics(reset: bool = False) -> dict:
+    """
+    Per-stage webhook latency (count, mean, p50/p95/p99 in ms).
+    
+    Only sampled requests are recorded, see "dahua_metrics_sample_rate".
+    """
+    frappe.only_for("System Manager")
+    result = metrics.summary()
+    if cint(reset):
+        metrics.reset()
+    return result
@@ -0,0 +1,378 @@
+"""
+Load test / benchmark harness for the Dahua ingest path.
+
+Simulates N devices emitting Pulse and Offline payloads (same shape as the
+receive_event docstring) and drives them through the ingest path at a given
+concurrency, reporting events/sec, client latency percentiles, per-stage
+latency (metrics.py, sampled at 100%) and DB query counts.
+
+    bench --site test_site bench-dahua --devices 5 --events 2000 --concurrency 4
+    bench --site test_site bench-dahua --batch 200              # offline replay path
+    bench --site test_site bench-dahua --mode http --url http://test_site:8000
+    bench --site test_site bench-dahua --fake-redis             # needs fakeredis
+
+Modes:
+    direct  _process_event (or _process_events_batch with --batch) plus a
+            commit per request, each worker thread on its own DB connection
+    http    POST to receive_event / receive_events_batch on a running server;
+            stage metrics are only available if the server shares the Redis
+            and samples requests ("dahua_metrics_sample_rate")
+
+The run writes real Employee Checkin rows for BENCH-* devices: use a test
+site. They are deleted afterwards unless keep=True. Stage histograms are
+reset at the start of every run.
+"""
+
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Dict, Iterator, List
+from unittest.mock import patch
+
+import frappe
+
+from jazira_app.dahua import metrics
+
+
+DEVICE_PREFIX = "BENCH-SN-"
+EMPLOYEE_ID_START = 900000  # Employee.attendance_device_id used as Dahua UserID
+
+# AttendanceState mix of a normal day (mostly IN/OUT, some breaks)
+STATE_WEIGHTS = {1: 40, 2: 40, 5: 10, 3: 10}
+
+
+# =============================================================================
+# DEVICE SIMULATOR
+# =============================================================================
+
+class DeviceSimulator:
+    """Emits realistic webhook payloads for one device."""
+
+    def __init__(
+        self,
+        sn: str,
+        user_ids: List[str],
+        start_epoch: int | None = None,
+        offline_ratio: float = 0.2,
+        duplicate_ratio: float = 0.05,
+        seed: int | None = None
+    ):
+        self.sn = sn
+        self.user_ids = list(user_ids)
+        self.epoch = start_epoch or int(time.time()) - 24 * 3600
+        self.offline_ratio = offline_ratio
+        self.duplicate_ratio = duplicate_ratio
+        self.block_id = 0
+        self.rec_no = 0
+        self.sent = []
+        self.random = random.Random(seed)
+
+    def next_payload(self) -> Dict:
+        """Next event; devices re-send a previous one now and then."""
+        if self.sent and self.random.random() < self.duplicate_ratio:
+            return self.random.choice(self.sent)
+
+        self.epoch += self.random.randint(1, 30)
+        self.block_id += 1
+        user_id = self.random.choice(self.user_ids)
+        state = self.random.choices(list(STATE_WEIGHTS), weights=list(STATE_WEIGHTS.values()))[0]
+
+        data = {
+            "SN": self.sn,
+            "UserID": user_id,
+            "AttendanceState": state,
+            "BlockId": self.block_id,
+            "CardName": f"Bench {user_id}",
+        }
+        if self.random.random() < self.offline_ratio:
+            self.rec_no += 1
+            action = "Offline"
+            data.update({"CreateTime": self.epoch, "RecNo": self.rec_no})
+        else:
+            action = "Pulse"
+            data["UTC"] = self.epoch
+
+        payload = {"Action": action, "Code": "AccessControl", "Data": data, "Index": 0}
+        self.sent.append(payload)
+        return payload
+
+    def payloads(self, count: int) -> Iterator[Dict]:
+        for _ in range(count):
+            yield self.next_payload()
+
+
+# =============================================================================
+# FIXTURES
+# =============================================================================
+
+def setup_fixtures(devices: int, employees: int, company: str | None = None) -> List[DeviceSimulator]:
+    """
+    Ensure BENCH-* devices and employees exist and return their simulators.
+
+    Args:
+        devices: Number of simulated devices
+        employees: Number of employees (Dahua UserIDs) shared by the devices
+        company: Company to map them to (default: the default company)
+    """
+    company = company or frappe.defaults.get_global_default("company") or frappe.db.get_value("Company", {})
+
+    user_ids = []
+    for i in range(employees):
+        user_id = str(EMPLOYEE_ID_START + i)
+        # _lookup_employee resolves a UserID by name or attendance_device_id
+        existing = frappe.db.get_value("Employee", {"attendance_device_id": user_id}, "company")
+        if existing and existing != company:
+            frappe.throw(f"Bench UserID {user_id} already belongs to an employee of {existing}")
+        if not existing:
+            frappe.get_doc({
+                "doctype": "Employee",
+                "first_name": f"Bench {user_id}",
+                "attendance_device_id": user_id,
+                "company": company,
+                "gender": "Male",
+                "date_of_birth": "1990-01-01",
+                "date_of_joining": "2020-01-01",
+            }).insert(ignore_permissions=True)
+        user_ids.append(user_id)
+
+    simulators = []
+    for i in range(devices):
+        sn = f"{DEVICE_PREFIX}{i:03d}"
+        if not frappe.db.exists("Dahua Device", sn):
+            frappe.get_doc({
+                "doctype": "Dahua Device",
+                "device_sn": sn,
+                "device_name": f"Bench Device {i}",
+                "company": company,
+                "is_active": 1,
+            }).insert(ignore_permissions=True)
+        simulators.append(DeviceSimulator(sn, user_ids, seed=i))
+
+    frappe.db.commit()
+    return simulators
+
+
+def cleanup():
+    """Delete checkins and dedup claims created by benchmark runs."""
+    frappe.db.delete("Employee Checkin", {"device_id": ["like", f"{DEVICE_PREFIX}%"]})
+    frappe.db.commit()
+    keys = frappe.cache().keys(f"dahua:event:{DEVICE_PREFIX}*")
+    if keys:
+        frappe.cache().delete(*keys)
+
+
+# =============================================================================
+# RUNNER
+# =============================================================================
+
+def run(
+    mode: str = "direct",
+    devices: int = 3,
+    events: int = 1000,
+    concurrency: int = 4,
+    batch: int = 1,
+    employees: int = 20,
+    company: str | None = None,
+    url: str | None = None,
+    secret: str | None = None,
+    fake_redis: bool = False,
+    keep: bool = False
+) -> Dict:
+    """
+    Run one benchmark and return its report.
+
+    Args:
+        mode: "direct" or "http"
+        devices: Simulated devices
+        events: Total events across all devices
+        concurrency: Worker threads
+        batch: Events per request (1 = receive_event, >1 = batch endpoint)
+        employees: Distinct UserIDs
+        company: Company for the BENCH-* fixtures
+        url: Site URL for http mode (e.g. http://test_site:8000)
+        secret: X-DAHUA-SECRET for http mode
+        fake_redis: Use an in-process fakeredis server (direct mode only)
+        keep: Keep the inserted checkins
+
+    Returns:
+        Report dict (events_per_sec, latency_ms, queries, stages, ...)
+    """
+    if mode not in ("direct", "http"):
+        frappe.throw(f"Unknown mode: {mode}")
+    if mode == "http" and not url:
+        frappe.throw("url is required in http mode")
+
+    with _redis_backend(fake_redis and mode == "direct"):
+        simulators = setup_fixtures(devices, employees, company)
+        per_device = -(-events // devices)
+        # Interleave devices, as they report concurrently
+        streams = [list(sim.payloads(per_device)) for sim in simulators]
+        payloads = [p for group in zip(*streams) for p in group][:events]
+        chunks = [payloads[i:i + batch] for i in range(0, len(payloads), batch)]
+        # Workers take every n-th chunk so each device stays roughly ordered
+        shares = [chunks[i::concurrency] for i in range(concurrency)]
+
+        metrics.reset()
+        worker = _http_worker if mode == "http" else _direct_worker
+        kwargs = {"url": url, "secret": secret} if mode == "http" else {"site": frappe.local.site}
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            reports = list(pool.map(lambda share: worker(share, **kwargs), shares))
+        elapsed = time.perf_counter() - started
+
+        report = _merge_reports(reports, elapsed, len(payloads))
+        report.update({
+            "mode": mode,
+            "devices": devices,
+            "concurrency": concurrency,
+            "batch": batch,
+            "fake_redis": bool(fake_redis and mode == "direct"),
+            "stages": metrics.summary(),
+        })
+
+        if not keep:
+            cleanup()
+
+    return report
+
+
+def _direct_worker(chunks: List[List[Dict]], site: str) -> Dict:
+    """Process requests in-process on a dedicated site connection."""
+    from jazira_app.dahua.api import _process_event, _process_events_batch
+
+    frappe.init(site=site)
+    frappe.connect()
+    queries = _count_queries()
+    latencies = []
+    statuses = {}
+    try:
+        for chunk in chunks:
+            start = time.perf_counter()
+            metrics.begin(sample_rate=1)
+            try:
+                if len(chunk) == 1:
+                    results = ["processed" if _process_event(chunk[0]) else "ignored"]
+                else:
+                    results = [r["status"] for r in _process_events_batch(chunk)]
+                with metrics.stage("commit"):
+                    frappe.db.commit()
+            except Exception:
+                frappe.db.rollback()
+                results = ["error"] * len(chunk)
+            finally:
+                metrics.end()
+            latencies.append(time.perf_counter() - start)
+            for status in results:
+                statuses[status] = statuses.get(status, 0) + 1
+    finally:
+        frappe.destroy()
+
+    return {"latencies": latencies, "statuses": statuses, "queries": queries[0]}
+
+
+def _http_worker(chunks: List[List[Dict]], url: str, secret: str | None = None) -> Dict:
+    """POST requests to a running server with a keep-alive session."""
+    import requests as http
+
+    single = f"{url.rstrip('/')}/api/method/jazira_app.dahua.api.receive_event"
+    bulk = f"{url.rstrip('/')}/api/method/jazira_app.dahua.api.receive_events_batch"
+    session = http.Session()
+    if secret:
+        session.headers["X-DAHUA-SECRET"] = secret
+
+    latencies = []
+    statuses = {}
+    for chunk in chunks:
+        start = time.perf_counter()
+        try:
+            if len(chunk) == 1:
+                response = session.post(single, json=chunk[0], timeout=30)
+                results = [{200: "processed", 202: "ignored"}.get(response.status_code, "error")]
+            else:
+                response = session.post(bulk, json=chunk, timeout=120)
+                if response.ok:
+                    results = [r["status"] for r in response.json()["message"]["results"]]
+                else:
+                    results = ["error"] * len(chunk)
+        except http.RequestException:
+            results = ["error"] * len(chunk)
+        latencies.append(time.perf_counter() - start)
+        for status in results:
+            statuses[status] = statuses.get(status, 0) + 1
+
+    return {"latencies": latencies, "statuses": statuses, "queries": None}
+
+
+def _merge_reports(reports: List[Dict], elapsed: float, events: int) -> Dict:
+    latencies = sorted(ms for r in reports for ms in r["latencies"])
+    statuses = {}
+    for r in reports:
+        for status, count in r["statuses"].items():
+            statuses[status] = statuses.get(status, 0) + count
+
+    counted = [r["queries"] for r in reports if r["queries"] is not None]
+    queries = sum(counted) if counted else None
+
+    return {
+        "events": events,
+        "requests": len(latencies),
+        "seconds": round(elapsed, 3),
+        "events_per_sec": round(events / elapsed, 1) if elapsed else None,
+        "statuses": statuses,
+        "latency_ms": {
+            "p50": _percentile(latencies, 0.50),
+            "p95": _percentile(latencies, 0.95),
+            "p99": _percentile(latencies, 0.99),
+            "max": round(latencies[-1] * 1000, 3) if latencies else None,
+        },
+        "queries": queries,
+        "queries_per_event": round(queries / events, 2) if queries is not None and events else None,
+    }
+
+
+def _percentile(sorted_seconds: List[float], q: float) -> float | None:
+    if not sorted_seconds:
+        return None
+    index = min(len(sorted_seconds) - 1, int(q * len(sorted_seconds)))
+    return round(sorted_seconds[index] * 1000, 3)
+
+
+def _count_queries() -> List[int]:
+    """Count SQL statements on this thread's connection; returns a 1-item counter."""
+    counter = [0]
+    db = frappe.db
+    original = db.sql
+
+    def sql(*args, **kwargs):
+        counter[0] += 1
+        return original(*args, **kwargs)
+
+    db.sql = sql
+    return counter
+
+
+_fake_redis_lock = threading.Lock()
+
+
+@contextmanager
+def _redis_backend(fake: bool):
+    """Optionally swap frappe.cache() for an in-process fakeredis server."""
+    if not fake:
+        yield
+        return
+
+    try:
+        import fakeredis
+        import redis
+    except ImportError:
+        frappe.throw("fake_redis requires the fakeredis package (pip install fakeredis)")
+
+    from frappe.utils.redis_wrapper import RedisWrapper
+
+    pool = redis.ConnectionPool(connection_class=fakeredis.FakeConnection, server=fakeredis.FakeServer())
+    wrapper = RedisWrapper(connection_pool=pool)
+    with _fake_redis_lock, patch.object(frappe, "cache", lambda: wrapper):
+        yield
@@ -0,0 +1,343 @@
+"""
+Two-tier resolution cache for the Dahua webhook.
+
+Device SN -> {name, company} and (UserID, company) -> Employee mappings
+change a few times a month but are looked up on every event. Lookups go:
+
+    1. process-local LRU (per site, per worker)
+    2. Redis hash shared by all workers
+    3. loader (database)
+
+Negative results are cached too, so unknown devices/users stop hitting the
+database. Saving or deleting a Dahua Device / Employee clears the Redis hash
+and rotates a generation token; every worker compares its token once per
+request and drops its LRU when it changed.
+
+The shared hash is read and written with raw commands on a pipeline (one
+make_key'd name, pickled values), never through RedisWrapper.hget/hset,
+which would prefix the key a second time. Hit/miss counters are summed in
+the worker and flushed to Redis every STATS_FLUSH_EVERY lookups or
+STATS_FLUSH_SECONDS, so a local hit costs no Redis round trip.
+"""
+
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List
+
+import frappe
+
+
+# =============================================================================
+# CONSTANTS
+# =============================================================================
+
+NAMESPACES = ("device", "employee")
+
+LOCAL_MAXSIZE = 4096  # entries per namespace per site
+
+REDIS_KEY = "dahua:resolve:{0}"
+GENERATION_KEY = "dahua:resolve:generation"
+STATS_KEY = "dahua:resolve:stats"
+
+# Local counters are flushed to STATS_KEY after this many lookups or seconds
+STATS_FLUSH_EVERY = 1000
+STATS_FLUSH_SECONDS = 30
+
+# Stored in place of None so a cached "not found" is distinguishable from a miss
+NOT_FOUND = "__not_found__"
+
+_MISSING = object()
+
+
+# =============================================================================
+# LRU
+# =============================================================================
+
+class LRUCache:
+    """Small thread-safe LRU map."""
+
+    def __init__(self, maxsize: int = LOCAL_MAXSIZE):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._data:
+                return default
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+# =============================================================================
+# RESOLUTION CACHE
+# =============================================================================
+
+class ResolutionCache:
+    """
+    Process-local LRU in front of a Redis hash, per namespace.
+
+    Values must be picklable. Loaders return None for "not found".
+    """
+
+    def __init__(self):
+        # site -> {"generation": token, namespace: LRUCache}
+        self._sites = {}
+        # site -> {"namespace:counter": amount} not yet flushed to Redis
+        self._counters = {}
+        # site -> monotonic time of the last flush
+        self._flushed_at = {}
+        self._counters_lock = threading.Lock()
+
+    def get(self, namespace: str, key: str, loader: Callable[[], Any]) -> Any:
+        """
+        Resolve a single key.
+
+        Args:
+            namespace: One of NAMESPACES
+            key: Cache key (string)
+            loader: Called on a full miss; its result is cached
+
+        Returns:
+            Cached or loaded value (None if not found)
+        """
+        lru = self._local(namespace)
+
+        value = lru.get(key, _MISSING)
+        if value is not _MISSING:
+            self._count(namespace, "local_hit")
+            return self._decode(value)
+
+        pipe = frappe.cache().pipeline()
+        pipe.hget(self._key(namespace), key)
+        raw, = pipe.execute()
+        if raw is not None:
+            self._count(namespace, "redis_hit")
+            value = pickle.loads(raw)
+            lru.set(key, value)
+            return self._decode(value)
+
+        self._count(namespace, "miss")
+        value = self._encode(loader())
+        pipe = frappe.cache().pipeline()
+        pipe.hset(self._key(namespace), key, pickle.dumps(value))
+        pipe.execute()
+        lru.set(key, value)
+        return self._decode(value)
+
+    def get_many(
+        self,
+        namespace: str,
+        keys: List[str],
+        loader: Callable[[List[str]], Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        """
+        Resolve many keys with at most one Redis round trip and one loader call.
+
+        Args:
+            namespace: One of NAMESPACES
+            keys: Cache keys
+            loader: Called with the keys missing from both tiers; returns a
+                dict of the keys it found (absent keys are cached as not found)
+
+        Returns:
+            Dict of key -> value (None if not found) for every requested key
+        """
+        lru = self._local(namespace)
+        result = {}
+        missing = []
+
+        for key in keys:
+            value = lru.get(key, _MISSING)
+            if value is _MISSING:
+                missing.append(key)
+            else:
+                result[key] = value
+
+        self._count(namespace, "local_hit", len(result))
+
+        if missing:
+            pipe = frappe.cache().pipeline()
+            pipe.hmget(self._key(namespace), missing)
+            cached, = pipe.execute()
+            still_missing = []
+            for key, raw in zip(missing, cached):
+                if raw is None:
+                    still_missing.append(key)
+                    continue
+                value = pickle.loads(raw)
+                lru.set(key, value)
+                result[key] = value
+
+            self._count(namespace, "redis_hit", len(missing) - len(still_missing))
+
+            if still_missing:
+                self._count(namespace, "miss", len(still_missing))
+                loaded = loader(still_missing)
+                mapping = {}
+                for key in still_missing:
+                    value = self._encode(loaded.get(key))
+                    mapping[key] = pickle.dumps(value)
+                    lru.set(key, value)
+                    result[key] = value
+                pipe = frappe.cache().pipeline()
+                pipe.hset(self._key(namespace), mapping=mapping)
+                pipe.execute()
+
+        return {key: self._decode(value) for key, value in result.items()}
+
+    def clear(self, namespace: str | None = None):
+        """Drop cached entries (one or all namespaces) in Redis and in every worker."""
+        frappe.cache().delete(*[self._key(ns) for ns in ([namespace] if namespace else NAMESPACES)])
+
+        # Other workers notice the new token on their next request
+        frappe.cache().set_value(GENERATION_KEY, frappe.generate_hash(length=10))
+        self._sites.pop(frappe.local.site, None)
+
+    def stats(self) -> Dict:
+        """Hit/miss counters across all workers plus this worker's LRU sizes."""
+        self.flush_stats()
+        pipe = frappe.cache().pipeline()
+        pipe.hgetall(frappe.cache().make_key(STATS_KEY))
+        raw, = pipe.execute()
+        counters = {
+            (k.decode() if isinstance(k, bytes) else k): int(v)
+            for k, v in raw.items()
+        }
+
+        state = self._sites.get(frappe.local.site, {})
+        stats = {}
+        for ns in NAMESPACES:
+            local_hit = counters.get(f"{ns}:local_hit", 0)
+            redis_hit = counters.get(f"{ns}:redis_hit", 0)
+            miss = counters.get(f"{ns}:miss", 0)
+            total = local_hit + redis_hit + miss
+            stats[ns] = {
+                "local_hit": local_hit,
+                "redis_hit": redis_hit,
+                "miss": miss,
+                "hit_ratio": round((local_hit + redis_hit) / total, 4) if total else None,
+                "local_size": len(state[ns]) if ns in state else 0,
+            }
+        return stats
+
+    def reset_stats(self):
+        """Reset the shared hit/miss counters."""
+        with self._counters_lock:
+            self._counters.pop(frappe.local.site, None)
+        frappe.cache().delete(frappe.cache().make_key(STATS_KEY))
+
+    def flush_stats(self):
+        """Add this worker's pending counters for the current site to Redis."""
+        site = frappe.local.site
+        with self._counters_lock:
+            pending = self._counters.pop(site, None)
+            self._flushed_at[site] = time.monotonic()
+        if pending:
+            key = frappe.cache().make_key(STATS_KEY)
+            pipe = frappe.cache().pipeline()
+            for field, amount in pending.items():
+                pipe.hincrby(key, field, amount)
+            pipe.execute()
+
+    # -------------------------------------------------------------------------
+    # Internals
+    # -------------------------------------------------------------------------
+
+    def _local(self, namespace: str) -> LRUCache:
+        """Return this site's LRU for namespace, dropping stale generations."""
+        site = frappe.local.site
+        # get_value is memoized per request, so this is one Redis GET per request
+        generation = frappe.cache().get_value(GENERATION_KEY)
+
+        state = self._sites.get(site)
+        if state is None or state["generation"] != generation:
+            state = {"generation": generation}
+            state.update({ns: LRUCache() for ns in NAMESPACES})
+            self._sites[site] = state
+
+        return state[namespace]
+
+    def _key(self, namespace: str) -> str:
+        return frappe.cache().make_key(REDIS_KEY.format(namespace))
+
+    def _count(self, namespace: str, counter: str, amount: int = 1):
+        """Count locally; flush to Redis every STATS_FLUSH_EVERY / STATS_FLUSH_SECONDS."""
+        if not amount:
+            return
+        site = frappe.local.site
+        field = f"{namespace}:{counter}"
+        with self._counters_lock:
+            counters = self._counters.setdefault(site, {})
+            counters[field] = counters.get(field, 0) + amount
+            flushed_at = self._flushed_at.setdefault(site, time.monotonic())
+            due = (
+                sum(counters.values()) >= STATS_FLUSH_EVERY
+                or time.monotonic() - flushed_at >= STATS_FLUSH_SECONDS
+            )
+        if due:
+            self.flush_stats()
+
+    @staticmethod
+    def _encode(value):
+        return NOT_FOUND if value is None else value
+
+    @staticmethod
+    def _decode(value):
+        return None if value == NOT_FOUND else value
+
+
+# Singleton instance
+resolution_cache = ResolutionCache()
+
+
+# =============================================================================
+# INVALIDATION HOOKS (doc_events)
+# =============================================================================
+
+def _clear_after_commit(namespace: str):
+    """
+    Drop a namespace once the saving transaction commits.
+    
+    Clearing inside the transaction lets a concurrent lookup re-cache the
+    old row before the change is visible, and the stale mapping would then
+    be served for the whole TTL.
+    """
+    frappe.db.after_commit.add(lambda: resolution_cache.clear(namespace))
+
+
+def on_device_change(doc, method=None):
+    """Dahua Device saved/renamed/deleted: drop cached device mappings."""
+    _clear_after_commit("device")
+
+
+def on_employee_change(doc, method=None):
+    """Employee saved/renamed/deleted: drop cached employee mappings."""
+    _clear_after_commit("employee")
+
+
+# =============================================================================
+# WHITELISTED METHODS
+# =============================================================================
+
+@frappe.whitelist()
+def resolution_cache_stats() -> Dict:
+    """Hit and miss counters for the device/employee resolution cache."""
+    frappe.only_for("System Manager")
+    return resolution_cache.stats()
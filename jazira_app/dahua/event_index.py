@@ -0,0 +1,223 @@
+"""
+Persistent probabilistic index of stored dahua_event_ids.
+
+Offline replays can carry events that are days old, long after their Redis
+dedup keys expired. Instead of asking the database about every one of them,
+each (device SN, month) partition keeps a Bloom filter in a Redis bitmap:
+
+    definitely_new() -> True   event was never stored, skip the DB check
+    definitely_new() -> False  probably stored (or partition unknown), ask the DB
+
+A partition only answers "definitely new" once it has been rebuilt from
+Employee Checkin (it is then marked ready); unknown partitions schedule
+their own rebuild in the background. Inserts always add their ids, and
+rebuilds OR new bits into the live filter, so concurrent writes are never
+lost. Stale bits (deleted checkins) only cause an extra DB check.
+
+Rebuild manually with:
+    bench --site <site> rebuild-dahua-event-index [--device SN] [--month YYYY-MM]
+"""
+
+import calendar
+import hashlib
+from datetime import datetime
+from typing import Dict, Iterable, List, Tuple
+
+import frappe
+
+
+# =============================================================================
+# CONSTANTS
+# =============================================================================
+
+# 2^20 bits (128 KB) per partition, 7 hashes: ~1% false positives at ~100k
+# events per device per month
+BITS = 1 << 20
+HASHES = 7
+
+BLOOM_KEY = "dahua:bloom:{0}"
+READY_KEY = "dahua:bloom:{0}:ready"
+REBUILD_PENDING_KEY = "dahua:bloom:{0}:rebuild"
+
+RETENTION = 400 * 24 * 3600  # keep partitions a little over a year
+REBUILD_PAGE_SIZE = 20000
+
+
+def partition(device_sn: str, local_time: datetime) -> str:
+    """Partition name for a device and checkin time (local month)."""
+    return f"{device_sn}:{local_time:%Y%m}"
+
+
+def _positions(event_id: str) -> List[int]:
+    """Bit positions of an event id (Kirsch-Mitzenmacher double hashing)."""
+    digest = hashlib.blake2b(event_id.encode(), digest_size=16).digest()
+    h1 = int.from_bytes(digest[:8], "little")
+    h2 = int.from_bytes(digest[8:], "little") | 1
+    return [(h1 + i * h2) % BITS for i in range(HASHES)]
+
+
+# =============================================================================
+# INDEX
+# =============================================================================
+
+class EventIndex:
+    """Bloom filters of stored event ids, one per device SN and month."""
+
+    def add(self, entries: Iterable[Tuple[str, str, datetime]]):
+        """
+        Record stored events.
+
+        Args:
+            entries: (device_sn, event_id, local checkin time) tuples
+        """
+        redis = frappe.cache()
+        pipe = redis.pipeline()
+        touched = set()
+
+        for device_sn, event_id, local_time in entries:
+            key = redis.make_key(BLOOM_KEY.format(partition(device_sn, local_time)))
+            for position in _positions(event_id):
+                pipe.setbit(key, position, 1)
+            touched.add(key)
+
+        if not touched:
+            return
+
+        for key in touched:
+            pipe.expire(key, RETENTION)
+        pipe.execute()
+
+    def definitely_new(self, entries: List[Tuple[str, str, datetime]]) -> List[bool]:
+        """
+        Check events against the index in one pipelined round trip.
+
+        Args:
+            entries: (device_sn, event_id, local checkin time) tuples
+
+        Returns:
+            List aligned with entries: True if the event was certainly never
+            stored, False if it may have been (or the partition is not ready)
+        """
+        if not entries:
+            return []
+
+        redis = frappe.cache()
+        pipe = redis.pipeline()
+        partitions = []
+        for device_sn, event_id, local_time in entries:
+            name = partition(device_sn, local_time)
+            partitions.append(name)
+            pipe.exists(redis.make_key(READY_KEY.format(name)))
+            key = redis.make_key(BLOOM_KEY.format(name))
+            for position in _positions(event_id):
+                pipe.getbit(key, position)
+
+        replies = pipe.execute()
+        result = []
+        not_ready = set()
+        step = 1 + HASHES
+        for i, name in enumerate(partitions):
+            ready, *bits = replies[i * step:(i + 1) * step]
+            if not ready:
+                not_ready.add(name)
+                result.append(False)
+            else:
+                result.append(not all(bits))
+
+        for name in not_ready:
+            self._schedule_rebuild(name)
+
+        return result
+
+    def rebuild(self, device_sn: str | None = None, month: str | None = None) -> Dict[str, int]:
+        """
+        Rebuild partitions from Employee Checkin and mark them ready.
+
+        Args:
+            device_sn: Limit to one device (default: all devices)
+            month: Limit to one month, "YYYY-MM" or "YYYYMM" (default: all)
+
+        Returns:
+            Dict of partition -> number of event ids indexed
+        """
+        filters = {"checkin_source": "Dahua", "dahua_event_id": ["is", "set"]}
+        if device_sn:
+            filters["device_id"] = device_sn
+        if month:
+            year, mon = int(month.replace("-", "")[:4]), int(month.replace("-", "")[4:6])
+            last_day = calendar.monthrange(year, mon)[1]
+            filters["time"] = [
+                "between",
+                [f"{year:04d}-{mon:02d}-01 00:00:00", f"{year:04d}-{mon:02d}-{last_day:02d} 23:59:59"]
+            ]
+
+        redis = frappe.cache()
+        tmp_prefix = f"dahua:bloom:tmp:{frappe.generate_hash(length=8)}:"
+        counts = {}
+        start = 0
+
+        while True:
+            rows = frappe.get_all(
+                "Employee Checkin",
+                filters=filters,
+                fields=["device_id", "dahua_event_id", "time"],
+                order_by="name asc",
+                start=start,
+                page_length=REBUILD_PAGE_SIZE
+            )
+            if not rows:
+                break
+
+            pipe = redis.pipeline()
+            for row in rows:
+                name = partition(row.device_id, row.time)
+                counts[name] = counts.get(name, 0) + 1
+                key = redis.make_key(tmp_prefix + name)
+                for position in _positions(row.dahua_event_id):
+                    pipe.setbit(key, position, 1)
+            pipe.execute()
+            start += REBUILD_PAGE_SIZE
+
+        # A requested partition without checkins is valid (and empty)
+        if device_sn and month:
+            counts.setdefault(f"{device_sn}:{month.replace('-', '')[:6]}", 0)
+
+        pipe = redis.pipeline()
+        for name in counts:
+            live = redis.make_key(BLOOM_KEY.format(name))
+            tmp = redis.make_key(tmp_prefix + name)
+            if counts[name]:
+                # OR into the live filter: bits added by concurrent inserts survive
+                pipe.bitop("OR", live, live, tmp)
+                pipe.delete(tmp)
+                pipe.expire(live, RETENTION)
+            pipe.set(redis.make_key(READY_KEY.format(name)), frappe.utils.now(), ex=RETENTION)
+            pipe.delete(redis.make_key(REBUILD_PENDING_KEY.format(name)))
+        pipe.execute()
+
+        return counts
+
+    def _schedule_rebuild(self, name: str):
+        """Enqueue a background rebuild of one partition (at most once an hour)."""
+        redis = frappe.cache()
+        if not redis.set(redis.make_key(REBUILD_PENDING_KEY.format(name)), 1, nx=True, ex=3600):
+            return
+
+        device_sn, month = name.rsplit(":", 1)
+        frappe.enqueue(
+            "jazira_app.dahua.event_index.rebuild_partition",
+            queue="long",
+            job_id=f"dahua-event-index-{name}",
+            deduplicate=True,
+            device_sn=device_sn,
+            month=month
+        )
+
+
+# Singleton instance
+event_index = EventIndex()
+
+
+def rebuild_partition(device_sn: str, month: str):
+    """Background job entry point for on-demand partition rebuilds."""
+    event_index.rebuild(device_sn=device_sn, month=month)
@@ -0,0 +1,178 @@
+"""
+Hot-path instrumentation for the Dahua webhook.
+
+A sampled request records the wall time of each processing stage and, when
+it finishes, adds them to per-stage latency histograms in Redis with one
+pipelined round trip. Unsampled requests only pay for a random() call.
+
+Configure in site_config.json:
+    "dahua_metrics_sample_rate": 0.1   # fraction of requests to time (0..1)
+
+Usage:
+    metrics.begin()
+    with metrics.stage("dedup"):
+        ...
+    metrics.end()
+"""
+
+import bisect
+import random
+import time
+from contextlib import contextmanager
+from typing import Dict
+
+import frappe
+from frappe.utils import flt
+
+
+# =============================================================================
+# CONSTANTS
+# =============================================================================
+
+STAGES = (
+    "parse",
+    "device_lookup",
+    "employee_resolve",
+    "dedup",
+    "insert",
+    "commit",
+    "total",
+)
+
+# Histogram bucket upper bounds in milliseconds (last bucket is open-ended)
+BUCKETS_MS = (0.25, 0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+
+METRICS_KEY = "dahua:metrics:{0}"
+DEFAULT_SAMPLE_RATE = 0.1
+
+
+# =============================================================================
+# RECORDING
+# =============================================================================
+
+class _RequestTimer:
+    """Stage timings of one sampled request."""
+
+    __slots__ = ("started", "timings")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.timings = {}
+
+    def add(self, stage: str, seconds: float):
+        self.timings[stage] = self.timings.get(stage, 0.0) + seconds
+
+
+def begin(sample_rate: float | None = None):
+    """Start timing the current request if it falls into the sample."""
+    if sample_rate is None:
+        sample_rate = flt(frappe.conf.get("dahua_metrics_sample_rate", DEFAULT_SAMPLE_RATE))
+
+    sampled = sample_rate > 0 and (sample_rate >= 1 or random.random() < sample_rate)
+    frappe.local.dahua_timer = _RequestTimer() if sampled else None
+
+
+@contextmanager
+def stage(name: str):
+    """Time a block as `name`; no-op when the request is not sampled."""
+    timer = getattr(frappe.local, "dahua_timer", None)
+    if timer is None:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timer.add(name, time.perf_counter() - start)
+
+
+def end():
+    """Flush the current request's timings to Redis (one pipeline)."""
+    timer = getattr(frappe.local, "dahua_timer", None)
+    frappe.local.dahua_timer = None
+    if timer is None:
+        return
+
+    timer.add("total", time.perf_counter() - timer.started)
+
+    try:
+        redis = frappe.cache()
+        pipe = redis.pipeline()
+        for name, seconds in timer.timings.items():
+            key = redis.make_key(METRICS_KEY.format(name))
+            ms = seconds * 1000
+            pipe.hincrby(key, _bucket(ms), 1)
+            pipe.hincrby(key, "count", 1)
+            pipe.hincrbyfloat(key, "sum_ms", ms)
+        pipe.execute()
+    except Exception:
+        # Metrics must never fail a webhook
+        pass
+
+
+def _bucket(ms: float) -> str:
+    index = bisect.bisect_left(BUCKETS_MS, ms)
+    return f"le:{BUCKETS_MS[index]}" if index < len(BUCKETS_MS) else "le:inf"
+
+
+# =============================================================================
+# REPORTING
+# =============================================================================
+
+def summary() -> Dict:
+    """
+    Per-stage latency summary computed from the Redis histograms.
+
+    Returns:
+        {stage: {"count", "mean_ms", "p50_ms", "p95_ms", "p99_ms"}}
+    """
+    redis = frappe.cache()
+    pipe = redis.pipeline()
+    for name in STAGES:
+        pipe.hgetall(redis.make_key(METRICS_KEY.format(name)))
+
+    result = {}
+    for name, raw in zip(STAGES, pipe.execute()):
+        data = {
+            (k.decode() if isinstance(k, bytes) else k): float(v)
+            for k, v in (raw or {}).items()
+        }
+        count = int(data.get("count", 0))
+        if not count:
+            continue
+
+        buckets = [(bound, data.get(f"le:{bound}", 0)) for bound in BUCKETS_MS]
+        buckets.append((float("inf"), data.get("le:inf", 0)))
+
+        result[name] = {
+            "count": count,
+            "mean_ms": round(data.get("sum_ms", 0) / count, 3),
+            "p50_ms": _percentile(buckets, count, 0.50),
+            "p95_ms": _percentile(buckets, count, 0.95),
+            "p99_ms": _percentile(buckets, count, 0.99),
+        }
+
+    return result
+
+
+def reset():
+    """Drop all recorded histograms."""
+    redis = frappe.cache()
+    redis.delete(*[redis.make_key(METRICS_KEY.format(name)) for name in STAGES])
+
+
+def _percentile(buckets: list, count: int, q: float) -> float | None:
+    """Estimate a percentile by linear interpolation inside its bucket."""
+    target = q * count
+    cumulative = 0
+    lower = 0.0
+    for upper, bucket_count in buckets:
+        if bucket_count and cumulative + bucket_count >= target:
+            if upper == float("inf"):
+                return lower
+            fraction = (target - cumulative) / bucket_count
+            return round(lower + (upper - lower) * fraction, 3)
+        cumulative += bucket_count
+        lower = upper
+    return lower
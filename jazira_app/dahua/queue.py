@@ -0,0 +1,131 @@
+"""
+Reliable Redis list queue used by the Dahua ingest paths.
+
+    push()    LPUSH onto <key>, returns the queue length
+    claim(n)  RPOPLPUSH up to n items into <key>:processing (FIFO)
+    ack()     drop <key>:processing once the batch is committed
+    pending() items left in <key>:processing by a crashed consumer
+
+Only one consumer may drain a queue at a time (see lock()), so the
+processing list always belongs to the current lock holder. Items that keep
+failing are moved to <key>:dead together with the error.
+
+Every list command runs on a pipeline (the plain redis client) with
+make_key'd names. RedisWrapper's own lpush/lrange/llen would prefix the
+key a second time, and its lpush takes a single value.
+"""
+
+import json
+import time
+from contextlib import contextmanager
+from typing import Dict, List
+
+import frappe
+
+
+class RedisQueue:
+    """At-least-once FIFO queue on top of Redis lists (per site)."""
+
+    def __init__(self, key: str, lock_timeout: int = 300):
+        self.key = key
+        self.processing_key = f"{key}:processing"
+        self.dead_key = f"{key}:dead"
+        self.lock_key = f"{key}:lock"
+        self.lock_timeout = lock_timeout
+
+    def push(self, *items: Dict) -> int:
+        """Append items (JSON-serializable dicts) to the queue. Returns the queue length."""
+        if not items:
+            return len(self)
+        pipe = self._redis.pipeline()
+        pipe.lpush(self._key(self.key), *[self._dumps(item) for item in items])
+        length, = pipe.execute()
+        return length
+
+    def claim(self, count: int) -> List[Dict]:
+        """Move up to `count` items into the processing list and return them."""
+        pipe = self._redis.pipeline()
+        for _ in range(count):
+            pipe.rpoplpush(self._key(self.key), self._key(self.processing_key))
+        return [self._loads(raw) for raw in pipe.execute() if raw is not None]
+
+    def pending(self) -> List[Dict]:
+        """Items claimed by a previous consumer that never acknowledged them."""
+        pipe = self._redis.pipeline()
+        pipe.lrange(self._key(self.processing_key), 0, -1)
+        raw, = pipe.execute()
+        # Processing list is filled with LPUSH semantics, oldest item is last
+        return [self._loads(item) for item in reversed(raw)]
+
+    def ack(self):
+        """Acknowledge everything currently in the processing list."""
+        self._redis.delete(self._key(self.processing_key))
+
+    def dead_letter(self, item: Dict, error: str):
+        """Park an item that could not be processed."""
+        pipe = self._redis.pipeline()
+        pipe.lpush(
+            self._key(self.dead_key),
+            self._dumps({"item": item, "error": error, "failed_at": time.time()})
+        )
+        pipe.execute()
+
+    def requeue_dead(self) -> int:
+        """Move all dead letters back onto the queue. Returns the count."""
+        moved = 0
+        while True:
+            pipe = self._redis.pipeline()
+            pipe.rpop(self._key(self.dead_key))
+            raw, = pipe.execute()
+            if raw is None:
+                return moved
+            self.push(self._loads(raw)["item"])
+            moved += 1
+
+    def stats(self) -> Dict:
+        """Queue, processing and dead-letter lengths."""
+        pipe = self._redis.pipeline()
+        pipe.llen(self._key(self.key))
+        pipe.llen(self._key(self.processing_key))
+        pipe.llen(self._key(self.dead_key))
+        queued, processing, dead = pipe.execute()
+        return {"queued": queued, "processing": processing, "dead": dead}
+
+    def __len__(self):
+        pipe = self._redis.pipeline()
+        pipe.llen(self._key(self.key))
+        length, = pipe.execute()
+        return length
+
+    @contextmanager
+    def lock(self):
+        """
+        Single-consumer lock. Yields True if acquired, False otherwise.
+
+        The lock expires after lock_timeout so a crashed consumer does not
+        block the queue forever; the next holder recovers pending() items.
+        """
+        token = frappe.generate_hash(length=10)
+        acquired = self._redis.set(
+            self._key(self.lock_key), token, nx=True, ex=self.lock_timeout
+        )
+        try:
+            yield bool(acquired)
+        finally:
+            if acquired and self._redis.get(self._key(self.lock_key)) == token.encode():
+                self._redis.delete(self._key(self.lock_key))
+
+    @property
+    def _redis(self):
+        return frappe.cache()
+
+    def _key(self, key: str) -> str:
+        return self._redis.make_key(key)
+
+    @staticmethod
+    def _dumps(item: Dict) -> str:
+        return json.dumps(item, default=str)
+
+    @staticmethod
+    def _loads(raw) -> Dict:
+        return json.loads(raw)
@@ -15,8 +15,9 @@ These tests cover:
 import frappe
 from frappe.tests.utils import FrappeTestCase
 from datetime import datetime
-from unittest.mock import patch, MagicMock
+from unittest.mock import call, patch, MagicMock
 import json
+import time
 
 
 class TestDahuaIntegration(FrappeTestCase):
@@ -70,8 +71,10 @@ class TestDahuaIntegration(FrappeTestCase):
         """Clean up test checkins after each test."""
         frappe.db.delete("Employee Checkin", {"checkin_source": "Dahua"})
         frappe.db.commit()
-        # Clear Redis cache
-        frappe.cache().delete_keys("dahua:event:*")
+        # Clear Redis dedup claims (raw, un-prefixed keys)
+        keys = frappe.cache().keys("dahua:event:*")
+        if keys:
+            frappe.cache().delete(*keys)
     
     # =========================================================================
     # Filter Tests
@@ -433,27 +436,415 @@ class TestDahuaIntegration(FrappeTestCase):
         # Should be naive (no tzinfo)
         self.assertIsNone(local_dt.tzinfo)
     
+    def test_tc15b_epoch_conversion_is_done_once_per_batch(self):
+        """TC-15b: Conversion never re-reads settings and is computed per hour, not per event."""
+        from jazira_app.dahua import api
+        from jazira_app.dahua.api import _convert_epoch_to_local
+        from jazira_app.jazira_app.services.timezone_service import timezone_service
+        
+        _convert_epoch_to_local(1706745600)  # warm the per-worker cache
+        
+        # 2,000 epochs over ~54 hours: two exact offsets per hour bucket
+        epochs = [1706745600 + i * 97 for i in range(2_000)]
+        buckets = {epoch // timezone_service.OFFSET_BUCKET for epoch in epochs}
+        with patch("frappe.db.get_single_value") as get_single_value, \
+                patch.object(timezone_service, "_utcoffset", wraps=timezone_service._utcoffset) as utcoffset:
+            converted = timezone_service.epochs_to_local(epochs)
+            for _ in range(1_000):
+                _convert_epoch_to_local(1706745600)
+        
+        get_single_value.assert_not_called()
+        self.assertEqual(utcoffset.call_count, 2 * len(buckets))
+        
+        # Vectorized path agrees with the per-event path
+        self.assertEqual(converted, [_convert_epoch_to_local(e) for e in epochs])
+        
+        # The batch endpoint converts the whole batch in one vectorized call
+        events = [
+            {"Code": "AccessControl", "Action": "Offline",
+             "Data": {"SN": "TEST123", "UserID": "777", "AttendanceState": state, "UTC": 1706770800 + state * 60, "BlockId": 450 + state}}
+            for state in (1, 2, 3)
+        ]
+        with patch.object(api.timezone_service, "epoch_to_local") as epoch_to_local, \
+                patch.object(api.timezone_service, "epochs_to_local", wraps=timezone_service.epochs_to_local) as epochs_to_local:
+            results = api._process_events_batch(events)
+        
+        epoch_to_local.assert_not_called()
+        self.assertIn(call([1706770860, 1706770920, 1706770980]), epochs_to_local.call_args_list)
+        self.assertEqual([r["status"] for r in results], ["processed"] * 3)
+    
+    # =========================================================================
+    # Batch Ingestion Tests
+    # =========================================================================
+    
+    def test_tc16_batch_creates_checkins_and_reports_status(self):
+        """TC-16: Batch endpoint inserts new events and reports per-event status."""
+        from jazira_app.dahua.api import _process_events_batch
+        
+        events = [
+            {"Code": "AccessControl", "Action": "Offline",
+             "Data": {"SN": "TEST123", "UserID": "777", "AttendanceState": 1, "UTC": 1706770800, "BlockId": 401}},
+            {"Code": "AccessControl", "Action": "Offline",
+             "Data": {"SN": "TEST123", "UserID": "777", "AttendanceState": 2, "UTC": 1706803200, "BlockId": 402}},
+            # Same event replayed inside the batch
+            {"Code": "AccessControl", "Action": "Offline",
+             "Data": {"SN": "TEST123", "UserID": "777", "AttendanceState": 2, "UTC": 1706803200, "BlockId": 402}},
+            {"Code": "DoorStatus", "Data": {"Status": "Open"}},
+            {"Code": "AccessControl", "Action": "Offline",
+             "Data": {"SN": "UNKNOWN_DEVICE", "UserID": "777", "AttendanceState": 1, "UTC": 1706770800, "BlockId": 403}},
+        ]
+        
+        results = _process_events_batch(events)
+        frappe.db.commit()
+        
+        self.assertEqual(
+            [r["status"] for r in results],
+            ["processed", "processed", "duplicate", "ignored", "ignored"]
+        )
+        self.assertEqual(results[4]["reason"], "device_not_found")
+        self.assertEqual(frappe.db.count("Employee Checkin", {"checkin_source": "Dahua"}), 2)
+        
+        # Replaying the whole batch inserts nothing new
+        results = _process_events_batch(events[:2])
+        self.assertEqual([r["status"] for r in results], ["duplicate", "duplicate"])
+    
+    def test_tc17_async_ingest_queues_then_persists(self):
+        """TC-17: Async mode queues the event; the consumer writes the checkin."""
+        from jazira_app.dahua import api
+        
+        event = {
+            "Code": "AccessControl",
+            "Action": "Pulse",
+            "Data": {"SN": "TEST123", "UserID": "777", "AttendanceState": 1, "UTC": 1706770800, "BlockId": 501}
+        }
+        
+        self.assertEqual(api._enqueue_event(event)["status"], "queued")
+        # Retry of the same event is dropped at the edge
+        self.assertEqual(api._enqueue_event(event)["status"], "ignored")
+        self.assertEqual(frappe.db.count("Employee Checkin", {"checkin_source": "Dahua"}), 0)
+        
+        api.drain_ingest_queue()
+        
+        self.assertEqual(frappe.db.count("Employee Checkin", {"checkin_source": "Dahua"}), 1)
+        self.assertEqual(api.ingest_queue.stats()["queued"], 0)
+        self.assertEqual(api.ingest_queue.stats()["processing"], 0)
+    
+    def test_tc17b_dropped_queued_events_release_their_claims(self):
+        """TC-17b: Events the consumer ignores or dead-letters can be pushed again."""
+        from jazira_app.dahua import api
+        
+        def event(user_id, block_id):
+            return {
+                "Code": "AccessControl",
+                "Action": "Pulse",
+                "Data": {"SN": "TEST123", "UserID": user_id, "AttendanceState": 1, "UTC": 1706770800, "BlockId": block_id}
+            }
+        
+        # Employee not enrolled yet: ignored by the consumer, claim released
+        self.assertEqual(api._enqueue_event(event("999", 511))["status"], "queued")
+        api.drain_ingest_queue()
+        self.assertEqual(api._enqueue_event(event("999", 511))["status"], "queued")
+        api.drain_ingest_queue()
+        
+        # Dead-lettered: not stored, claim released
+        self.assertEqual(api._enqueue_event(event("777", 512))["status"], "queued")
+        with patch.object(api, "_bulk_insert_checkins", side_effect=Exception("Deadlock")):
+            api.drain_ingest_queue()
+        self.assertEqual(api.ingest_queue.stats()["dead"], 1)
+        self.assertEqual(frappe.db.count("Employee Checkin", {"checkin_source": "Dahua"}), 0)
+        self.assertEqual(api._enqueue_event(event("777", 512))["status"], "queued")
+        
+        api.drain_ingest_queue()
+        self.assertEqual(frappe.db.count("Employee Checkin", {"checkin_source": "Dahua"}), 1)
+        frappe.cache().delete(api.ingest_queue._key(api.ingest_queue.dead_key))
+    
+    def test_tc23_failed_commit_releases_claims_for_retry(self):
+        """TC-23: A rolled-back request releases its claims, so the device retry is stored."""
+        from jazira_app.dahua import api
+        
+        payload = {
+            "Code": "AccessControl",
+            "Action": "Pulse",
+            "Data": {"SN": "TEST123", "UserID": "777", "AttendanceState": 1, "UTC": 1706774400, "BlockId": 1001}
+        }
+        request = MagicMock()
+        request.get_json.return_value = payload
+        
+        with patch.object(api.frappe, "request", request, create=True), \
+                patch.object(api.frappe.local, "response", frappe._dict(), create=True):
+            with patch.object(api.frappe.db, "commit", side_effect=Exception("Lost connection")):
+                self.assertIn("error", api._receive_event())
+            self.assertEqual(frappe.db.count("Employee Checkin", {"checkin_source": "Dahua"}), 0)
+            
+            self.assertEqual(api._receive_event()["status"], "processed")
+        self.assertEqual(frappe.db.count("Employee Checkin", {"checkin_source": "Dahua"}), 1)
+        
+        # Batch path: a failure after the insert rolls back and releases too
+        payload = dict(payload, Data=dict(payload["Data"], UTC=1706778000, BlockId=1002))
+        with patch.object(api, "_index_inserted", side_effect=Exception("Redis down")):
+            self.assertRaises(Exception, api._process_events_batch, [payload])
+        frappe.db.rollback()
+        self.assertEqual(api._process_events_batch([payload])[0]["status"], "processed")
+    
+    def test_tc22_write_behind_buffer_flushes_and_recovers(self):
+        """TC-22: Buffered checkins are bulk-flushed, including rows of a crashed flush."""
+        from jazira_app.dahua import api
+        
+        def event(block_id, epoch):
+            return {
+                "Code": "AccessControl",
+                "Action": "Pulse",
+                "Data": {"SN": "TEST123", "UserID": "777", "AttendanceState": 1, "UTC": epoch, "BlockId": block_id}
+            }
+        
+        with patch.object(api, "_write_behind_enabled", return_value=True), \
+                patch.object(api, "_flush_size", return_value=2), \
+                patch.object(api.frappe, "enqueue") as enqueue:
+            self.assertTrue(api._process_event(event(801, 1706770800)))
+            enqueue.assert_not_called()
+            self.assertTrue(api._process_event(event(802, 1706774400)))
+            # A full batch is flushed by a short job instead of waiting for cron
+            enqueue.assert_called_once()
+            self.assertEqual(frappe.db.count("Employee Checkin", {"checkin_source": "Dahua"}), 0)
+            
+            # A flush that died after claiming leaves its rows in processing;
+            # the next run drains the buffer once and returns
+            api.checkin_buffer.claim(1)
+            started = time.monotonic()
+            api.flush_checkin_buffer()
+            self.assertLess(time.monotonic() - started, 10)
+        
+        self.assertEqual(frappe.db.count("Employee Checkin", {"checkin_source": "Dahua"}), 2)
+        self.assertEqual(api.checkin_buffer.stats(), {"queued": 0, "processing": 0, "dead": 0})
+    
+    def test_redis_queue_round_trips_batches_on_one_key(self):
+        """Pushed batches are claimed FIFO, recovered from processing and dead-lettered on one key."""
+        from jazira_app.dahua.queue import RedisQueue
+        
+        queue = RedisQueue(f"dahua:test_queue:{frappe.generate_hash(length=6)}")
+        try:
+            queue.push({"n": 1}, {"n": 2}, {"n": 3})
+            self.assertEqual(len(queue), 3)
+            self.assertEqual(queue.claim(2), [{"n": 1}, {"n": 2}])
+            self.assertEqual(queue.pending(), [{"n": 1}, {"n": 2}])
+            self.assertEqual(queue.stats(), {"queued": 1, "processing": 2, "dead": 0})
+            
+            queue.ack()
+            queue.dead_letter({"n": 3}, "boom")
+            self.assertEqual(queue.requeue_dead(), 1)
+            self.assertEqual(queue.claim(5), [{"n": 3}, {"n": 3}])
+        finally:
+            frappe.cache().delete(*[
+                frappe.cache().make_key(key)
+                for key in (queue.key, queue.processing_key, queue.dead_key)
+            ])
+    
+    def test_benchmark_direct_run_creates_checkins(self):
+        """Smoke: bench fixtures resolve through _lookup_employee and the run writes checkins."""
+        from jazira_app.dahua import benchmark
+        
+        report = benchmark.run(
+            devices=1, events=10, concurrency=1, employees=2,
+            company="Test Jazira Sub", keep=True
+        )
+        try:
+            self.assertGreater(report["statuses"].get("processed", 0), 0)
+            self.assertGreater(
+                frappe.db.count("Employee Checkin", {"device_id": ["like", f"{benchmark.DEVICE_PREFIX}%"]}),
+                0
+            )
+        finally:
+            benchmark.cleanup()
+    
+    def test_tc18_sampled_request_records_stage_latency(self):
+        """TC-18: A sampled request adds per-stage timings to the histograms."""
+        from jazira_app.dahua import metrics
+        from jazira_app.dahua.api import _process_event
+        
+        metrics.reset()
+        metrics.begin(sample_rate=1)
+        _process_event({
+            "Code": "AccessControl",
+            "Action": "Pulse",
+            "Data": {"SN": "TEST123", "UserID": "777", "AttendanceState": 1, "UTC": 1706770800, "BlockId": 601}
+        })
+        metrics.end()
+        
+        summary = metrics.summary()
+        for stage in ("parse", "device_lookup", "employee_resolve", "dedup", "insert", "total"):
+            self.assertEqual(summary[stage]["count"], 1)
+            self.assertLessEqual(summary[stage]["p50_ms"], summary[stage]["p99_ms"])
+    
+    def test_tc19_claim_is_atomic_and_released_on_failure(self):
+        """TC-19: Only one claim wins per event_id; a failed insert frees it."""
+        from jazira_app.dahua.api import _claim_event, _claim_events, _release_events
+        
+        self.assertTrue(_claim_event("TEST123-CLAIM-1", db_fallback=False))
+        self.assertFalse(_claim_event("TEST123-CLAIM-1", db_fallback=False))
+        
+        claimed = _claim_events([("TEST123-CLAIM-1", None, None), ("TEST123-CLAIM-2", None, None)])
+        self.assertEqual(claimed, {"TEST123-CLAIM-2"})
+        
+        _release_events(["TEST123-CLAIM-1"])
+        self.assertTrue(_claim_event("TEST123-CLAIM-1", db_fallback=False))
+    
+    def test_tc20_event_index_skips_db_for_new_replays(self):
+        """TC-20: Old replayed events are proven new by the Bloom index."""
+        from jazira_app.dahua import api
+        from jazira_app.dahua.event_index import event_index
+        
+        epoch = 1706770800  # far outside the Redis dedup window
+        month = api._convert_epoch_to_local(epoch).strftime("%Y-%m")
+        event_index.rebuild(device_sn="TEST123", month=month)
+        
+        payload = {
+            "Code": "AccessControl",
+            "Action": "Offline",
+            "Data": {"SN": "TEST123", "UserID": "777", "AttendanceState": 1, "UTC": epoch, "BlockId": 701}
+        }
+        with patch.object(api.frappe.db, "exists", wraps=api.frappe.db.exists) as exists:
+            self.assertTrue(api._process_event(payload))
+        self.assertFalse(any(
+            call.args and call.args[0] == "Employee Checkin" for call in exists.call_args_list
+        ))
+        
+        # Redis claim gone (e.g. after a flush): the index now says "maybe",
+        # so the database rejects the replay
+        frappe.cache().delete(f"{api.CACHE_PREFIX}TEST123-777-{epoch}-1")
+        self.assertFalse(api._process_event(payload))
+    
+    def test_tc21_pull_sync_from_device_stub(self):
+        """TC-21: Pull sync fetches device records in pages and resumes at the mark."""
+        import threading
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        from urllib.parse import parse_qs, urlparse
+        from jazira_app.dahua import pull_sync
+        
+        base = int(datetime.now().timestamp()) - 3600
+        device_log = [
+            {"RecNo": 1, "UserID": "777", "AttendanceState": 1, "CreateTime": base},
+            {"RecNo": 2, "UserID": "777", "AttendanceState": 5, "CreateTime": base + 600},
+            {"RecNo": 3, "UserID": "999999", "AttendanceState": 3, "CreateTime": base + 900},
+            {"RecNo": 4, "UserID": "777", "AttendanceState": 2, "CreateTime": base + 1800},
+        ]
+        
+        class DeviceStub(BaseHTTPRequestHandler):
+            def do_GET(self):
+                query = {k: v[0] for k, v in parse_qs(urlparse(self.path).query).items()}
+                rows = [
+                    r for r in device_log
+                    if int(query["StartTime"]) <= r["CreateTime"] <= int(query["EndTime"])
+                ][:int(query["count"])]
+                lines = [f"found={len(rows)}"]
+                for i, row in enumerate(rows):
+                    lines += [f"records[{i}].{k}={v}" for k, v in row.items()]
+                body = "\r\n".join(lines).encode()
+                self.send_response(200)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            
+            def log_message(self, *args):
+                pass
+        
+        server = ThreadingHTTPServer(("127.0.0.1", 0), DeviceStub)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        frappe.db.set_value("Dahua Device", "TEST123", {
+            "enable_pull_sync": 1,
+            "device_url": f"http://127.0.0.1:{server.server_port}",
+            "last_synced_epoch": base - 1,
+            "last_synced_rec_no": 0,
+        })
+        try:
+            with patch.object(pull_sync, "PAGE_SIZE", 2):
+                first = pull_sync.sync_device("TEST123")
+                second = pull_sync.sync_device("TEST123")
+        finally:
+            server.shutdown()
+            frappe.db.set_value("Dahua Device", "TEST123", {
+                "enable_pull_sync": 0, "device_url": None,
+                "last_synced_epoch": 0, "last_synced_rec_no": 0,
+            })
+            frappe.db.commit()
+        
+        self.assertEqual(first["fetched"], 4)
+        self.assertEqual(first["processed"], 3)
+        self.assertEqual(first["ignored"], 1)
+        self.assertEqual(second["fetched"], 0)
+        self.assertTrue(frappe.db.exists("Employee Checkin", {"dahua_event_id": f"TEST123-777-{base + 1800}-2"}))
+    
+    def test_parse_record_finder(self):
+        """recordFinder.cgi text responses are parsed into ordered records."""
+        from jazira_app.dahua.pull_sync import parse_record_finder
+        
+        records = parse_record_finder(
+            "found=2\r\nrecords[1].RecNo=8\r\nrecords[0].RecNo=7\r\n"
+            "records[0].UserID=777\r\nrecords[1].UserID=778\r\n"
+        )
+        self.assertEqual(records, [{"RecNo": "7", "UserID": "777"}, {"RecNo": "8", "UserID": "778"}])
+    
     # =========================================================================
     # Helper Function Tests
     # =========================================================================
     
     def test_event_id_generation_offline(self):
-        """Event ID for Offline should use RecNo."""
+        """Event ID for Offline records uses CreateTime, not RecNo."""
         from jazira_app.dahua.api import _generate_event_id
         
-        data = {"UserID": "777", "RecNo": 12345}
+        data = {"UserID": "777", "RecNo": 12345, "CreateTime": 1706770800}
         event_id = _generate_event_id("SN123", data, "Offline", 1)
         
-        self.assertEqual(event_id, "SN123-R12345-777-1")
+        self.assertEqual(event_id, "SN123-777-1706770800-1")
     
     def test_event_id_generation_pulse(self):
-        """Event ID for Pulse should use BlockId."""
+        """Event ID for Pulse uses UTC, not BlockId."""
         from jazira_app.dahua.api import _generate_event_id
         
-        data = {"UserID": "777", "BlockId": 5}
+        data = {"UserID": "777", "BlockId": 5, "UTC": 1706770800}
         event_id = _generate_event_id("SN123", data, "Pulse", 5)
         
-        self.assertEqual(event_id, "SN123-B5-777-5")
+        self.assertEqual(event_id, "SN123-777-1706770800-5")
+    
+    def test_pulled_record_deduplicates_pushed_event(self):
+        """The same punch pushed by the webhook and pulled from the log is stored once."""
+        from jazira_app.dahua.api import _process_event
+        from jazira_app.dahua.pull_sync import record_to_payload
+        
+        epoch = 1706770800
+        pushed = {
+            "Code": "AccessControl",
+            "Action": "Pulse",
+            "Data": {"SN": "TEST123", "UserID": "777", "AttendanceState": 1, "UTC": epoch, "BlockId": 901}
+        }
+        pulled = record_to_payload("TEST123", {
+            "RecNo": 17, "UserID": "777", "AttendanceState": 1, "CreateTime": epoch
+        })
+        
+        self.assertTrue(_process_event(pushed))
+        self.assertFalse(_process_event(pulled))
+        self.assertEqual(frappe.db.count("Employee Checkin", {"checkin_source": "Dahua"}), 1)
+    
+    def test_punch_stored_under_old_event_id_is_duplicate(self):
+        """A punch stored before the canonical id format is reported as duplicate, not raised."""
+        from jazira_app.dahua.api import _process_event, _release_events
+        
+        epoch = 1706774400
+        event = {
+            "Code": "AccessControl",
+            "Action": "Pulse",
+            "Data": {"SN": "TEST123", "UserID": "777", "AttendanceState": 1, "UTC": epoch, "BlockId": 902}
+        }
+        self.assertTrue(_process_event(event))
+        
+        # Rewrite the stored row to a legacy id and forget the Redis claim
+        new_id = f"TEST123-777-{epoch}-1"
+        frappe.db.set_value(
+            "Employee Checkin", {"dahua_event_id": new_id}, "dahua_event_id", "TEST123-902-777-1"
+        )
+        _release_events([new_id])
+        
+        self.assertFalse(_process_event(event))
+        self.assertEqual(frappe.db.count("Employee Checkin", {"checkin_source": "Dahua"}), 1)
     
     def test_employee_resolution_by_employee_id(self):
         """Employee should be resolved by employee_id field."""
@@ -468,3 +859,77 @@ class TestDahuaIntegration(FrappeTestCase):
         
         employee = _resolve_employee("777", "Wrong Company")
         self.assertIsNone(employee)
+    
+    # =========================================================================
+    # Resolution Cache Tests
+    # =========================================================================
+    
+    def test_resolution_cache_serves_repeat_lookups(self):
+        """Repeat employee lookups are served without hitting the database."""
+        from jazira_app.dahua import api
+        from jazira_app.dahua.cache import resolution_cache
+        
+        resolution_cache.clear()
+        with patch.object(api, "_lookup_employee", wraps=api._lookup_employee) as lookup:
+            first = api._resolve_employee("777", "Test Jazira Sub")
+            second = api._resolve_employee("777", "Test Jazira Sub")
+        
+        self.assertEqual(first, second)
+        self.assertEqual(lookup.call_count, 1)
+    
+    def test_resolution_cache_tiers_share_one_redis_key(self):
+        """get() and get_many() read each other's Redis entries; counters are flushed in batches."""
+        from jazira_app.dahua.cache import resolution_cache
+        
+        resolution_cache.clear()
+        resolution_cache.reset_stats()
+        self.assertEqual(resolution_cache.get("device", "SN-A", lambda: {"name": "SN-A"}), {"name": "SN-A"})
+        
+        # Drop this worker's LRU so the next lookups go to Redis
+        resolution_cache._sites.pop(frappe.local.site, None)
+        loader = MagicMock(return_value={})
+        found = resolution_cache.get_many("device", ["SN-A", "SN-B"], loader)
+        self.assertEqual(found, {"SN-A": {"name": "SN-A"}, "SN-B": None})
+        loader.assert_called_once_with(["SN-B"])
+        
+        resolution_cache._sites.pop(frappe.local.site, None)
+        self.assertIsNone(resolution_cache.get("device", "SN-B", lambda: {"name": "SN-B"}))
+        self.assertEqual(resolution_cache.get("device", "SN-A", lambda: None), {"name": "SN-A"})
+        self.assertEqual(resolution_cache.get("device", "SN-A", lambda: None), {"name": "SN-A"})
+        
+        # stats() flushes this worker's counters before reading them
+        stats = resolution_cache.stats()["device"]
+        self.assertEqual(
+            (stats["local_hit"], stats["redis_hit"], stats["miss"]), (1, 3, 2)
+        )
+        resolution_cache.clear()
+        resolution_cache.reset_stats()
+    
+    def test_resolution_cache_stats_requires_system_manager(self):
+        """The cache stats endpoint is gated like the other Dahua diagnostics."""
+        from jazira_app.dahua.cache import resolution_cache_stats
+        
+        frappe.set_user("Guest")
+        try:
+            self.assertRaises(frappe.PermissionError, resolution_cache_stats)
+        finally:
+            frappe.set_user("Administrator")
+    
+    def test_resolution_cache_invalidated_on_device_save(self):
+        """Deactivating a device is visible as soon as it is committed despite the cache."""
+        from jazira_app.dahua.api import _get_active_device
+        
+        self.assertIsNotNone(_get_active_device("TEST123"))
+        
+        device = frappe.get_doc("Dahua Device", "TEST123")
+        device.is_active = 0
+        device.save(ignore_permissions=True)
+        try:
+            # Cleared only once the change is committed
+            self.assertIsNotNone(_get_active_device("TEST123"))
+            frappe.db.commit()
+            self.assertIsNone(_get_active_device("TEST123"))
+        finally:
+            device.is_active = 1
+            device.save(ignore_permissions=True)
+            frappe.db.commit()
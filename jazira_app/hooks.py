@@ -99,6 +99,34 @@ doc_events = {
         "validate": "jazira_app.overrides.sales_invoice.on_validate",
         "on_submit": "jazira_app.overrides.sales_invoice.on_submit",
     },
+    "Dahua Device": {
+        # Dahua webhook resolution cache invalidation
+        "on_update": "jazira_app.dahua.cache.on_device_change",
+        "after_rename": "jazira_app.dahua.cache.on_device_change",
+        "on_trash": "jazira_app.dahua.cache.on_device_change",
+    },
+    "Employee": {
+        "on_update": "jazira_app.dahua.cache.on_employee_change",
+        "after_rename": "jazira_app.dahua.cache.on_employee_change",
+        "on_trash": "jazira_app.dahua.cache.on_employee_change",
+    },
+    "System Settings": {
+        # Cached site timezone (Dahua checkin time conversion)
+        "on_update": "jazira_app.jazira_app.services.timezone_service.on_system_settings_change",
+    },
+    "BOM": {
+        # Daily sales import default BOM / recipe cache
+        "on_submit": "jazira_app.jazira_app.services.bom_service.on_bom_change",
+        "on_cancel": "jazira_app.jazira_app.services.bom_service.on_bom_change",
+        "on_update_after_submit": "jazira_app.jazira_app.services.bom_service.on_bom_change",
+    },
+    "Item": {
+        # Daily sales import item matcher indexes
+        "on_update": "jazira_app.jazira_app.services.item_matcher.on_item_change",
+        "after_rename": "jazira_app.jazira_app.services.item_matcher.on_item_change",
+        "on_trash": "jazira_app.jazira_app.services.item_matcher.on_item_change",
+        "after_delete": "jazira_app.jazira_app.services.item_matcher.on_item_change",
+    },
 }
 # Each item in the list will be shown as an app in the apps page
 # add_to_apps_screen = [
@@ -240,6 +268,23 @@ doctype_js = {
 # Scheduled Tasks
 # ---------------
 
+scheduler_events = {
+    "cron": {
+        "* * * * *": [
+            # Dahua async ingest consumer (no-op when the queue is empty)
+            "jazira_app.dahua.api.drain_ingest_queue",
+            # Dahua checkin write-behind flush (drains the buffer once per tick)
+            "jazira_app.dahua.api.flush_checkin_buffer",
+        ],
+        "*/10 * * * *": [
+            # Dahua pull-mode reconciliation (devices with Enable Pull Sync)
+            "jazira_app.dahua.pull_sync.sync_all_devices",
+            # Daily sales import: fail dates of dead child jobs, resume posting
+            "jazira_app.jazira_app.api.parallel_import.watch_parallel_imports",
+        ],
+    },
+}
+
 # scheduler_events = {
 # 	"all": [
 # 		"jazira_app.tasks.all"
@@ -2,6 +2,10 @@ from jazira_app.jazira_app.api.daily_sales_import import (
     get_default_warehouse,
     get_preview_data,
     validate_excel_items,
+    get_material_requirements,
+    resolve_unmatched_items,
+    confirm_item_aliases,
+    get_import_progress,
     process_import,
     cancel_import
 )
@@ -10,6 +14,10 @@ __all__ = [
     "get_default_warehouse",
     "get_preview_data",
     "validate_excel_items",
+    "get_material_requirements",
+    "resolve_unmatched_items",
+    "confirm_item_aliases",
+    "get_import_progress",
     "process_import",
     "cancel_import",
 ]
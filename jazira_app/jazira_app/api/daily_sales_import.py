@@ -1,6 +1,5 @@
 from typing import Dict, List, Any
 from collections import defaultdict
-import copy
 
 import frappe
 from frappe import _
@@ -17,6 +16,10 @@ from jazira_app.jazira_app.services import (
     bom_service,
     stock_service,
     invoice_service,
+    item_matcher,
+    planning_service,
+    ImportProgress,
+    ImportLine,
     StockEntryConfig,
     InvoiceConfig
 )
@@ -53,27 +56,30 @@ def get_preview_data(doc_name: str) -> Dict:
         return {"success": False, "message": _("Excel fayl yuklanmagan")}
     
     try:
-        excel_data = excel_service.read_sales_report(doc.excel_file)
+        excel_data = excel_service.load_sales_report(doc.excel_file, file_hash=doc.excel_hash)
         items = excel_data["items"]
 
         validation = validate_items_exist(items)
         valid_items = validation["valid_items"]
 
+        boms = bom_service.get_default_boms(item.get("item_code") for item in items)
         for item in items:
             if item.get("item_code"):
-                bom = bom_service.get_default_bom(item["item_code"])
+                bom = boms.get(item["item_code"])
                 item["has_bom"] = bool(bom)
                 item["bom"] = bom
                 item["type"] = "MANUFACTURE" if bom else "DIRECT SALE"
             else:
                 item["has_bom"] = False
-                item["type"] = "NOT FOUND"
+                item["type"] = "LOW CONFIDENCE" if item.get("suggested_item_code") else "NOT FOUND"
 
         found_items = [i for i in items if i.get("found")]
         summary = {
+            "total_rows": excel_data["row_count"],
             "total_items": len(items),
             "found": len(found_items),
             "not_found": len(items) - len(found_items),
+            "low_confidence": len([i for i in items if i.get("suggested_item_code")]),
             "with_bom": len([i for i in items if i.get("has_bom")]),
             "without_bom": len([i for i in found_items if not i.get("has_bom")]),
             "total_qty": sum(i.get("qty", 0) for i in items),
@@ -105,7 +111,7 @@ def validate_excel_items(doc_name: str) -> Dict:
         }
     
     try:
-        excel_data = excel_service.read_sales_report(doc.excel_file)
+        excel_data = excel_service.load_sales_report(doc.excel_file, file_hash=doc.excel_hash)
         items = excel_data["items"]
 
         if not items:
@@ -118,7 +124,7 @@ def validate_excel_items(doc_name: str) -> Dict:
         
         validation = validate_items_exist(items)
         
-        excel_hash = calculate_file_hash(doc.excel_file)
+        excel_hash = excel_data["file_hash"]
         duplicate = check_duplicate_import(excel_hash, doc_name)
         
         errors = validation["errors"]
@@ -148,6 +154,149 @@ def validate_excel_items(doc_name: str) -> Dict:
         return {"success": False, "message": str(e), "errors": [], "items": []}
 
 
+@frappe.whitelist()
+def get_material_requirements(doc_name: str) -> Dict:
+    """
+    Raw-material consumption of the file per date and in total, with the
+    source warehouse stock and shortage (shortage preview / report).
+
+    Returns:
+        {"success", "dates": [{"date", "materials": [...]}], "totals": [...]}
+        where each material is {"item_code", "uom", "required_qty"} and
+        totals also carry "actual_qty" and "shortage"
+    """
+    doc = frappe.get_doc("Jazira App Daily Sales Import", doc_name)
+
+    if not doc.excel_file:
+        return {"success": False, "message": _("Excel fayl yuklanmagan")}
+
+    try:
+        excel_data = excel_service.load_sales_report(doc.excel_file, file_hash=doc.excel_hash)
+        valid_items = validate_items_exist(excel_data["items"])["valid_items"]
+
+        lines_by_date = defaultdict(list)
+        fallback_date = str(doc.posting_date)
+        for item in valid_items:
+            lines_by_date[item.get("date") or fallback_date].append((item["item_code"], item["qty"]))
+
+        dates = []
+        totals = defaultdict(float)
+        uoms = {}
+        for d in sorted(lines_by_date):
+            plan = planning_service.plan(lines_by_date[d])
+            uoms.update(plan.uoms)
+            for code, qty in plan.totals.items():
+                totals[code] += qty
+            dates.append({
+                "date": d,
+                "materials": [
+                    {"item_code": code, "uom": plan.uoms[code], "required_qty": qty}
+                    for code, qty in sorted(plan.totals.items())
+                ]
+            })
+
+        actual = dict(frappe.get_all(
+            "Bin",
+            filters={"warehouse": doc.source_warehouse, "item_code": ["in", list(totals)]},
+            fields=["item_code", "actual_qty"],
+            as_list=True
+        )) if totals else {}
+
+        return {
+            "success": True,
+            "dates": dates,
+            "totals": [
+                {
+                    "item_code": code,
+                    "uom": uoms[code],
+                    "required_qty": qty,
+                    "actual_qty": actual.get(code, 0),
+                    "shortage": max(qty - actual.get(code, 0), 0),
+                }
+                for code, qty in sorted(totals.items())
+            ]
+        }
+
+    except Exception as e:
+        return {"success": False, "message": str(e)}
+
+
+@frappe.whitelist()
+def resolve_unmatched_items(doc_name: str, limit: int = 5) -> Dict:
+    """
+    Candidate Items for every POS name in the file that did not match.
+
+    Returns:
+        {"success", "items": [{"item_name", "rows", "candidates": [...]}]}
+        with candidates ranked by similarity (see ItemMatcher.suggest)
+    """
+    doc = frappe.get_doc("Jazira App Daily Sales Import", doc_name)
+
+    if not doc.excel_file:
+        return {"success": False, "message": _("Excel fayl yuklanmagan"), "items": []}
+
+    try:
+        excel_data = excel_service.load_sales_report(doc.excel_file, file_hash=doc.excel_hash)
+        validation = validate_items_exist(excel_data["items"])
+
+        unmatched = defaultdict(list)
+        for error in validation["errors"]:
+            unmatched[error["item_name"]].extend(error["rows"])
+
+        limit = int(limit)
+        items = [
+            {"item_name": name, "rows": rows, "candidates": item_matcher.suggest(name, limit)}
+            for name, rows in unmatched.items()
+        ]
+        return {"success": True, "items": items}
+
+    except Exception as e:
+        return {"success": False, "message": str(e), "items": []}
+
+
+@frappe.whitelist()
+def confirm_item_aliases(aliases) -> Dict:
+    """
+    Save user-confirmed POS name -> Item matches as Sales Item Alias.
+
+    Args:
+        aliases: {pos_name: item_code} (dict or JSON)
+    """
+    frappe.has_permission("Sales Item Alias", "create", throw=True)
+
+    aliases = frappe.parse_json(aliases) or {}
+    aliases = {name: item_code for name, item_code in aliases.items() if item_code}
+
+    if not aliases:
+        return {"success": False, "message": _("Item tanlanmagan")}
+
+    found = frappe.get_all("Item", filters={"name": ["in", list(aliases.values())]}, pluck="name")
+    missing = set(aliases.values()) - set(found)
+    if missing:
+        return {"success": False, "message": _("Item topilmadi: {0}").format(", ".join(sorted(missing)))}
+
+    item_matcher.learn_aliases(aliases, source="Confirmed", overwrite=True)
+    frappe.db.commit()
+    return {"success": True, "message": _("{0} ta alias saqlandi").format(len(aliases))}
+
+
+@frappe.whitelist()
+def get_import_progress(doc_name: str, start: int = 0) -> Dict:
+    """
+    Log lines after position `start` and progress of a running import.
+
+    Used by the form to catch up after missed realtime events without
+    reloading the whole document.
+    """
+    frappe.has_permission("Jazira App Daily Sales Import", "read", doc_name, throw=True)
+    progress = ImportProgress(doc_name)
+    return {
+        "status": frappe.db.get_value("Jazira App Daily Sales Import", doc_name, "status"),
+        "lines": progress.lines(int(start)),
+        "progress": progress.get_progress()
+    }
+
+
 @frappe.whitelist()
 def process_import(doc_name: str, background: bool = False) -> Dict:
     """Process the import — always runs in background to prevent HTTP timeout."""
@@ -169,8 +318,8 @@ def process_import(doc_name: str, background: bool = False) -> Dict:
     if not validation["success"]:
         return {"success": False, "message": validation["message"]}
 
-    # Check duplicate before enqueueing
-    excel_hash = calculate_file_hash(doc.excel_file)
+    # Check duplicate before enqueueing (hash stored on save)
+    excel_hash = doc.excel_hash or calculate_file_hash(doc.excel_file)
     duplicate = check_duplicate_import(excel_hash, doc_name)
     if duplicate["is_duplicate"]:
         return {
@@ -182,6 +331,7 @@ def process_import(doc_name: str, background: bool = False) -> Dict:
     doc.db_set("status", "Processing")
     doc.db_set("error_log", "")
     doc.db_set("import_log", "")
+    ImportProgress(doc_name).reset()
     frappe.db.commit()
 
     # Always enqueue to background
@@ -197,7 +347,16 @@ def process_import(doc_name: str, background: bool = False) -> Dict:
 def _process_import_job(doc_name: str):
     """Background job wrapper."""
     try:
-        result = _process_import_sync(doc_name)
+        if frappe.db.get_value("Jazira App Daily Sales Import", doc_name, "parallel_dates"):
+            # Imported here: parallel_import builds on this module's helpers
+            from jazira_app.jazira_app.api.parallel_import import start_parallel_import
+
+            result = start_parallel_import(doc_name)
+            if result["success"]:
+                # Child jobs publish the final result after the last date
+                return
+        else:
+            result = _process_import_sync(doc_name)
         event = "restaurant_import_success" if result["success"] else "restaurant_import_failed"
         frappe.publish_realtime(
             event,
@@ -227,18 +386,9 @@ def _process_import_sync(doc_name: str) -> Dict:
     """Synchronous import processing with multi-date support."""
     doc = frappe.get_doc("Jazira App Daily Sales Import", doc_name)
     
-    log_lines = []
-    def log(msg, publish=True):
-        log_lines.append(msg)
-        current_log = "\n".join(log_lines)
-        frappe.db.set_value("Jazira App Daily Sales Import", doc_name, "import_log", current_log, update_modified=False)
-        if publish:
-            frappe.publish_realtime(
-                "restaurant_import_log",
-                {"doc_name": doc_name, "msg": msg, "full_log": current_log},
-                doctype="Jazira App Daily Sales Import",
-                docname=doc_name
-            )
+    # Lines go to Redis and realtime as deltas; import_log is flushed at checkpoints
+    progress = ImportProgress(doc_name)
+    log = progress.log
     
     if doc.status == "Processed":
         return {"success": False, "message": _("Bu import allaqachon bajarilgan")}
@@ -256,45 +406,14 @@ def _process_import_sync(doc_name: str) -> Dict:
     log("=" * 50)
     
     try:
-        # 1. Validate prerequisites
-        log("\n📋 1. Tekshiruvlar...")
-        validation = validate_import_prerequisites(
-            doc.company, doc.source_warehouse, str(doc.posting_date), doc.customer or ""
-        )
-        if not validation["success"]:
-            raise Exception(validation["message"])
-        
-        # 2. Read Excel
-        log("\n📊 2. Excel o'qilmoqda...")
-        excel_data = excel_service.read_sales_report(doc.excel_file)
-        items = excel_data["items"]
-        if not items:
-            raise Exception(_("Excel faylda sotuv topilmadi"))
-        log(f"   ✅ {len(items)} ta qator o'qildi")
+        excel_hash, valid_items, fuzzy = _validate_import(doc, log)
+        progress.flush()
 
-        # 3. Check duplicate
-        log("\n🔍 3. Dublikat tekshiruvi...")
-        excel_hash = calculate_file_hash(doc.excel_file)
-        duplicate = check_duplicate_import(excel_hash, doc_name)
-        if duplicate["is_duplicate"]:
-            raise Exception(_("Bu Excel avval import qilingan: {0}").format(duplicate["existing_doc"]))
-        
-        # 4. Validate and match items
-        log("\n🔗 4. Itemlar tekshirilmoqda...")
-        item_validation = validate_items_exist(items)
-        if item_validation["errors"]:
-            for e in item_validation["errors"]:
-                log(f"   ❌ Row {e['row']}: {e['error']}")
-            raise Exception(_("Itemlarni tekshirishda xatolik yuz berdi. Logga qarang."))
-        
-        valid_items = item_validation["valid_items"]
-        log(f"   ✅ {len(valid_items)} ta item topildi")
-        
         # Group items by date
         items_by_date = defaultdict(list)
         fallback_date = str(doc.posting_date)
         for item in valid_items:
-            d = item.get("date") or fallback_date
+            d = item.date or fallback_date
             items_by_date[d].append(item)
             
         sorted_dates = sorted(items_by_date.keys())
@@ -305,15 +424,9 @@ def _process_import_sync(doc_name: str) -> Dict:
         total_amount = 0
         
         # Resume support: load previously committed SE/SI names from a failed run
-        already_done_dates = set()
+        already_done_dates = _already_done_dates(doc)
         if doc.sales_invoice:
-            existing_si_names = [s.strip() for s in doc.sales_invoice.split(",") if s.strip()]
-            all_si_names.extend(existing_si_names)
-            # Find which dates already have SIs
-            for si_name in existing_si_names:
-                si_date = frappe.db.get_value("Sales Invoice", si_name, "posting_date")
-                if si_date:
-                    already_done_dates.add(str(si_date))
+            all_si_names.extend(s.strip() for s in doc.sales_invoice.split(",") if s.strip())
         if doc.stock_entry:
             existing_se_names = [s.strip() for s in doc.stock_entry.split(",") if s.strip()]
             all_se_names.extend(existing_se_names)
@@ -321,22 +434,23 @@ def _process_import_sync(doc_name: str) -> Dict:
         if already_done_dates:
             log(f"   ♻️ Resume: {len(already_done_dates)} ta sana oldin bajarilgan, o'tkazib yuboriladi")
         
+        progress.set_total(len(sorted_dates), stage="dates")
         # Process each date
         for idx, d in enumerate(sorted_dates, 1):
             date_items = items_by_date[d]
             
             # Skip already processed dates (resume mode)
             if d in already_done_dates:
-                log(f"\n--- [{idx}/{len(sorted_dates)}] SANA: {d} — ⏭️ oldin bajarilgan, skip ---")
+                log(f"\n--- [{idx}/{len(sorted_dates)}] SANA: {d} — ⏭️ oldin bajarilgan, skip ---", level="debug")
+                progress.advance()
                 continue
             
             log(f"\n--- [{idx}/{len(sorted_dates)}] SANA: {d} ({len(date_items)} ta item) ---")
             
             try:
-                # 5. Categorize by BOM (deep copy to prevent mutation across dates)
-                date_items_copy = copy.deepcopy(date_items)
-                categorized = bom_service.categorize_items_by_bom(date_items_copy)
-                items_with_bom = categorized["with_bom"]
+                # 5. Categorize by BOM (index partitions; lines are immutable and shared)
+                categorized = bom_service.categorize_items_by_bom(date_items)
+                items_with_bom = [date_items[i] for i in categorized["with_bom"]]
                 
                 # 6. Create Manufacture Stock Entries
                 if items_with_bom:
@@ -344,9 +458,12 @@ def _process_import_sync(doc_name: str) -> Dict:
                         company=doc.company,
                         warehouse=doc.source_warehouse,
                         posting_date=d,
-                        allow_negative_stock=bool(doc.allow_negative_stock)
+                        allow_negative_stock=bool(doc.allow_negative_stock),
+                        consolidated=bool(doc.consolidate_stock_entries)
+                    )
+                    se_names = stock_service.create_manufacture_entries(
+                        items_with_bom, config, submit=True, boms=categorized["boms"]
                     )
-                    se_names = stock_service.create_manufacture_entries(items_with_bom, config, submit=True)
                     all_se_names.extend(se_names)
                     log(f"   ✅ {len(se_names)} ta Stock Entry yaratildi")
                     # Update doc incrementally
@@ -368,11 +485,13 @@ def _process_import_sync(doc_name: str) -> Dict:
                 totals = invoice_service.calculate_totals(date_items)
                 total_amount += totals["total_amount"]
                 
+                progress.flush()
                 frappe.db.commit()
+                progress.advance()
                 
             except Exception as date_err:
                 frappe.db.rollback()
-                log(f"   ❌ SANA {d} BO'YICHA XATO: {str(date_err)}")
+                log(f"   ❌ SANA {d} BO'YICHA XATO: {str(date_err)}", level="error")
                 # After rollback, re-read doc to restore incremental SE/SI refs
                 # that were committed in previous successful dates
                 doc.reload()
@@ -381,6 +500,7 @@ def _process_import_sync(doc_name: str) -> Dict:
         # 8. Finalize
         doc.db_set("external_ref", excel_hash)
         doc.db_set("status", "Processed")
+        _learn_fuzzy_matches(fuzzy)
         
         log("\n" + "=" * 50)
         log("✅ IMPORT MUVAFFAQIYATLI YAKUNLANDI")
@@ -388,6 +508,7 @@ def _process_import_sync(doc_name: str) -> Dict:
         log(f"📊 Jami sanalar: {len(sorted_dates)}")
         log(f"💰 Jami summa: {total_amount:,.0f} UZS")
         
+        progress.flush()
         frappe.db.commit()
         
         return {
@@ -401,16 +522,88 @@ def _process_import_sync(doc_name: str) -> Dict:
         
     except Exception as e:
         frappe.db.rollback()
-        log(f"\n❌ XATO: {str(e)}")
+        log(f"\n❌ XATO: {str(e)}", level="error")
         # Re-read doc after rollback to get last committed state
         doc.reload()
         doc.db_set("status", "Failed")
         doc.db_set("error_log", str(e))
+        progress.flush()
         frappe.db.commit()
         frappe.log_error(f"Import Error: {doc_name}\n{str(e)}", "Daily Sales Import")
         return {"success": False, "message": str(e)}
 
 
+def _validate_import(doc, log) -> tuple:
+    """
+    Import steps 1-4: prerequisites, Excel, duplicate check, item matching.
+
+    Args:
+        doc: Jazira App Daily Sales Import document
+        log: ImportProgress.log of the running import
+
+    Returns:
+        (excel_hash, valid_items as ImportLine, fuzzy {pos_name: item_code});
+        raises on any failure. The fuzzy matches are stored as aliases only
+        once the import succeeds (_learn_fuzzy_matches).
+    """
+    # 1. Validate prerequisites
+    log("\n📋 1. Tekshiruvlar...")
+    validation = validate_import_prerequisites(
+        doc.company, doc.source_warehouse, str(doc.posting_date), doc.customer or ""
+    )
+    if not validation["success"]:
+        raise Exception(validation["message"])
+    
+    # 2. Read Excel
+    log("\n📊 2. Excel o'qilmoqda...")
+    excel_data = excel_service.load_sales_report(doc.excel_file, file_hash=doc.excel_hash)
+    items = excel_data["items"]
+    if not items:
+        raise Exception(_("Excel faylda sotuv topilmadi"))
+    log(f"   ✅ {excel_data['row_count']} ta qator o'qildi ({len(items)} ta sana/item/narx bo'yicha)")
+
+    # 3. Check duplicate
+    log("\n🔍 3. Dublikat tekshiruvi...")
+    excel_hash = excel_data["file_hash"]
+    duplicate = check_duplicate_import(excel_hash, doc.name)
+    if duplicate["is_duplicate"]:
+        raise Exception(_("Bu Excel avval import qilingan: {0}").format(duplicate["existing_doc"]))
+    
+    # 4. Validate and match items
+    log("\n🔗 4. Itemlar tekshirilmoqda...")
+    item_validation = validate_items_exist(items)
+    if item_validation["errors"]:
+        for e in item_validation["errors"]:
+            log(f"   ❌ Row {', '.join(map(str, e['rows']))}: {e['error']}", level="error")
+        raise Exception(_("Itemlarni tekshirishda xatolik yuz berdi. Logga qarang."))
+    
+    valid_items = [ImportLine.from_item(item) for item in item_validation["valid_items"]]
+    fuzzy = {
+        item["item_name"].strip(): item["item_code"]
+        for item in item_validation["valid_items"]
+        if item.get("match_method") == "fuzzy"
+    }
+    log(f"   ✅ {len(valid_items)} ta item topildi")
+    return excel_hash, valid_items, fuzzy
+
+
+def _learn_fuzzy_matches(fuzzy: Dict[str, str]):
+    """Store the fuzzy matches of a successful import as Partial Match aliases."""
+    item_matcher.learn_aliases(fuzzy or {}, source="Partial Match")
+
+
+def _already_done_dates(doc) -> set:
+    """Dates that already have a Sales Invoice on this import (resume after a failed run)."""
+    si_names = [s.strip() for s in (doc.sales_invoice or "").split(",") if s.strip()]
+    if not si_names:
+        return set()
+    return {
+        str(d) for d in frappe.get_all(
+            "Sales Invoice", filters={"name": ["in", si_names]}, pluck="posting_date"
+        ) if d
+    }
+
+
 @frappe.whitelist()
 def cancel_import(doc_name: str) -> Dict:
     """Cancel a processed import."""
@@ -0,0 +1,506 @@
+"""
+Parallel per-date processing for Daily Sales Import.
+
+The parent job validates the Excel once and enqueues one child job per
+date. Children build their Stock Entries and Sales Invoice as drafts in
+parallel; posting (submit) is serialized per warehouse and runs strictly
+in date order, so stock ledger entries and valuation stay chronological.
+Per-date state lives in Redis and is aggregated into the import document
+as dates are posted.
+
+Nobody waits for the posting lock: a job that finds it taken leaves a
+posting request, and the holder re-enqueues advance_posting for every
+request it finds after releasing the lock. The lock TTL is extended
+before each date is submitted. watch_parallel_imports (scheduler) fails
+dates whose child job died and resumes posting that stalled.
+"""
+import json
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+import frappe
+from frappe import _
+from frappe.utils import nowdate
+
+from jazira_app.jazira_app.api.daily_sales_import import (
+    _validate_import,
+    _already_done_dates,
+    _learn_fuzzy_matches
+)
+from jazira_app.jazira_app.services import (
+    bom_service,
+    stock_service,
+    invoice_service,
+    ImportProgress,
+    StockEntryConfig,
+    InvoiceConfig
+)
+
+
+DOCTYPE = "Jazira App Daily Sales Import"
+
+# =============================================================================
+# STATE
+# =============================================================================
+
+# {doc}: JSON plan (dates, warehouse, settings, aborted)
+PLAN_KEY = "daily_sales_import:{0}:plan"
+# {doc}: hash date -> JSON state (raw hash commands, see _get_states)
+DATES_KEY = "daily_sales_import:{0}:dates"
+# {warehouse}: posting lock shared by every import of that warehouse
+POSTING_LOCK_KEY = "daily_sales_import:posting:{0}"
+# {warehouse}: set of imports that asked for posting while the lock was taken
+POSTING_REQUESTS_KEY = "daily_sales_import:posting:{0}:requests"
+
+STATE_TTL = 2 * 24 * 3600
+# Posting lock TTL, extended before every date is submitted
+LOCK_TIMEOUT = 600
+# A pending date whose child job is gone for this long is failed by the watchdog
+WATCHDOG_GRACE = 600
+
+# Compare-and-expire / compare-and-delete on the lock token
+_REFRESH_LOCK = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('expire', KEYS[1], ARGV[2]) end return 0"
+_RELEASE_LOCK = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end return 0"
+
+PENDING = "pending"
+READY = "ready"
+DONE = "done"
+FAILED = "failed"
+
+
+def _redis():
+    return frappe.cache()
+
+
+def _key(template: str, value: str) -> str:
+    return _redis().make_key(template.format(value))
+
+
+def _get_plan(doc_name: str) -> Optional[Dict]:
+    raw = _redis().get(_key(PLAN_KEY, doc_name))
+    return json.loads(raw) if raw else None
+
+
+def _set_plan(doc_name: str, plan: Dict):
+    _redis().set(_key(PLAN_KEY, doc_name), json.dumps(plan), ex=STATE_TTL)
+
+
+def _get_states(doc_name: str) -> Dict[str, Dict]:
+    # Hash commands run on a pipeline (the plain redis client): RedisWrapper's
+    # hgetall/hset would prefix the key again and pickle the values
+    pipe = _redis().pipeline()
+    pipe.hgetall(_key(DATES_KEY, doc_name))
+    raw, = pipe.execute()
+    return {
+        (d.decode() if isinstance(d, bytes) else d): json.loads(state)
+        for d, state in raw.items()
+    }
+
+
+def _set_state(doc_name: str, posting_date: str, state: Dict):
+    _set_states(doc_name, {posting_date: state})
+
+
+def _set_states(doc_name: str, states: Dict[str, Dict], replace: bool = False):
+    """Write date states; replace drops the states of a previous run first."""
+    key = _key(DATES_KEY, doc_name)
+    pipe = _redis().pipeline()
+    if replace:
+        pipe.delete(key)
+    if states:
+        pipe.hset(key, mapping={d: json.dumps(state, default=str) for d, state in states.items()})
+    pipe.expire(key, STATE_TTL)
+    pipe.execute()
+
+
+class PostingLock:
+    """Token-owned Redis lock; refresh() extends it and fails once it was lost."""
+
+    def __init__(self, warehouse: str):
+        self.key = _key(POSTING_LOCK_KEY, warehouse)
+        self.token = frappe.generate_hash(length=10)
+
+    def acquire(self) -> bool:
+        return bool(_redis().set(self.key, self.token, nx=True, ex=LOCK_TIMEOUT))
+
+    def refresh(self) -> bool:
+        return bool(_redis().eval(_REFRESH_LOCK, 1, self.key, self.token, LOCK_TIMEOUT))
+
+    def release(self):
+        _redis().eval(_RELEASE_LOCK, 1, self.key, self.token)
+
+
+@contextmanager
+def _posting_lock(warehouse: str):
+    """
+    Per-warehouse posting lock. Yields the PostingLock, or None if taken.
+
+    Does not wait: the caller leaves a posting request instead (see
+    advance_posting). The lock expires LOCK_TIMEOUT after its last refresh
+    so a crashed worker does not block posting forever.
+    """
+    lock = PostingLock(warehouse)
+    acquired = lock.acquire()
+    try:
+        yield lock if acquired else None
+    finally:
+        if acquired:
+            lock.release()
+
+
+def _request_posting(warehouse: str, doc_name: str):
+    pipe = _redis().pipeline()
+    pipe.sadd(_key(POSTING_REQUESTS_KEY, warehouse), doc_name)
+    pipe.expire(_key(POSTING_REQUESTS_KEY, warehouse), STATE_TTL)
+    pipe.execute()
+
+
+def _take_requests(warehouse: str) -> List[str]:
+    key = _key(POSTING_REQUESTS_KEY, warehouse)
+    pipe = _redis().pipeline()
+    pipe.smembers(key)
+    pipe.delete(key)
+    names, _ = pipe.execute()
+    return sorted(n.decode() if isinstance(n, bytes) else n for n in names)
+
+
+def _enqueue_advance(doc_name: str):
+    # No job_id deduplication: the job that enqueues may itself still be
+    # running as advance_posting, and a spare run is a no-op
+    frappe.enqueue(
+        "jazira_app.jazira_app.api.parallel_import.advance_posting",
+        queue="long",
+        doc_name=doc_name
+    )
+
+
+def _child_job_id(doc_name: str, posting_date: str) -> str:
+    return f"daily-sales-import-{doc_name}-{posting_date}"
+
+
+def _split(value: Optional[str]) -> List[str]:
+    return [s.strip() for s in (value or "").split(",") if s.strip()]
+
+
+# =============================================================================
+# PARENT JOB
+# =============================================================================
+
+def start_parallel_import(doc_name: str) -> Dict:
+    """
+    Validate the import and enqueue one child job per pending date.
+
+    Args:
+        doc_name: Jazira App Daily Sales Import name
+
+    Returns:
+        Dict with success status; the final result is published by the
+        child job that posts the last date
+    """
+    doc = frappe.get_doc(DOCTYPE, doc_name)
+    progress = ImportProgress(doc_name)
+    log = progress.log
+
+    log("=" * 50)
+    log(f"IMPORT BOSHLANDI (parallel): {nowdate()}")
+    log(f"Company: {doc.company}")
+    log(f"Warehouse: {doc.source_warehouse}")
+    log("=" * 50)
+
+    try:
+        excel_hash, valid_items, fuzzy = _validate_import(doc, log)
+
+        items_by_date = defaultdict(list)
+        fallback_date = str(doc.posting_date)
+        for item in valid_items:
+            items_by_date[item.date or fallback_date].append(item)
+
+        already_done_dates = _already_done_dates(doc)
+        dates = [d for d in sorted(items_by_date) if d not in already_done_dates]
+        log(f"   📅 Jami {len(items_by_date)} xil sana aniqlandi")
+        if already_done_dates:
+            log(f"   ♻️ Resume: {len(already_done_dates)} ta sana oldin bajarilgan, o'tkazib yuboriladi")
+
+        _set_plan(doc_name, {
+            "dates": dates,
+            "excel_hash": excel_hash,
+            "warehouse": doc.source_warehouse,
+            "allow_negative_stock": bool(doc.allow_negative_stock),
+            "total_items": len(valid_items),
+            "fuzzy": fuzzy,
+            "aborted": False
+        })
+        _set_states(doc_name, {d: {"status": PENDING, "since": time.time()} for d in dates}, replace=True)
+
+        log(f"\n⚙️ 5. {len(dates)} ta sana parallel ishlanmoqda...")
+        progress.set_total(len(dates), stage="dates")
+        progress.flush()
+        frappe.db.commit()
+
+        if not dates:
+            advance_posting(doc_name)
+            return {"success": True, "message": _("Import muvaffaqiyatli")}
+
+        for d in dates:
+            frappe.enqueue(
+                "jazira_app.jazira_app.api.parallel_import.process_date",
+                queue="long",
+                timeout=3600,
+                job_id=_child_job_id(doc_name, d),
+                deduplicate=True,
+                doc_name=doc_name,
+                posting_date=d,
+                items=[line.as_dict() for line in items_by_date[d]]
+            )
+
+        return {"success": True, "message": _("{0} ta sana fonada ishlanmoqda").format(len(dates))}
+
+    except Exception as e:
+        frappe.db.rollback()
+        log(f"\n❌ XATO: {str(e)}", level="error")
+        frappe.db.set_value(DOCTYPE, doc_name, {"status": "Failed", "error_log": str(e)})
+        progress.flush()
+        frappe.db.commit()
+        frappe.log_error(f"Import Error: {doc_name}\n{str(e)}", "Daily Sales Import")
+        return {"success": False, "message": str(e)}
+
+
+# =============================================================================
+# CHILD JOB
+# =============================================================================
+
+def process_date(doc_name: str, posting_date: str, items: List[Dict]):
+    """
+    Build the draft Stock Entries and Sales Invoice of one date, then post
+    every date that is ready in order.
+
+    Args:
+        doc_name: Jazira App Daily Sales Import name
+        posting_date: Date handled by this job
+        items: Matched sales rows of that date
+    """
+    doc = frappe.get_doc(DOCTYPE, doc_name)
+    try:
+        stock_entries = []
+        categorized = bom_service.categorize_items_by_bom(items)
+        items_with_bom = [items[i] for i in categorized["with_bom"]]
+        if items_with_bom:
+            config = StockEntryConfig(
+                company=doc.company,
+                warehouse=doc.source_warehouse,
+                posting_date=posting_date,
+                allow_negative_stock=bool(doc.allow_negative_stock),
+                consolidated=bool(doc.consolidate_stock_entries)
+            )
+            stock_entries = stock_service.create_manufacture_entries(
+                items_with_bom, config, submit=False, boms=categorized["boms"]
+            )
+
+        invoice_config = InvoiceConfig(
+            company=doc.company,
+            warehouse=doc.source_warehouse,
+            posting_date=posting_date,
+            customer=doc.customer
+        )
+        sales_invoice = invoice_service.create_sales_invoice(items, invoice_config, submit=False)
+        frappe.db.commit()
+
+        state = {
+            "status": READY,
+            "stock_entries": stock_entries,
+            "sales_invoice": sales_invoice,
+            "amount": invoice_service.calculate_totals(items)["total_amount"]
+        }
+    except Exception as e:
+        frappe.db.rollback()
+        frappe.log_error(f"Import Error: {doc_name} ({posting_date})\n{str(e)}", "Daily Sales Import")
+        state = {"status": FAILED, "error": str(e)}
+
+    _set_state(doc_name, posting_date, state)
+    advance_posting(doc_name)
+
+
+def advance_posting(doc_name: str):
+    """
+    Post ready dates of an import under its warehouse posting lock.
+
+    The request is recorded before trying the lock and the holder collects
+    requests after releasing it, so a date that became ready while another
+    job was posting is never left behind.
+    """
+    plan = _get_plan(doc_name)
+    if not plan:
+        return
+
+    warehouse = plan["warehouse"]
+    _request_posting(warehouse, doc_name)
+    with _posting_lock(warehouse) as lock:
+        if not lock:
+            return
+        for name in _take_requests(warehouse):
+            if not _post_ready_dates(name, lock):
+                # Lock lost mid-run: the next holder picks this import up
+                _request_posting(warehouse, name)
+                break
+
+    for name in _take_requests(warehouse):
+        _enqueue_advance(name)
+
+
+def watch_parallel_imports():
+    """
+    Scheduler job: keep parallel imports moving.
+
+    A child killed by the RQ timeout or a worker crash never reports its
+    date, which would block every later date. Pending dates whose job is
+    no longer queued or running are failed (the import aborts), and
+    posting is re-triggered for every import still processing.
+    """
+    from frappe.utils.background_jobs import is_job_enqueued
+
+    for doc_name in frappe.get_all(DOCTYPE, filters={"status": "Processing", "parallel_dates": 1}, pluck="name"):
+        plan = _get_plan(doc_name)
+        if not plan:
+            continue
+
+        for d, state in _get_states(doc_name).items():
+            if (
+                state["status"] == PENDING
+                and time.time() - state.get("since", 0) > WATCHDOG_GRACE
+                and not is_job_enqueued(_child_job_id(doc_name, d))
+            ):
+                _set_state(doc_name, d, {"status": FAILED, "error": _("Sana jobi to'xtab qoldi")})
+
+        _enqueue_advance(doc_name)
+
+
+def _post_ready_dates(doc_name: str, lock: PostingLock) -> bool:
+    """
+    Submit ready drafts in date order until a date is still being built.
+
+    Must run under the posting lock. A failed date aborts the import:
+    earlier dates stay posted (resume skips them), later drafts are deleted.
+
+    Returns:
+        False if the lock was lost before a date could be submitted
+    """
+    plan = _get_plan(doc_name)
+    if not plan:
+        return True
+    states = _get_states(doc_name)
+
+    if plan["aborted"]:
+        _discard_ready(doc_name, states)
+        return True
+
+    for d in plan["dates"]:
+        state = states.get(d, {"status": PENDING})
+        if state["status"] == DONE:
+            continue
+        if state["status"] == PENDING:
+            return True
+        if state["status"] == READY:
+            # A month of dates can outlast one TTL; never submit without the lock
+            if not lock.refresh():
+                return False
+            try:
+                stock_service.submit_stock_entries(state["stock_entries"], plan["allow_negative_stock"])
+                invoice_service.submit_invoice(state["sales_invoice"])
+                _record_posted(doc_name, d, state)
+                ImportProgress(doc_name).flush()
+                frappe.db.commit()
+            except Exception as e:
+                frappe.db.rollback()
+                state = {**state, "status": FAILED, "error": str(e)}
+            else:
+                state = {**state, "status": DONE}
+                ImportProgress(doc_name).advance()
+            _set_state(doc_name, d, state)
+            states[d] = state
+
+        if state["status"] == FAILED:
+            _abort(doc_name, plan, states, d)
+            return True
+
+    _finalize(doc_name, plan, states)
+    return True
+
+
+def _record_posted(doc_name: str, posting_date: str, state: Dict):
+    """Append a posted date's documents to the import."""
+    doc = frappe.get_doc(DOCTYPE, doc_name)
+    se_names = _split(doc.stock_entry)
+    si_names = _split(doc.sales_invoice)
+    se_names.extend(se for se in state["stock_entries"] if se not in se_names)
+    if state["sales_invoice"] not in si_names:
+        si_names.append(state["sales_invoice"])
+    doc.db_set("stock_entry", ", ".join(se_names))
+    doc.db_set("sales_invoice", ", ".join(si_names))
+    ImportProgress(doc_name).log(f"   ✅ {posting_date}: {len(state['stock_entries'])} ta Stock Entry, Sales Invoice {state['sales_invoice']}")
+
+
+def _discard_ready(doc_name: str, states: Dict[str, Dict]):
+    """Delete drafts of dates that will not be posted."""
+    for d, state in states.items():
+        if state["status"] != READY:
+            continue
+        for doctype, names in (("Stock Entry", state["stock_entries"]), ("Sales Invoice", [state["sales_invoice"]])):
+            for name in names:
+                if frappe.db.get_value(doctype, name, "docstatus") == 0:
+                    frappe.delete_doc(doctype, name, ignore_permissions=True, force=True)
+        frappe.db.commit()
+        _set_state(doc_name, d, {"status": FAILED, "error": _("Import to'xtatildi")})
+
+
+def _abort(doc_name: str, plan: Dict, states: Dict[str, Dict], failed_date: str):
+    error = states[failed_date].get("error") or ""
+    _set_plan(doc_name, {**plan, "aborted": True})
+    _discard_ready(doc_name, states)
+
+    progress = ImportProgress(doc_name)
+    progress.log(f"   ❌ SANA {failed_date} BO'YICHA XATO: {error}", level="error")
+    frappe.db.set_value(DOCTYPE, doc_name, {"status": "Failed", "error_log": error})
+    progress.flush()
+    frappe.db.commit()
+    frappe.publish_realtime(
+        "restaurant_import_failed",
+        {"doc_name": doc_name, "result": {"success": False, "message": error}},
+        doctype=DOCTYPE,
+        docname=doc_name
+    )
+
+
+def _finalize(doc_name: str, plan: Dict, states: Dict[str, Dict]):
+    doc = frappe.get_doc(DOCTYPE, doc_name)
+    if doc.status == "Processed":
+        return
+
+    total_amount = sum(states[d].get("amount", 0) for d in plan["dates"])
+    doc.db_set("external_ref", plan["excel_hash"])
+    doc.db_set("status", "Processed")
+    _learn_fuzzy_matches(plan.get("fuzzy"))
+
+    progress = ImportProgress(doc_name)
+    progress.log("\n" + "=" * 50)
+    progress.log("✅ IMPORT MUVAFFAQIYATLI YAKUNLANDI")
+    progress.log("=" * 50)
+    progress.log(f"📊 Jami sanalar: {len(plan['dates'])}")
+    progress.log(f"💰 Jami summa: {total_amount:,.0f} UZS")
+    progress.flush()
+    frappe.db.commit()
+
+    frappe.publish_realtime(
+        "restaurant_import_success",
+        {"doc_name": doc_name, "result": {
+            "success": True,
+            "message": _("Import muvaffaqiyatli"),
+            "stock_entries": _split(doc.stock_entry),
+            "sales_invoice": _split(doc.sales_invoice),
+            "total_items": plan["total_items"],
+            "total_amount": total_amount
+        }},
+        doctype=DOCTYPE,
+        docname=doc_name
+    )
@@ -10,15 +10,22 @@ frappe.ui.form.on('Jazira App Daily Sales Import', {
         if (!frm._realtime_bound) {
             frm._realtime_bound = true;
 
-            // Live log listener
+            // Live log listener: events carry only the new line
             frappe.realtime.on('restaurant_import_log', (data) => {
                 if (data.doc_name === frm.doc.name) {
+                    frm.events.append_log_lines(frm, [data.msg], data.index);
                     if (data.msg.includes('SANA:') || data.msg.includes('YAKUNLANDI')) {
                         frappe.show_alert({ message: data.msg, indicator: 'blue' });
                     }
                 }
             });
 
+            frappe.realtime.on('restaurant_import_progress', (data) => {
+                if (data.doc_name === frm.doc.name && data.total) {
+                    frappe.show_progress(__('Import'), data.done, data.total, __('{0} / {1} sana', [data.done, data.total]));
+                }
+            });
+
             // Background job completion listeners
             frappe.realtime.on('restaurant_import_success', (data) => {
                 if (data.doc_name === frm.doc.name) {
@@ -26,6 +33,7 @@ frappe.ui.form.on('Jazira App Daily Sales Import', {
                         clearInterval(frm._import_poll);
                         frm._import_poll = null;
                     }
+                    frappe.hide_progress();
                     frappe.show_alert({ message: __('✅ Import muvaffaqiyatli yakunlandi!'), indicator: 'green' }, 10);
                     frm.reload_doc();
                 }
@@ -37,6 +45,7 @@ frappe.ui.form.on('Jazira App Daily Sales Import', {
                         clearInterval(frm._import_poll);
                         frm._import_poll = null;
                     }
+                    frappe.hide_progress();
                     frappe.show_alert({ message: __('❌ Import xatolik bilan yakunlandi'), indicator: 'red' }, 10);
                     frm.reload_doc();
                 }
@@ -47,18 +56,52 @@ frappe.ui.form.on('Jazira App Daily Sales Import', {
         const colors = { Draft: 'blue', Processing: 'orange', Processed: 'green', Failed: 'red' };
         frm.page.set_indicator(__(frm.doc.status), colors[frm.doc.status] || 'gray');
 
-        // If status is Processing, start polling in case we missed the realtime event
+        // If status is Processing, poll new log lines in case we missed realtime events;
+        // the document itself is reloaded only once the import has finished
         if (frm.doc.status === 'Processing' && !frm._import_poll) {
-            frm._import_poll = setInterval(() => {
-                frm.reload_doc().then(() => {
-                    if (frm.doc.status === 'Processed' || frm.doc.status === 'Failed') {
-                        clearInterval(frm._import_poll);
-                        frm._import_poll = null;
-                    }
-                });
-            }, 5000);
+            frm._log_index = undefined;
+            frm.trigger('sync_import_log');
+            frm._import_poll = setInterval(() => frm.trigger('sync_import_log'), 5000);
         }
     },
+
+    sync_import_log(frm) {
+        const start = frm._log_index || 0;
+        frappe.call({
+            method: 'jazira_app.jazira_app.api.daily_sales_import.get_import_progress',
+            args: { doc_name: frm.doc.name, start },
+            callback(r) {
+                const res = r.message;
+                if (!res) return;
+                if (frm._log_index === undefined) {
+                    // First sync replaces the last checkpoint with the full log
+                    if (res.lines.length) {
+                        frm.doc.import_log = res.lines.join('\n');
+                        frm.refresh_field('import_log');
+                    }
+                    frm._log_index = res.lines.length;
+                } else {
+                    frm.events.append_log_lines(frm, res.lines, start + res.lines.length);
+                }
+                if (res.status === 'Processed' || res.status === 'Failed') {
+                    clearInterval(frm._import_poll);
+                    frm._import_poll = null;
+                    frappe.hide_progress();
+                    frm.reload_doc();
+                }
+            }
+        });
+    },
+
+    append_log_lines(frm, lines, last_index) {
+        // last_index: position of the last line in the Redis log (1-based).
+        // Out-of-order or missed deltas are left to the next sync_import_log.
+        if (frm._log_index === undefined || last_index !== frm._log_index + lines.length) return;
+        if (!lines.length) return;
+        frm._log_index = last_index;
+        frm.doc.import_log = [frm.doc.import_log, ...lines].filter(Boolean).join('\n');
+        frm.refresh_field('import_log');
+    },
     
     company(frm) {
         if (!frm.doc.company) {
@@ -127,7 +170,7 @@ frappe.ui.form.on('Jazira App Daily Sales Import', {
         const valid = frm.doc.company && frm.doc.source_warehouse && frm.doc.posting_date;
         frm.set_df_property('excel_file', 'read_only', valid ? 0 : 1);
         frm.set_df_property('excel_file', 'description', valid 
-            ? 'POS hisoboti Excel fayli (.xlsx)'
+            ? 'POS hisoboti fayli (.xlsx, .xls, .ods, .csv)'
             : '<span style="color:red;">⚠️ Avval Company, Ombor va Sana tanlang!</span>'
         );
     },
@@ -172,6 +215,7 @@ frappe.ui.form.on('Jazira App Daily Sales Import', {
         if (frm.doc.status === 'Draft' && frm.doc.excel_file) {
             frm.add_custom_button(__('📋 Preview'), () => frm.trigger('show_preview'), __('Actions'));
             frm.add_custom_button(__('✓ Validate'), () => frm.trigger('validate_items'), __('Actions'));
+            frm.add_custom_button(__('🔗 Match Items'), () => frm.trigger('resolve_items'), __('Actions'));
             frm.add_custom_button(__('▶ Process Import'), () => frm.trigger('process_import')).addClass('btn-primary');
         }
 
@@ -237,14 +281,18 @@ frappe.ui.form.on('Jazira App Daily Sales Import', {
         const s = data.summary || {};
         
         const rows = items.map((item, i) => {
-            let badge = !item.found ? '<span class="badge badge-danger">NOT FOUND</span>'
+            let badge = item.suggested_item_code
+                ? `<span class="badge badge-warning">LOW CONFIDENCE ${Math.round(item.match_score * 100)}%</span>`
+                : !item.found ? '<span class="badge badge-danger">NOT FOUND</span>'
+                : item.match_method === 'fuzzy' ? `<span class="badge badge-info">FUZZY ${Math.round(item.match_score * 100)}%</span> `
+                    + (item.has_bom ? '<span class="badge badge-primary">MANUFACTURE</span>' : '<span class="badge badge-secondary">DIRECT SALE</span>')
                 : item.has_bom ? '<span class="badge badge-primary">MANUFACTURE</span>'
                 : '<span class="badge badge-secondary">DIRECT SALE</span>';
             
-            return `<tr class="${item.found ? '' : 'table-danger'}">
+            return `<tr class="${item.found ? '' : item.suggested_item_code ? 'table-warning' : 'table-danger'}">
                 <td>${i + 1}</td>
                 <td>${item.item_name}${item.bom ? `<br><small class="text-muted">${item.bom}</small>` : ''}</td>
-                <td>${item.item_code || '-'}</td>
+                <td>${item.item_code || (item.suggested_item_code ? `<span class="text-warning">${item.suggested_item_code}?</span>` : '-')}</td>
                 <td class="text-right">${item.qty}</td>
                 <td class="text-right">${format_currency(item.rate, 'UZS')}</td>
                 <td class="text-right">${format_currency(item.qty * item.rate, 'UZS')}</td>
@@ -262,6 +310,7 @@ frappe.ui.form.on('Jazira App Daily Sales Import', {
                         <div class="col"><div class="card bg-primary text-white text-center p-2"><h4 class="mb-0">${s.total_items || 0}</h4><small>Jami</small></div></div>
                         <div class="col"><div class="card bg-success text-white text-center p-2"><h4 class="mb-0">${s.found || 0}</h4><small>Topildi</small></div></div>
                         <div class="col"><div class="card bg-danger text-white text-center p-2"><h4 class="mb-0">${s.not_found || 0}</h4><small>Topilmadi</small></div></div>
+                        <div class="col"><div class="card bg-warning text-white text-center p-2"><h4 class="mb-0">${s.low_confidence || 0}</h4><small>Shubhali</small></div></div>
                         <div class="col"><div class="card bg-info text-white text-center p-2"><h4 class="mb-0">${s.with_bom || 0}</h4><small>BOM</small></div></div>
                         <div class="col"><div class="card bg-secondary text-white text-center p-2"><h4 class="mb-0">${s.without_bom || 0}</h4><small>No BOM</small></div></div>
                     </div>
@@ -298,13 +347,70 @@ frappe.ui.form.on('Jazira App Daily Sales Import', {
                                   <p>Jami: <strong>${format_currency(d.total_amount, 'UZS')}</strong></p>`
                     });
                 } else {
-                    const errors = (d.errors || []).map(e => `<li>Qator ${e.row}: ${e.error}</li>`).join('');
+                    const errors = (d.errors || []).map(e => `<li>Qator ${(e.rows || [e.row]).join(', ')}: ${e.error}</li>`).join('');
                     frappe.msgprint({ title: __('❌ Xatolar'), indicator: 'red', message: `<ul>${errors}</ul>` });
                 }
             }
         });
     },
     
+    resolve_items(frm) {
+        frappe.call({
+            method: 'jazira_app.jazira_app.api.daily_sales_import.resolve_unmatched_items',
+            args: { doc_name: frm.doc.name },
+            freeze: true,
+            freeze_message: __('Tekshirilmoqda...'),
+            callback(r) {
+                const d = r.message;
+                if (!d?.success) {
+                    frappe.msgprint({ title: __('Xato'), indicator: 'red', message: d?.message || 'Error' });
+                    return;
+                }
+                if (!d.items.length) {
+                    frappe.msgprint({ title: __('✅ Validation OK'), indicator: 'green', message: __('Barcha itemlar topildi') });
+                    return;
+                }
+
+                const fields = d.items.map((item, i) => ({
+                    fieldtype: 'Link',
+                    fieldname: `item_${i}`,
+                    options: 'Item',
+                    label: item.item_name,
+                    default: item.candidates[0]?.item_code,
+                    description: `${__('Qator')}: ${item.rows.join(', ')}`
+                        + (item.candidates.length
+                            ? '<br>' + item.candidates.map(c => `${c.item_name || c.item_code} (${Math.round(c.score * 100)}%)`).join(', ')
+                            : '')
+                }));
+
+                const dlg = new frappe.ui.Dialog({
+                    title: __('Itemlarni moslash'),
+                    size: 'large',
+                    fields,
+                    primary_action_label: __('Saqlash'),
+                    primary_action(values) {
+                        const aliases = {};
+                        d.items.forEach((item, i) => {
+                            if (values[`item_${i}`]) aliases[item.item_name] = values[`item_${i}`];
+                        });
+                        frappe.call({
+                            method: 'jazira_app.jazira_app.api.daily_sales_import.confirm_item_aliases',
+                            args: { aliases },
+                            callback(res) {
+                                dlg.hide();
+                                frappe.show_alert({
+                                    message: res.message?.message,
+                                    indicator: res.message?.success ? 'green' : 'red'
+                                });
+                            }
+                        });
+                    }
+                });
+                dlg.show();
+            }
+        });
+    },
+    
     process_import(frm) {
         const dlg = new frappe.ui.Dialog({
             title: __('Import tasdiqlash'),
@@ -316,7 +422,7 @@ frappe.ui.form.on('Jazira App Daily Sales Import', {
                     <p><strong>Sana:</strong> ${frm.doc.posting_date}</p>
                     <div class="alert alert-info mt-3">
                         <strong>Workflow:</strong><br>
-                        1️⃣ BOM li → Manufacture<br>
+                        1️⃣ BOM li → ${frm.doc.consolidate_stock_entries ? 'Repack (sana bo\'yicha bitta)' : 'Manufacture'}<br>
                         2️⃣ Barcha → Sales Invoice (Update Stock ON)<br><br>
                         <em>Import fonada ishlaydi — katta fayllar ham timeout bermaydi.</em>
                     </div>`
@@ -2,6 +2,7 @@ import frappe
 from frappe import _
 from frappe.model.document import Document
 
+from jazira_app.jazira_app.utils.helpers import calculate_file_hash
 from jazira_app.jazira_app.utils.validators import validate_warehouse_company, ValidationError
 
 
@@ -20,6 +21,7 @@ class JaziraAppDailySalesImport(Document):
     def validate(self):
         """Validate document before save."""
         self._validate_warehouse()
+        self._set_excel_hash()
     
     def _validate_warehouse(self):
         """Ensure warehouse belongs to company."""
@@ -29,6 +31,13 @@ class JaziraAppDailySalesImport(Document):
             except ValidationError as e:
                 frappe.throw(str(e))
     
+    def _set_excel_hash(self):
+        """Hash the attached file once, so later steps can skip re-hashing."""
+        if not self.excel_file:
+            self.excel_hash = ""
+        elif self.has_value_changed("excel_file") or not self.excel_hash:
+            self.excel_hash = calculate_file_hash(self.excel_file)
+    
     def before_submit(self):
         """Prevent manual submission."""
         frappe.throw(
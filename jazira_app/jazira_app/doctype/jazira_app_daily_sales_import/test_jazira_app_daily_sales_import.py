@@ -0,0 +1,594 @@
+"""
+Test Suite for the Daily Sales Import pipeline
+
+Run with: bench run-tests --app jazira_app --module jazira_app.jazira_app.doctype.jazira_app_daily_sales_import.test_jazira_app_daily_sales_import
+
+These tests cover:
+- Excel parsing (streaming vs legacy parser)
+- Parse-once cache keyed by file hash
+- Aggregation of sales rows by (date, item, rate)
+- Reader registry (format detection by content)
+- Chunked, memoized file hashing
+- In-memory item matching
+- Learned Sales Item Alias table
+- Trigram fuzzy matching with confidence scores
+- Bulk default BOM / recipe resolution and caching
+- Immutable import lines with index-partitioned BOM categorization
+- Multi-level BOM flattening
+- Batch raw-material planning
+- Consolidated (Repack) stock entry per date
+- Import progress stream (Redis log, realtime deltas)
+- Parallel per-date processing with ordered posting
+"""
+
+import os
+import shutil
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+
+SAMPLE_FILE = os.path.join(os.path.dirname(__file__), "kunlik_sotuv_namuna.xlsx")
+
+
+class TestJaziraAppDailySalesImport(FrappeTestCase):
+    """Test cases for the daily sales import services."""
+
+    def setUp(self):
+        """Copy the sample POS export into the site's private files."""
+        self.file_name = f"test_sales_{frappe.generate_hash(length=8)}.xlsx"
+        self.file_url = f"/private/files/{self.file_name}"
+        self.file_path = frappe.get_site_path("private", "files", self.file_name)
+        shutil.copy(SAMPLE_FILE, self.file_path)
+
+    def tearDown(self):
+        if os.path.exists(self.file_path):
+            os.remove(self.file_path)
+
+    # =========================================================================
+    # Excel Parsing Tests
+    # =========================================================================
+
+    def test_streaming_parser_matches_legacy(self):
+        """The read-only single-pass parser returns the same items as the original."""
+        from jazira_app.jazira_app.services import excel_service
+
+        streaming = excel_service.read_sales_report(self.file_url)
+        legacy = excel_service.read_sales_report(self.file_url, streaming=False)
+
+        self.assertTrue(streaming["items"])
+        self.assertEqual(streaming, legacy)
+
+    def test_streaming_parser_detects_header_in_same_pass(self):
+        """Header below a title row is found and summary rows are skipped."""
+        from jazira_app.jazira_app.services import excel_service
+
+        rows = [
+            ("Kunlik hisobot", None, None),
+            ("Nomi", "Soni", "Narxi"),
+            ("Osh", "2", "35 000"),
+            ("Choy", 0, 5000),
+            ("Jami", 2, None),
+        ]
+        items = list(excel_service._iter_rows(iter(rows)))
+
+        self.assertEqual(len(items), 1)
+        self.assertEqual((items[0].item_name, items[0].qty, items[0].rate, items[0].row_num), ("Osh", 2.0, 35000.0, 3))
+
+    def test_parsed_report_is_cached_by_file_hash(self):
+        """Preview, validation and processing share one parse of the same file."""
+        from jazira_app.jazira_app.services import excel_service
+
+        first = excel_service.load_sales_report(self.file_url)
+        frappe.local.sales_report_cache = {}  # new request, Redis copy only
+        with patch.object(excel_service, "read_sales_report") as read:
+            second = excel_service.load_sales_report(self.file_url)
+        read.assert_not_called()
+        excel_service.clear_cache(first["file_hash"])
+
+        self.assertEqual(first, second)
+        raw = excel_service.read_sales_report(self.file_url)["items"]
+        self.assertEqual(first["items"], excel_service.aggregate_items(raw))
+        self.assertEqual(first["row_count"], len(raw))
+        # Callers mutate items: each load returns fresh dicts
+        second["items"][0]["item_code"] = "X"
+        self.assertNotIn("item_code", first["items"][0])
+
+    def test_rows_are_aggregated_by_date_item_and_rate(self):
+        """Receipt lines collapse into per-(date, item, rate) totals that keep their source rows."""
+        from jazira_app.jazira_app.services import excel_service, ImportLine
+
+        rows = [
+            {"item_name": "Osh", "qty": 2.0, "rate": 35000.0, "row_num": 3, "date": "2026-01-05"},
+            {"item_name": "Choy", "qty": 1.0, "rate": 5000.0, "row_num": 4, "date": "2026-01-05"},
+            {"item_name": "Osh", "qty": 1.0, "rate": 35000.0, "row_num": 5, "date": "2026-01-05"},
+            {"item_name": "Osh", "qty": 1.0, "rate": 30000.0, "row_num": 6, "date": "2026-01-05"},
+            {"item_name": "Osh", "qty": 3.0, "rate": 35000.0, "row_num": 7, "date": "2026-01-06"},
+        ]
+        items = excel_service.aggregate_items(rows)
+
+        self.assertEqual([(i["item_name"], i["qty"], i["rate"], i["date"], i["row_nums"]) for i in items], [
+            ("Osh", 3.0, 35000.0, "2026-01-05", [3, 5]),
+            ("Choy", 1.0, 5000.0, "2026-01-05", [4]),
+            ("Osh", 1.0, 30000.0, "2026-01-05", [6]),
+            ("Osh", 3.0, 35000.0, "2026-01-06", [7]),
+        ])
+        report = {"items": items, "posting_date": "2026-01-05", "row_count": len(rows)}
+        self.assertEqual(excel_service._unpack_report(excel_service._pack_report(report)), report)
+        self.assertEqual(ImportLine.from_item(dict(items[0], item_code="OSH")).row_nums, (3, 5))
+
+    def test_csv_export_parses_like_excel(self):
+        """A ;-separated Windows-1251 POS CSV is detected and yields the same records."""
+        from jazira_app.jazira_app.services import excel_service, reader_registry
+
+        csv_path = frappe.get_site_path("private", "files", f"{self.file_name}.csv")
+        with open(csv_path, "w", encoding="cp1251") as f:
+            f.write("Отчет за день\nНаименование;Количество;Цена;Дата\nПлов;2;35 000;05.01.2026\nИтого;2;;\n")
+        try:
+            self.assertEqual(reader_registry.detect(csv_path).name, "csv")
+            self.assertEqual(reader_registry.detect(self.file_path).name, "xlsx")
+
+            items = excel_service.read_sales_report(f"/private/files/{self.file_name}.csv")["items"]
+        finally:
+            os.remove(csv_path)
+
+        self.assertEqual(items, [
+            {"item_name": "Плов", "qty": 2.0, "rate": 35000.0, "row_num": 3, "date": "2026-01-05"}
+        ])
+
+    def test_file_hash_is_streamed_and_memoized(self):
+        """Chunked hashing matches a full-read md5 and is memoized by (path, size, mtime)."""
+        import hashlib
+        from jazira_app.jazira_app.utils import helpers
+
+        with open(self.file_path, "rb") as f:
+            expected = hashlib.md5(f.read()).hexdigest()
+
+        with patch.object(helpers, "HASH_CHUNK_SIZE", 1024):
+            self.assertEqual(helpers.calculate_file_hash(self.file_url, "md5"), expected)
+
+        with patch.object(helpers, "_hash_file") as hash_file:
+            self.assertEqual(helpers.calculate_file_hash(self.file_url, "md5"), expected)
+        hash_file.assert_not_called()
+
+    def test_file_hash_algorithm_never_falls_back(self):
+        """xxh3 without xxhash and unknown algorithms fail instead of hashing differently."""
+        import sys
+        from jazira_app.jazira_app.utils import helpers
+
+        helpers._hash_memo.clear()
+        with patch.dict(sys.modules, {"xxhash": None}):
+            self.assertRaises(frappe.ValidationError, helpers.calculate_file_hash, self.file_url, "xxh3")
+        self.assertRaises(frappe.ValidationError, helpers.calculate_file_hash, self.file_url, "sha1")
+
+    # =========================================================================
+    # Item Matching Tests
+    # =========================================================================
+
+    def test_item_matcher_resolves_in_memory(self):
+        """Exact, normalized and transliterated names resolve without per-name queries."""
+        from jazira_app.jazira_app.services import item_matcher
+        from jazira_app.jazira_app.services.item_matcher import normalize
+
+        self.assertEqual(normalize("Хот-дог  (Стол)"), normalize("xot dog stol"))
+        self.assertEqual(normalize("O‘rik sharbati"), "orik sharbati")
+
+        item = frappe.get_doc({
+            "doctype": "Item",
+            "item_code": f"_Test Plov {frappe.generate_hash(length=6)}",
+            "item_name": "Плов Самарқанд",
+            "item_group": frappe.db.get_value("Item Group", {"is_group": 0}, "name"),
+            "stock_uom": "Nos",
+        }).insert(ignore_permissions=True)
+        self.addCleanup(item.delete)
+
+        item_matcher.match(item.name)  # warm the indexes
+        with patch.object(frappe.db, "sql") as sql:
+            matches = item_matcher.match_many([item.name, "Плов Самарқанд", "плов  самарқанд", "plov samarqand"])
+        sql.assert_not_called()
+        self.assertEqual(set(matches.values()), {item.name})
+
+        # Saving an Item is applied incrementally once committed, without
+        # reloading every Item
+        item.item_name = "Плов Тошкент"
+        with patch.object(item_matcher, "record_changes", wraps=item_matcher.record_changes) as record_changes:
+            item.save()
+            record_changes.assert_not_called()
+            frappe.db.commit()
+            record_changes.assert_called_once_with({item.name: "Плов Тошкент"})
+        with patch.object(item_matcher, "_build") as build:
+            self.assertEqual(item_matcher.match("плов тошкент"), item.name)
+        build.assert_not_called()
+
+    def test_aliases_are_learned_and_resolve_without_queries(self):
+        """Partial matches of a successful import and confirmed ones become Sales Item Alias rows."""
+        from jazira_app.jazira_app.api.daily_sales_import import _learn_fuzzy_matches, confirm_item_aliases
+        from jazira_app.jazira_app.services import item_matcher
+
+        suffix = frappe.generate_hash(length=6)
+        item = frappe.get_doc({
+            "doctype": "Item",
+            "item_code": f"_Test Lagmon {suffix}",
+            "item_name": f"Лағмон қовурма {suffix}",
+            "item_group": frappe.db.get_value("Item Group", {"is_group": 0}, "name"),
+            "stock_uom": "Nos",
+        }).insert(ignore_permissions=True)
+        self.addCleanup(item.delete)
+
+        # Resolving is read-only: the partial match comes back with its score
+        partial_name = f"Лағмон қовурма {suffix}"[:-2]
+        match = item_matcher.resolve([partial_name])[partial_name]
+        self.assertEqual((match.item_code, match.method), (item.name, "fuzzy"))
+        self.assertLess(match.score, 1.0)
+        self.assertFalse(frappe.db.exists("Sales Item Alias", partial_name))
+
+        # ... and is written back once an import using it succeeds
+        _learn_fuzzy_matches({partial_name: item.name})
+        frappe.db.commit()
+        self.assertEqual(frappe.db.get_value("Sales Item Alias", partial_name, "source"), "Partial Match")
+        self.assertEqual(item_matcher.resolve([partial_name])[partial_name].method, "alias")
+
+        # Confirmed match; the next lookup is a cache hit with no DB query
+        pos_name = f"Лагмон {suffix} (собой)"
+        self.assertIn(item.name, [c["item_code"] for c in item_matcher.suggest(pos_name)])
+        self.assertTrue(confirm_item_aliases({pos_name: item.name})["success"])
+
+        item_matcher.match("warm-up")
+        with patch.object(frappe.db, "sql") as sql:
+            self.assertEqual(item_matcher.match_many([pos_name, partial_name]), {pos_name: item.name, partial_name: item.name})
+        sql.assert_not_called()
+
+    def test_trigram_index_scores_and_updates_incrementally(self):
+        """The trigram index ranks by similarity and follows add/remove."""
+        from jazira_app.jazira_app.services.item_matcher import ItemIndex
+
+        index = ItemIndex()
+        index.add("OSH-01", "Osh to'y", newest=False)
+        index.add("OSH-02", "Osh choyxona", newest=False)
+        index.add("LAG-01", "Лағмон", newest=False)
+
+        best, score = index.similar("Ош тўй (собой)", limit=1)[0]
+        self.assertEqual(best, "OSH-01")
+        self.assertTrue(0 < score < 1)
+        self.assertEqual(index.lookup("lagmon").item_code, "LAG-01")
+
+        index.add("OSH-01", "Shashlik")
+        self.assertEqual(index.similar("osh toy", limit=1)[0][0], "OSH-02")
+        index.remove("LAG-01")
+        self.assertIsNone(index.lookup("lagmon").item_code)
+        self.assertEqual(index.similar("lagmon"), [])
+
+    def test_low_confidence_match_is_reported_not_chosen(self):
+        """A weak fuzzy candidate becomes a suggestion on the error, not an item_code."""
+        from jazira_app.jazira_app.services import item_matcher
+        from jazira_app.jazira_app.services.item_matcher import ItemMatch
+        from jazira_app.jazira_app.utils import validate_items_exist
+
+        weak = {"Somsa katta": ItemMatch(None, 0.55, candidate="SOMSA-01")}
+        items = [{"item_name": "Somsa katta", "qty": 1, "rate": 9000, "row_num": 2}]
+        with patch.object(item_matcher, "resolve", return_value=weak):
+            validation = validate_items_exist(items)
+
+        self.assertFalse(validation["valid_items"])
+        self.assertEqual(validation["errors"][0]["suggested_item_code"], "SOMSA-01")
+        self.assertNotIn("item_code", items[0])
+        self.assertEqual(items[0]["suggested_item_code"], "SOMSA-01")
+
+    # =========================================================================
+    # BOM Tests
+    # =========================================================================
+
+    def test_default_boms_resolved_in_bulk_and_cached(self):
+        """One query for all items, then the job memo, then Redis until a BOM changes."""
+        from jazira_app.jazira_app.services import bom_service
+        from jazira_app.jazira_app.services.bom_service import on_bom_change
+
+        codes = [f"_Test No BOM {i}" for i in range(3)]
+        on_bom_change(None)
+
+        with patch.object(frappe, "get_all", wraps=frappe.get_all) as get_all:
+            self.assertEqual(bom_service.get_default_boms(codes), dict.fromkeys(codes))
+            self.assertEqual(get_all.call_count, 1)
+
+            bom_service.get_default_boms(codes)  # job memo
+            frappe.local.bom_cache = None  # next job: Redis copy
+            self.assertIsNone(bom_service.get_default_bom(codes[0]))
+            self.assertEqual(get_all.call_count, 1)
+
+            on_bom_change(None)
+            bom_service.get_default_boms(codes)
+            self.assertEqual(get_all.call_count, 2)
+
+    def test_bom_recipes_round_trip_through_redis(self):
+        """Recipes and flat recipes written by one job are read back by the next from Redis."""
+        from jazira_app.jazira_app.services import bom_service
+
+        bom_service.clear_cache()
+        row = {
+            "parent": "_BOM-RT", "item_code": "_Test Flour", "qty": 1.2, "uom": "Kg",
+            "stock_qty": 1.2, "stock_uom": "Kg", "bom_no": None, "do_not_explode": 0
+        }
+        with patch.object(frappe, "get_all", return_value=[frappe._dict(name="_BOM-RT", quantity=2)]), \
+                patch.object(bom_service, "_get_bom_items", return_value=[row]):
+            flat = bom_service.get_flat_recipes(["_BOM-RT"])
+        self.assertEqual(flat, {"_BOM-RT": {"_Test Flour": (0.6, "Kg")}})
+
+        frappe.local.bom_cache = None  # next job
+        with patch.object(frappe, "get_all", side_effect=AssertionError("DB read")), \
+                patch.object(bom_service, "_get_bom_items", side_effect=AssertionError("DB read")):
+            self.assertEqual(bom_service.preload_recipes(["_BOM-RT"])["_BOM-RT"]["quantity"], 2)
+            self.assertEqual(bom_service.get_flat_recipes(["_BOM-RT"]), flat)
+
+        redis = frappe.cache()
+        self.assertIsNotNone(redis.hmget(redis.make_key(bom_service.FLAT_KEY), ["_BOM-RT"])[0])
+        bom_service.clear_cache()
+
+    def test_multi_level_bom_is_flattened(self):
+        """Sub-assemblies are consumed as-is unless multi-level explosion is enabled."""
+        from jazira_app.jazira_app.services import bom_service
+
+        def row(item_code, stock_qty, bom_no=None, do_not_explode=0):
+            return {"item_code": item_code, "stock_qty": stock_qty, "stock_uom": "Kg", "uom": "Kg",
+                    "bom_no": bom_no, "do_not_explode": do_not_explode}
+
+        frappe.local.bom_cache = {"default_bom": {}, "flat": {}, "recipe": {
+            "_BOM-PIZZA": {"quantity": 2, "items": [
+                row("Dough", 1, "_BOM-DOUGH"), row("Cheese", 0.4), row("Sauce", 0.2, "_BOM-SAUCE", 1),
+            ]},
+            "_BOM-DOUGH": {"quantity": 10, "items": [row("Flour", 6), row("Cheese", 1)]},
+            "_BOM-SAUCE": {"quantity": 1, "items": [row("Tomato", 1)]},
+        }}
+        recipes = frappe.local.bom_cache["recipe"]
+
+        def materials(multi_level):
+            frappe.local.bom_cache = {"default_bom": {}, "flat": {}, "recipe": recipes}
+            with patch.object(bom_service, "_multi_level", return_value=multi_level):
+                return {m.item_code: round(m.qty, 6) for m in bom_service.get_raw_materials("_BOM-PIZZA", 4)}
+
+        with patch.object(bom_service, "_redis_enabled", return_value=False), \
+                patch.object(frappe, "get_all") as get_all:
+            single = materials(False)
+            multi = materials(True)
+        get_all.assert_not_called()
+        frappe.local.bom_cache = None
+
+        self.assertEqual(single, {"Dough": 2.0, "Cheese": 0.8, "Sauce": 0.4})
+        self.assertEqual(multi, {"Flour": 1.2, "Cheese": 1.0, "Sauce": 0.4})
+
+    def test_categorize_returns_partitions_without_mutating(self):
+        """BOM categorization partitions immutable lines by index instead of tagging copies."""
+        import dataclasses
+        from jazira_app.jazira_app.services import bom_service, ImportLine
+
+        lines = [
+            ImportLine(item_code="Pizza", item_name="Pitsa", qty=2, rate=48000, row_num=3),
+            ImportLine(item_code="Cola", item_name="Kola", qty=1, rate=12000, row_num=4),
+            ImportLine(item_code="Pizza", item_name="Pitsa", qty=1, rate=48000, row_num=5),
+        ]
+        with patch.object(bom_service, "get_default_boms", return_value={"Pizza": "_BOM-PIZZA", "Cola": ""}), \
+                patch.object(bom_service, "get_flat_recipes", return_value={}):
+            categorized = bom_service.categorize_items_by_bom(lines)
+
+        self.assertEqual(categorized["with_bom"], [0, 2])
+        self.assertEqual(categorized["without_bom"], [1])
+        self.assertEqual(categorized["boms"], {"Pizza": "_BOM-PIZZA"})
+        self.assertEqual(lines[0].get("bom"), None)
+        with self.assertRaises(dataclasses.FrozenInstanceError):
+            lines[0].qty = 5
+
+    def test_material_plan_matches_per_item_explosion(self):
+        """The sparse product gives the same per-line and total requirements with or without NumPy."""
+        from jazira_app.jazira_app.services import bom_service, planning_service
+        from jazira_app.jazira_app.services import material_planner
+
+        frappe.local.bom_cache = {"default_bom": {}, "recipe": {}, "flat": {
+            "_BOM-PIZZA": {"Flour": (0.3, "Kg"), "Cheese": (0.25, "Kg")},
+            "_BOM-NON": {"Flour": (0.1, "Kg"), "Salt": (0.01, "Kg")},
+        }}
+        lines = [("Pizza", 4), ("Non", 10), ("Pizza", 2), ("Cola", 3)]
+        boms = {"Pizza": "_BOM-PIZZA", "Non": "_BOM-NON", "Cola": None}
+
+        with patch.object(bom_service, "_redis_enabled", return_value=False):
+            plan = planning_service.plan(lines, boms=boms)
+            with patch.object(material_planner, "numpy", None):
+                pure = planning_service.plan(lines, boms=boms)
+        frappe.local.bom_cache = None
+
+        self.assertEqual(plan.per_line[0], {"Flour": 1.2, "Cheese": 1.0})
+        self.assertEqual(plan.per_line[3], {})
+        for code, qty in {"Flour": 2.8, "Cheese": 1.5, "Salt": 0.1}.items():
+            self.assertAlmostEqual(plan.totals[code], qty)
+            self.assertAlmostEqual(pure.totals[code], qty)
+        self.assertAlmostEqual(plan.by_item(lines)["Pizza"]["Flour"], 1.8)
+
+    # =========================================================================
+    # Stock Entry Tests
+    # =========================================================================
+
+    def test_consolidated_mode_books_one_repack_entry(self):
+        """All finished items of a date go into one Repack entry with per-item planned cost shares."""
+        from unittest.mock import MagicMock
+        from jazira_app.jazira_app.services import stock_service, planning_service, StockEntryConfig, MaterialPlan
+
+        items = [
+            {"item_code": "Pizza", "qty": 4, "bom": "_BOM-PIZZA"},
+            {"item_code": "Non", "qty": 10, "bom": "_BOM-NON"},
+            {"item_code": "Pizza", "qty": 2, "bom": "_BOM-PIZZA"},
+        ]
+        plan = MaterialPlan(
+            materials=["Flour", "Cheese"],
+            uoms={"Flour": "Kg", "Cheese": "Kg"},
+            per_line=[{"Flour": 1.2, "Cheese": 1.0}, {"Flour": 1.0}, {"Flour": 0.6, "Cheese": 0.5}],
+            totals={"Flour": 2.8, "Cheese": 1.5},
+        )
+        se = MagicMock(name="Stock Entry")
+        se.name = "SE-TEST-0001"
+        config = StockEntryConfig(company="_Test Company", warehouse="_Test Warehouse", posting_date="2026-01-05", consolidated=True)
+
+        with patch.object(planning_service, "plan", return_value=plan), \
+                patch.object(frappe, "new_doc", return_value=se) as new_doc, \
+                patch.object(stock_service, "_valuation_rates", return_value={"Flour": 10000, "Cheese": 60000}), \
+                patch.object(stock_service, "_value_repack_from_consumption") as value_repack:
+            names = stock_service.create_manufacture_entries(items, config, submit=True)
+
+        self.assertEqual(names, ["SE-TEST-0001"])
+        new_doc.assert_called_once_with("Stock Entry")
+        rows = [call.args[1] for call in se.append.call_args_list]
+        consumed = {r["item_code"]: r["qty"] for r in rows if r["s_warehouse"]}
+        finished = {r["item_code"]: r for r in rows if r["is_finished_item"]}
+        self.assertEqual(se.stock_entry_type, "Repack")
+        self.assertEqual(consumed, {"Flour": 2.8, "Cheese": 1.5})
+        self.assertEqual(finished["Pizza"]["qty"], 6)
+        self.assertAlmostEqual(finished["Pizza"]["basic_rate"], (1.8 * 10000 + 1.5 * 60000) / 6)
+        self.assertAlmostEqual(finished["Non"]["basic_rate"], 1000)
+        value_repack.assert_called_once_with(se)
+        se.submit.assert_called_once()
+
+    def test_consolidated_repack_books_the_ledger_consumption_value(self):
+        """At submit the ERPNext outgoing value is split by planned share, leaving no value difference."""
+        from unittest.mock import MagicMock
+        from jazira_app.jazira_app.services import stock_service
+
+        rows = [
+            frappe._dict(item_code="Flour", qty=2.8, basic_rate=0, is_finished_item=0),
+            frappe._dict(item_code="Pizza", qty=6, basic_rate=18000, is_finished_item=1),
+            frappe._dict(item_code="Non", qty=10, basic_rate=1000, is_finished_item=1),
+        ]
+        se = MagicMock(name="Stock Entry")
+        se.get.return_value = rows
+        # FIFO value of the consumed rows, not the Bin rate the plan used
+        se.set_rate_for_outgoing_items.return_value = 150000
+
+        stock_service._value_repack_from_consumption(se)
+
+        finished = rows[1:]
+        self.assertAlmostEqual(sum(r.basic_rate * r.qty for r in finished), 150000)
+        self.assertAlmostEqual(rows[1].basic_rate * 6, 150000 * 108000 / 118000)
+        self.assertTrue(all(r.set_basic_rate_manually for r in finished))
+
+    # =========================================================================
+    # Import Progress Tests
+    # =========================================================================
+
+    def test_import_progress_publishes_deltas_and_flushes_at_checkpoints(self):
+        """Each line is published alone; import_log is written only on flush."""
+        from jazira_app.jazira_app.services import ImportProgress
+
+        progress = ImportProgress("_Test Progress Import")
+        progress.reset()
+        with patch.object(frappe, "publish_realtime") as publish, \
+                patch.object(frappe.db, "set_value") as set_value:
+            progress.set_total(2, stage="dates")
+            progress.log("line 1")
+            progress.log("noisy", level="debug")
+            progress.log("line 2", level="error")
+            progress.advance()
+            self.assertFalse(set_value.called)
+            progress.flush()
+
+        logs = [c.args[1] for c in publish.call_args_list if c.args[0] == "restaurant_import_log"]
+        self.assertEqual([(d["msg"], d["index"]) for d in logs], [("line 1", 1), ("line 2", 2)])
+        self.assertNotIn("full_log", logs[0])
+        set_value.assert_called_once_with(
+            "Jazira App Daily Sales Import", "_Test Progress Import", "import_log", "line 1\nline 2", update_modified=False
+        )
+        self.assertEqual(progress.lines(1), ["line 2"])
+        self.assertEqual(progress.get_progress(), {"done": 1, "total": 2, "percent": 50, "stage": "dates"})
+
+        redis = frappe.cache()
+        for key in (progress.LOG_KEY, progress.PROGRESS_KEY):
+            self.assertGreater(redis.ttl(progress._key(key)), 0)
+
+        # A new run starts from an empty log and counters
+        progress.reset()
+        self.assertEqual(progress.lines(), [])
+        self.assertEqual(progress.get_progress()["total"], 0)
+
+    # =========================================================================
+    # Parallel Import Tests
+    # =========================================================================
+
+    def test_parallel_dates_post_in_date_order(self):
+        """A date built early waits until every earlier date of the warehouse is posted."""
+        from jazira_app.jazira_app.api import parallel_import
+        from jazira_app.jazira_app.services import stock_service, invoice_service
+
+        doc_name = "_Test Parallel Import"
+        parallel_import._set_plan(doc_name, {
+            "dates": ["2026-01-01", "2026-01-02"],
+            "excel_hash": "x",
+            "warehouse": "_Test Warehouse",
+            "allow_negative_stock": True,
+            "total_items": 2,
+            "aborted": False
+        })
+        parallel_import._set_state(doc_name, "2026-01-01", {"status": parallel_import.PENDING})
+        parallel_import._set_state(doc_name, "2026-01-02", {
+            "status": parallel_import.READY, "stock_entries": ["SE-2"], "sales_invoice": "SI-2", "amount": 5
+        })
+
+        posted = []
+        with patch.object(stock_service, "submit_stock_entries", side_effect=lambda names, _: posted.extend(names)), \
+                patch.object(invoice_service, "submit_invoice", side_effect=posted.append), \
+                patch.object(parallel_import, "_record_posted"), \
+                patch.object(parallel_import, "_finalize") as finalize:
+            parallel_import.advance_posting(doc_name)
+            self.assertEqual(posted, [])
+
+            parallel_import._set_state(doc_name, "2026-01-01", {
+                "status": parallel_import.READY, "stock_entries": ["SE-1"], "sales_invoice": "SI-1", "amount": 3
+            })
+            parallel_import.advance_posting(doc_name)
+
+        self.assertEqual(posted, ["SE-1", "SI-1", "SE-2", "SI-2"])
+        finalize.assert_called_once()
+        states = parallel_import._get_states(doc_name)
+        self.assertEqual({s["status"] for s in states.values()}, {parallel_import.DONE})
+        self.assertGreater(frappe.cache().ttl(parallel_import._key(parallel_import.DATES_KEY, doc_name)), 0)
+
+        # A new run replaces the states of the previous one
+        parallel_import._set_states(doc_name, {"2026-01-03": {"status": parallel_import.PENDING}}, replace=True)
+        self.assertEqual(list(parallel_import._get_states(doc_name)), ["2026-01-03"])
+        frappe.cache().delete(
+            parallel_import._key(parallel_import.PLAN_KEY, doc_name),
+            parallel_import._key(parallel_import.DATES_KEY, doc_name)
+        )
+
+    def test_parallel_posting_hands_over_instead_of_waiting(self):
+        """A taken posting lock leaves a request; lost locks and dead children never stall the import."""
+        from jazira_app.jazira_app.api import parallel_import
+
+        doc_name = "_Test Parallel Handover"
+        warehouse = "_Test Warehouse"
+        parallel_import._set_plan(doc_name, {
+            "dates": ["2026-01-01"], "excel_hash": "x", "warehouse": warehouse,
+            "allow_negative_stock": True, "total_items": 1, "aborted": False
+        })
+        parallel_import._set_states(doc_name, {"2026-01-01": {"status": parallel_import.PENDING, "since": 0}}, replace=True)
+
+        holder = parallel_import.PostingLock(warehouse)
+        self.assertTrue(holder.acquire())
+        try:
+            with patch.object(parallel_import, "_post_ready_dates") as post:
+                parallel_import.advance_posting(doc_name)
+            post.assert_not_called()
+            self.assertEqual(parallel_import._take_requests(warehouse), [doc_name])
+            self.assertTrue(holder.refresh())
+        finally:
+            holder.release()
+        # An expired lock cannot be extended, so its holder stops submitting
+        self.assertFalse(holder.refresh())
+
+        # Watchdog: the child of a pending date is gone
+        with patch.object(frappe, "get_all", return_value=[doc_name]), \
+                patch("frappe.utils.background_jobs.is_job_enqueued", return_value=False), \
+                patch.object(parallel_import, "_enqueue_advance") as enqueue_advance:
+            parallel_import.watch_parallel_imports()
+        self.assertEqual(parallel_import._get_states(doc_name)["2026-01-01"]["status"], parallel_import.FAILED)
+        enqueue_advance.assert_called_once_with(doc_name)
+
+        frappe.cache().delete(
+            parallel_import._key(parallel_import.PLAN_KEY, doc_name),
+            parallel_import._key(parallel_import.DATES_KEY, doc_name)
+        )
@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2026, Jazira App
+# License: MIT
+
+"""Sales Item Alias - POS nomi -> Item moslash jadvali (daily sales import)."""
+
+from frappe.model.document import Document
+
+from jazira_app.jazira_app.services.item_matcher import item_matcher
+
+
+class SalesItemAlias(Document):
+    """Sales Item Alias Document."""
+
+    def before_insert(self):
+        # alias is the document name; strip before autoname
+        if self.alias:
+            self.alias = self.alias.strip()
+
+    def on_update(self):
+        item_matcher.clear_aliases_after_commit()
+
+    def after_rename(self, old, new, merge=False):
+        item_matcher.clear_aliases_after_commit()
+
+    def on_trash(self):
+        item_matcher.clear_aliases_after_commit()
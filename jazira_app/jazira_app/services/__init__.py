@@ -1,17 +1,32 @@
-from jazira_app.jazira_app.services.excel_service import ExcelService, excel_service
+from jazira_app.jazira_app.services.excel_service import ExcelService, excel_service, SalesRow, ImportLine
+from jazira_app.jazira_app.services.sales_readers import SalesReader, ReaderRegistry, reader_registry
 from jazira_app.jazira_app.services.bom_service import BOMService, bom_service, RawMaterial
+from jazira_app.jazira_app.services.material_planner import MaterialPlanner, planning_service, MaterialPlan
 from jazira_app.jazira_app.services.stock_service import StockService, stock_service, StockEntryConfig
 from jazira_app.jazira_app.services.invoice_service import InvoiceService, invoice_service, InvoiceConfig
+from jazira_app.jazira_app.services.timezone_service import TimezoneService, timezone_service
+from jazira_app.jazira_app.services.item_matcher import ItemMatcher, item_matcher
+from jazira_app.jazira_app.services.import_progress import ImportProgress
 
 __all__ = [
     # Excel
     "ExcelService",
     "excel_service",
+    "SalesRow",
+    "ImportLine",
+    "SalesReader",
+    "ReaderRegistry",
+    "reader_registry",
     
     # BOM
     "BOMService",
     "bom_service",
     "RawMaterial",
+
+    # Material planning
+    "MaterialPlanner",
+    "planning_service",
+    "MaterialPlan",
     
     # Stock
     "StockService",
@@ -22,4 +37,15 @@ __all__ = [
     "InvoiceService",
     "invoice_service",
     "InvoiceConfig",
+    
+    # Timezone
+    "TimezoneService",
+    "timezone_service",
+
+    # Item matching
+    "ItemMatcher",
+    "item_matcher",
+
+    # Import progress
+    "ImportProgress",
 ]
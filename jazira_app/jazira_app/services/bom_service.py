@@ -1,7 +1,10 @@
-from typing import Dict, List, Optional
+import pickle
+from typing import Dict, Iterable, List, Optional, Tuple
 from dataclasses import dataclass
 
 import frappe
+from frappe import _
+from frappe.utils import cint
 
 
 @dataclass
@@ -20,8 +23,166 @@ class BOMService:
     - Finding default BOM for items
     - Exploding BOM to get raw materials
     - Calculating required quantities
+
+    Default BOMs and BOM recipes (base quantity + BOM Item rows) are resolved
+    in bulk, kept in a per-request/job memo and, unless disabled with the
+    site config sales_import_bom_cache = 0, in Redis. Submitting or
+    cancelling a BOM clears the Redis copies.
+
+    Raw materials come from flattened recipes: per-unit coefficients of the
+    BOM Item rows, so the requirement for any quantity is a multiplication.
+    By default the rows are consumed as they are, sub-assemblies included.
+    With the site config sales_import_multi_level_bom = 1, sub-assembly rows
+    (a BOM Item with its own BOM, e.g. sauces and doughs made in-house) are
+    exploded recursively down to leaf materials unless marked Do Not
+    Explode. Flattened recipes are cached per mode like the others and
+    rebuilt on first use after a BOM change.
     """
-    
+
+    DEFAULT_BOM_KEY = "bom_service:default_bom"
+    RECIPE_KEY = "bom_service:recipe"
+    FLAT_KEY = "bom_service:flat"
+    MULTI_LEVEL_FLAT_KEY = "bom_service:flat:multi_level"
+
+    # Stored in place of None so "no default BOM" is cached too
+    NO_BOM = ""
+
+    def get_default_boms(self, item_codes: Iterable[str]) -> Dict[str, Optional[str]]:
+        """
+        Default active BOM for many items with at most one query.
+
+        Args:
+            item_codes: Item codes
+
+        Returns:
+            Dict of item_code -> BOM name (None if the item has no default BOM)
+        """
+        item_codes = list(item_codes)
+        memo = self._memo()["default_bom"]
+        missing = [code for code in set(item_codes) if code and code not in memo]
+
+        if missing and self._redis_enabled():
+            redis = frappe.cache()
+            cached = redis.hmget(redis.make_key(self.DEFAULT_BOM_KEY), missing)
+            for code, bom in zip(missing, cached):
+                if bom is not None:
+                    memo[code] = bom.decode() if isinstance(bom, bytes) else bom
+            missing = [code for code in missing if code not in memo]
+
+        if missing:
+            rows = frappe.get_all(
+                "BOM",
+                filters={"item": ["in", missing], "is_default": 1, "is_active": 1, "docstatus": 1},
+                fields=["item", "name"],
+                order_by="modified desc",
+            )
+            found = {}
+            for row in rows:
+                found.setdefault(row.item, row.name)
+            loaded = {code: found.get(code, self.NO_BOM) for code in missing}
+            memo.update(loaded)
+
+            if self._redis_enabled():
+                self._store(self.DEFAULT_BOM_KEY, loaded)
+
+        return {code: memo[code] or None for code in item_codes if code}
+
+    def preload_recipes(self, bom_names: Iterable[str]) -> Dict[str, Dict]:
+        """
+        Base quantity and BOM Item rows for many BOMs in two queries.
+
+        Args:
+            bom_names: BOM document names
+
+        Returns:
+            Dict of bom_name -> {"quantity": float, "items": [BOM Item dicts]}
+        """
+        bom_names = list(bom_names)
+        memo = self._memo()["recipe"]
+        missing = [bom for bom in set(bom_names) if bom and bom not in memo]
+
+        if missing and self._redis_enabled():
+            redis = frappe.cache()
+            cached = redis.hmget(redis.make_key(self.RECIPE_KEY), missing)
+            for bom, raw in zip(missing, cached):
+                if raw is not None:
+                    memo[bom] = pickle.loads(raw)
+            missing = [bom for bom in missing if bom not in memo]
+
+        if missing:
+            loaded = {
+                row.name: {"quantity": row.quantity or 1, "items": []}
+                for row in frappe.get_all(
+                    "BOM", filters={"name": ["in", missing]}, fields=["name", "quantity"]
+                )
+            }
+            for row in self._get_bom_items(missing):
+                parent = row.pop("parent")
+                loaded[parent]["items"].append(row)
+            memo.update(loaded)
+
+            if loaded and self._redis_enabled():
+                self._store(self.RECIPE_KEY, {bom: pickle.dumps(recipe) for bom, recipe in loaded.items()})
+
+        return {bom: memo[bom] for bom in bom_names if bom in memo}
+
+    def get_flat_recipes(self, bom_names: Iterable[str]) -> Dict[str, Dict[str, Tuple[float, str]]]:
+        """
+        Leaf raw materials per one unit of each BOM's finished item.
+
+        Args:
+            bom_names: BOM document names
+
+        Returns:
+            Dict of bom_name -> {item_code: (qty per unit, stock uom)}
+        """
+        bom_names = list(bom_names)
+        memo = self._memo()["flat"]
+        missing = [bom for bom in set(bom_names) if bom and bom not in memo]
+
+        if missing and self._redis_enabled():
+            redis = frappe.cache()
+            cached = redis.hmget(redis.make_key(self._flat_key()), missing)
+            for bom, raw in zip(missing, cached):
+                if raw is not None:
+                    memo[bom] = pickle.loads(raw)
+            missing = [bom for bom in missing if bom not in memo]
+
+        if missing:
+            self._preload_tree(missing)
+            loaded = {}
+            for bom in missing:
+                self._flatten(bom, loaded, ())
+            memo.update(loaded)
+
+            if loaded and self._redis_enabled():
+                self._store(self._flat_key(), {bom: pickle.dumps(flat) for bom, flat in loaded.items()})
+
+        return {bom: memo[bom] for bom in bom_names if bom in memo}
+
+    def _store(self, key: str, mapping: Dict):
+        """
+        Write hash fields with the raw client, matching the raw hmget reads.
+
+        RedisWrapper.hset prefixes the key again and pickles the value, and
+        takes no mapping; the pipeline is a plain redis client.
+        """
+        redis = frappe.cache()
+        pipe = redis.pipeline()
+        pipe.hset(redis.make_key(key), mapping=mapping)
+        pipe.execute()
+
+    def clear_cache(self):
+        """Drop cached default BOMs and recipes (Redis and this request's memo)."""
+        redis = frappe.cache()
+        redis.delete(
+            redis.make_key(self.DEFAULT_BOM_KEY),
+            redis.make_key(self.RECIPE_KEY),
+            redis.make_key(self.FLAT_KEY),
+            redis.make_key(self.MULTI_LEVEL_FLAT_KEY)
+        )
+        frappe.local.bom_cache = None
+
     def get_default_bom(self, item_code: str) -> Optional[str]:
         """
         Get default active BOM for an item.
@@ -32,16 +193,7 @@ class BOMService:
         Returns:
             BOM name or None if not found
         """
-        return frappe.db.get_value(
-            "BOM",
-            {
-                "item": item_code,
-                "is_default": 1,
-                "is_active": 1,
-                "docstatus": 1
-            },
-            "name"
-        )
+        return self.get_default_boms([item_code]).get(item_code)
     
     def get_raw_materials(self, bom_name: str, qty: float) -> List[RawMaterial]:
         """
@@ -57,27 +209,15 @@ class BOMService:
         if not bom_name or qty <= 0:
             return []
         
-        # Get BOM items
-        bom_items = self._get_bom_items(bom_name)
-        
-        # Get BOM base quantity
-        bom_qty = frappe.db.get_value("BOM", bom_name, "quantity") or 1
-        
-        # Calculate required quantities
-        materials = []
-        for item in bom_items:
-            required_qty = (item["stock_qty"] / bom_qty) * qty
-            
-            materials.append(RawMaterial(
-                item_code=item["item_code"],
-                qty=required_qty,
-                uom=item["stock_uom"] or item["uom"]
-            ))
-        
-        return materials
+        flat = self.get_flat_recipes([bom_name]).get(bom_name) or {}
+
+        return [
+            RawMaterial(item_code=item_code, qty=per_unit * qty, uom=uom)
+            for item_code, (per_unit, uom) in flat.items()
+        ]
     
-    def _get_bom_items(self, bom_name: str) -> List[Dict]:
-        """Get BOM items using query builder."""
+    def _get_bom_items(self, bom_names: List[str]) -> List[Dict]:
+        """Get BOM items of several BOMs using query builder."""
         from frappe.query_builder import DocType
         
         BOMItem = DocType("BOM Item")
@@ -85,52 +225,129 @@ class BOMService:
         return (
             frappe.qb.from_(BOMItem)
             .select(
+                BOMItem.parent,
                 BOMItem.item_code,
                 BOMItem.qty,
                 BOMItem.uom,
                 BOMItem.stock_qty,
-                BOMItem.stock_uom
+                BOMItem.stock_uom,
+                BOMItem.bom_no,
+                BOMItem.do_not_explode
             )
-            .where(BOMItem.parent == bom_name)
+            .where(BOMItem.parent.isin(bom_names))
+            .orderby(BOMItem.parent)
+            .orderby(BOMItem.idx)
             .run(as_dict=True)
         )
     
-    def categorize_items_by_bom(self, items: List[Dict]) -> Dict[str, List[Dict]]:
+    def categorize_items_by_bom(self, items: List[Dict]) -> Dict:
         """
         Categorize items by BOM availability.
-        
+
+        Items are not modified: the result holds index partitions into
+        `items` and the resolved BOM per item code, so callers can share
+        one (immutable) item list across dates and stages.
+
         Args:
-            items: List of items with 'item_code' key
-            
+            items: Items (dicts or ImportLine) with 'item_code'
+
         Returns:
             {
-                "with_bom": items that have BOM,
-                "without_bom": items without BOM
+                "with_bom": indices of items that have a BOM,
+                "without_bom": indices of items without BOM,
+                "boms": item_code -> BOM name
             }
         """
         with_bom = []
         without_bom = []
-        
-        for item in items:
+
+        boms = self.get_default_boms(item.get("item_code") for item in items)
+        self.get_flat_recipes(bom for bom in boms.values() if bom)
+
+        for idx, item in enumerate(items):
             item_code = item.get("item_code")
             if not item_code:
                 continue
-            
-            bom = self.get_default_bom(item_code)
-            
-            if bom:
-                item["bom"] = bom
-                item["has_bom"] = True
-                with_bom.append(item)
+
+            if boms.get(item_code):
+                with_bom.append(idx)
             else:
-                item["has_bom"] = False
-                without_bom.append(item)
-        
+                without_bom.append(idx)
+
         return {
             "with_bom": with_bom,
-            "without_bom": without_bom
+            "without_bom": without_bom,
+            "boms": {code: bom for code, bom in boms.items() if bom}
         }
 
+    def _preload_tree(self, bom_names: List[str]):
+        """Load the recipes of bom_names and all their sub-assemblies, one query pair per level."""
+        seen = set()
+        level = set(bom_names)
+        while level:
+            recipes = self.preload_recipes(level)
+            seen |= level
+            level = {
+                row["bom_no"]
+                for recipe in recipes.values()
+                for row in recipe["items"]
+                if self._explodes(row)
+            } - seen
+
+    def _flatten(self, bom_name: str, flat: Dict, path: Tuple[str, ...]) -> Dict[str, Tuple[float, str]]:
+        """Per-unit leaf materials of one BOM; results (sub-assemblies too) go into flat."""
+        if bom_name in flat:
+            return flat[bom_name]
+        if bom_name in path:
+            frappe.throw(_("BOM tsikli aniqlandi: {0}").format(" -> ".join(path + (bom_name,))))
+
+        recipes = self._memo()["recipe"]
+        recipe = recipes.get(bom_name)
+        result = {}
+        for row in (recipe["items"] if recipe else []):
+            per_unit = row["stock_qty"] / recipe["quantity"]
+            if self._explodes(row) and row["bom_no"] in recipes:
+                for item_code, (qty, uom) in self._flatten(row["bom_no"], flat, path + (bom_name,)).items():
+                    self._add_material(result, item_code, per_unit * qty, uom)
+            else:
+                self._add_material(result, row["item_code"], per_unit, row["stock_uom"] or row["uom"])
+
+        flat[bom_name] = result
+        return result
+
+    @staticmethod
+    def _add_material(materials: Dict, item_code: str, qty: float, uom: str):
+        if item_code in materials:
+            qty += materials[item_code][0]
+            uom = materials[item_code][1]
+        materials[item_code] = (qty, uom)
+
+    def _explodes(self, row: Dict) -> bool:
+        return self._multi_level() and bool(row.get("bom_no")) and not cint(row.get("do_not_explode"))
+
+    def _flat_key(self) -> str:
+        return self.MULTI_LEVEL_FLAT_KEY if self._multi_level() else self.FLAT_KEY
+
+    def _memo(self) -> Dict:
+        """Per-request (per background job) memo of default BOMs and recipes."""
+        memo = getattr(frappe.local, "bom_cache", None)
+        if memo is None:
+            memo = frappe.local.bom_cache = {"default_bom": {}, "recipe": {}, "flat": {}}
+        return memo
+
+    @staticmethod
+    def _redis_enabled() -> bool:
+        return bool(cint(frappe.conf.get("sales_import_bom_cache", 1)))
+
+    @staticmethod
+    def _multi_level() -> bool:
+        return bool(cint(frappe.conf.get("sales_import_multi_level_bom")))
+
 
 # Singleton instance
 bom_service = BOMService()
+
+
+def on_bom_change(doc, method=None):
+    """BOM doc_events hook: default BOMs or recipes may have changed."""
+    bom_service.clear_cache()
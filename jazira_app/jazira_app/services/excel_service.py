@@ -1,11 +1,15 @@
-from typing import Dict, List, Optional
+import pickle
+import zlib
+from array import array
+from typing import Dict, Iterator, List, Optional, Tuple
 from dataclasses import dataclass
 from datetime import datetime, date
 
 import frappe
 from frappe import _
 
-from jazira_app.jazira_app.utils.helpers import parse_numeric, get_file_path
+from jazira_app.jazira_app.utils.helpers import parse_numeric, get_file_path, calculate_file_hash
+from jazira_app.jazira_app.services.sales_readers import reader_registry
 
 
 @dataclass
@@ -15,10 +19,81 @@ class ExcelColumn:
     headers: List[str]
 
 
+@dataclass(frozen=True, slots=True)
+class SalesRow:
+    """One parsed sales line (lighter than a per-row dict)."""
+    item_name: str
+    qty: float
+    rate: float
+    row_num: int
+    date: Optional[str] = None
+
+    def as_dict(self) -> Dict:
+        """Dict form used by the validation / BOM / invoice services."""
+        return {
+            "item_name": self.item_name,
+            "qty": self.qty,
+            "rate": self.rate,
+            "row_num": self.row_num,
+            "date": self.date
+        }
+
+
+@dataclass(frozen=True, slots=True)
+class ImportLine:
+    """
+    A matched sales line of an import.
+
+    Immutable, so one list is shared by BOM categorization, stock entries
+    and invoices of every date without copying.
+    """
+    item_code: str
+    item_name: str
+    qty: float
+    rate: float
+    row_num: int
+    date: Optional[str] = None
+    # Source rows collapsed into this line (ExcelService.aggregate_items)
+    row_nums: Tuple[int, ...] = ()
+
+    @classmethod
+    def from_item(cls, item: Dict) -> "ImportLine":
+        """Build from a validated item dict (validate_items_exist)."""
+        return cls(
+            item_code=item["item_code"],
+            item_name=item.get("item_name", ""),
+            qty=item.get("qty", 0),
+            rate=item.get("rate", 0),
+            row_num=item.get("row_num", 0),
+            date=item.get("date"),
+            row_nums=tuple(item.get("row_nums") or (item.get("row_num", 0),))
+        )
+
+    def get(self, key: str, default=None):
+        """Dict-style read access, so services accept item dicts and lines alike."""
+        return getattr(self, key, default)
+
+    def as_dict(self) -> Dict:
+        """Plain dict (job arguments, API responses)."""
+        return {
+            "item_code": self.item_code,
+            "item_name": self.item_name,
+            "qty": self.qty,
+            "rate": self.rate,
+            "row_num": self.row_num,
+            "date": self.date,
+            "row_nums": list(self.row_nums)
+        }
+
+
 class ExcelService:
     """
     Service for reading and parsing Excel files.
 
+    The file format (.xlsx, .ods, .xls, .csv) is detected from its content
+    by the reader registry (sales_readers.py); every format goes through the
+    same header detection and row parsing.
+
     Supports Uzbek POS report format with columns:
     - Nomi (mahsulot nomi)
     - Soni (miqdori)
@@ -36,6 +111,14 @@ class ExcelService:
 
     # Rows to skip (summary rows)
     SKIP_KEYWORDS = ["jami", "итого", "всего", "total", "сумма", "umumiy"]
+
+    # Header must be within the first rows
+    HEADER_SCAN_ROWS = 10
+
+    # Parsed reports are cached by file content hash (see load_sales_report)
+    CACHE_KEY = "sales_report:{0}"
+    CACHE_TTL = 24 * 3600  # seconds
+    CACHE_FORMAT = 2
     
     def __init__(self):
         self._ensure_openpyxl()
@@ -47,12 +130,151 @@ class ExcelService:
         except ImportError:
             frappe.throw(_("openpyxl not installed. Run: pip install openpyxl"))
     
-    def read_sales_report(self, file_url: str) -> Dict:
+    def load_sales_report(self, file_url: str, file_hash: Optional[str] = None) -> Dict:
+        """
+        Parsed sales report shared by preview, validation and processing.
+
+        The file is parsed once per content hash and its rows collapsed
+        into per-(date, item, rate) totals (aggregate_items); the result is
+        kept in Redis in a compact columnar form (see _pack_report) and
+        memoized for the current request/job. Every call returns fresh item
+        dicts, so callers may mutate them.
+
+        Args:
+            file_url: Frappe file URL
+            file_hash: Known content hash (e.g. the import's excel_hash),
+                skips hashing the file
+
+        Returns:
+            Same as read_sales_report with aggregated items (each with
+            "row_nums"), plus "row_count" (source rows) and "file_hash"
+        """
+        file_hash = file_hash or calculate_file_hash(file_url)
+        if not file_hash:
+            return dict(self._read_aggregated(file_url), file_hash="")
+
+        memo = getattr(frappe.local, "sales_report_cache", None)
+        if memo is None:
+            memo = frappe.local.sales_report_cache = {}
+        packed = memo.get(file_hash)
+        if packed is None:
+            redis = frappe.cache()
+            key = redis.make_key(self.CACHE_KEY.format(file_hash))
+            packed = redis.get(key)
+            if packed is None:
+                packed = self._pack_report(self._read_aggregated(file_url))
+                redis.set(key, packed, ex=self.CACHE_TTL)
+            memo[file_hash] = packed
+
+        report = self._unpack_report(packed)
+        if report is None:
+            # Cached by an older format: parse again
+            self.clear_cache(file_hash)
+            return self.load_sales_report(file_url)
+
+        report["file_hash"] = file_hash
+        return report
+
+    def aggregate_items(self, items: List[Dict]) -> List[Dict]:
+        """
+        Collapse sales rows into per-(date, item name, rate) totals.
+
+        A POS export has one row per receipt line, while every later stage
+        (matching, BOM, stock, invoice) only needs the totals. The first
+        source row stays in "row_num" and all of them in "row_nums" for
+        error reporting.
+
+        Args:
+            items: Parsed rows (read_sales_report)
+
+        Returns:
+            Aggregated item dicts in order of first appearance
+        """
+        groups = {}
+        for item in items:
+            key = (item["date"], item["item_name"], item["rate"])
+            group = groups.get(key)
+            if group is None:
+                groups[key] = dict(item, row_nums=[item["row_num"]])
+            else:
+                group["qty"] += item["qty"]
+                group["row_nums"].append(item["row_num"])
+        return list(groups.values())
+
+    def _read_aggregated(self, file_url: str) -> Dict:
+        report = self.read_sales_report(file_url)
+        return {
+            "items": self.aggregate_items(report["items"]),
+            "posting_date": report["posting_date"],
+            "row_count": len(report["items"])
+        }
+
+    def _pack_report(self, report: Dict) -> bytes:
+        """
+        Serialize an aggregated report column-wise: item names and dates
+        are interned into lookup lists, numbers go into typed arrays and
+        the source row numbers of item i are rows[row_ptr[i]:row_ptr[i + 1]].
+        """
+        names, dates = {}, {None: 0}
+        name_idx, qty, rate, date_idx = array("I"), array("d"), array("d"), array("I")
+        row_ptr, rows = array("I", [0]), array("I")
+
+        for item in report["items"]:
+            name_idx.append(names.setdefault(item["item_name"], len(names)))
+            qty.append(item["qty"])
+            rate.append(item["rate"])
+            date_idx.append(dates.setdefault(item["date"], len(dates)))
+            rows.extend(item["row_nums"])
+            row_ptr.append(len(rows))
+
+        payload = (
+            self.CACHE_FORMAT,
+            report["posting_date"],
+            report["row_count"],
+            list(names),
+            list(dates),
+            name_idx.tobytes(), qty.tobytes(), rate.tobytes(), date_idx.tobytes(),
+            row_ptr.tobytes(), rows.tobytes()
+        )
+        return zlib.compress(pickle.dumps(payload, protocol=pickle.HIGHEST_PROTOCOL))
+
+    def _unpack_report(self, packed: bytes) -> Optional[Dict]:
+        """Inverse of _pack_report; None if the blob has another format."""
+        payload = pickle.loads(zlib.decompress(packed))
+        if payload[0] != self.CACHE_FORMAT:
+            return None
+
+        _, posting_date, row_count, names, dates, *columns = payload
+        name_idx, qty, rate, date_idx, row_ptr, rows = (
+            array(code, raw) for code, raw in zip("IddIII", columns)
+        )
+
+        items = []
+        for i, (n, q, r, d) in enumerate(zip(name_idx, qty, rate, date_idx)):
+            row_nums = rows[row_ptr[i]:row_ptr[i + 1]].tolist()
+            items.append({
+                "item_name": names[n],
+                "qty": q,
+                "rate": r,
+                "row_num": row_nums[0],
+                "date": dates[d],
+                "row_nums": row_nums
+            })
+        return {"items": items, "posting_date": posting_date, "row_count": row_count}
+
+    def clear_cache(self, file_hash: str):
+        """Drop a cached parse (e.g. after the parser changed)."""
+        frappe.cache().delete(frappe.cache().make_key(self.CACHE_KEY.format(file_hash)))
+        getattr(frappe.local, "sales_report_cache", {}).pop(file_hash, None)
+
+    def read_sales_report(self, file_url: str, streaming: bool = True) -> Dict:
         """
         Read POS sales report from Excel file.
 
         Args:
             file_url: Frappe file URL
+            streaming: Use the read-only single-pass parser (iter_sales_rows);
+                False selects the original full-workbook parser
 
         Returns:
             Dict with keys:
@@ -62,6 +284,114 @@ class ExcelService:
         Raises:
             frappe.ValidationError: If file cannot be read or required columns missing
         """
+        if not streaming:
+            return self._read_sales_report_legacy(file_url)
+
+        items = []
+        excel_date = None
+        for row in self.iter_sales_rows(file_url):
+            if excel_date is None and row.date:
+                excel_date = row.date
+            items.append(row.as_dict())
+
+        return {
+            "items": items,
+            "posting_date": excel_date
+        }
+
+    def iter_sales_rows(self, file_url: str) -> Iterator[SalesRow]:
+        """
+        Stream sales rows from a sales report file.
+
+        The reader for the file format streams plain row values and the
+        sheet is scanned once: the header is detected in the first
+        HEADER_SCAN_ROWS rows of the same pass that then yields the data
+        rows, so memory stays flat regardless of file size.
+
+        Args:
+            file_url: Frappe file URL
+
+        Yields:
+            SalesRow for every valid data row
+
+        Raises:
+            frappe.ValidationError: If file cannot be read or required columns missing
+        """
+        file_path = get_file_path(file_url)
+        if not file_path:
+            frappe.throw(_("Excel fayl topilmadi: {0}").format(file_url))
+
+        reader = reader_registry.detect(file_path)
+        yield from self._iter_rows(reader.iter_rows(file_path))
+
+    def _iter_rows(self, rows) -> Iterator[SalesRow]:
+        """Detect the header and parse data rows from an iterator of value tuples."""
+        column_indices = {}
+        header_row = None
+
+        for row_num, values in enumerate(rows, start=1):
+            if header_row is None:
+                self._match_header(values, row_num, column_indices)
+                if "item_name" in column_indices and "qty" in column_indices:
+                    header_row = row_num
+                    item_name_col = column_indices["item_name"] - 1
+                    qty_col = column_indices["qty"] - 1
+                    rate_col = column_indices["rate"] - 1 if "rate" in column_indices else None
+                    dt_col = column_indices["datetime"] - 1 if "datetime" in column_indices else None
+                elif row_num >= self.HEADER_SCAN_ROWS:
+                    break
+                continue
+
+            item_name = self._value_str(values, item_name_col)
+            if not item_name or self._is_summary_row(item_name):
+                continue
+
+            qty = parse_numeric(self._value(values, qty_col))
+            if qty <= 0:
+                continue
+
+            rate = parse_numeric(self._value(values, rate_col)) if rate_col is not None else 0.0
+            item_date = self._parse_cell_date(self._value(values, dt_col)) if dt_col is not None else None
+
+            yield SalesRow(item_name, qty, rate, row_num, item_date)
+
+        if header_row is None:
+            self._validate_required_columns(column_indices)
+
+    def _match_header(self, values, row_num: int, column_indices: Dict[str, int]):
+        """Record header columns found in one row (same rules as _find_columns)."""
+        for col_num, value in enumerate(values, start=1):
+            if not value:
+                continue
+
+            cell_val = str(value).lower().strip()
+
+            for column in self.COLUMNS:
+                for header in column.headers:
+                    if header in cell_val and column.field_name not in column_indices:
+                        column_indices[column.field_name] = col_num
+                        column_indices["_header_row"] = row_num
+                        break
+
+    @staticmethod
+    def _value(values, col_index: Optional[int]):
+        """Value at col_index of a values_only row, None if out of range."""
+        if col_index is None or col_index < 0 or col_index >= len(values):
+            return None
+        return values[col_index]
+
+    def _value_str(self, values, col_index: int) -> Optional[str]:
+        value = self._value(values, col_index)
+        if value is None:
+            return None
+        return str(value).strip()
+
+    def _read_sales_report_legacy(self, file_url: str) -> Dict:
+        """
+        Original parser: loads every cell object and scans the sheet twice.
+
+        Kept for benchmarking against iter_sales_rows.
+        """
         from openpyxl import load_workbook
 
         file_path = get_file_path(file_url)
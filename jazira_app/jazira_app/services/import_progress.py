@@ -0,0 +1,129 @@
+from typing import Dict, List, Optional
+
+import frappe
+
+
+class ImportProgress:
+    """
+    Log and progress stream of one Daily Sales Import.
+
+    Log lines are appended to a Redis list (one RPUSH per line, safe across
+    the parallel per-date workers) and realtime publishes only the new line
+    and the progress counters. The import_log field is written from the
+    list at checkpoints (flush) instead of on every line.
+
+    All list and hash commands go through a pipeline (the plain redis
+    client) on make_key'd names: RedisWrapper's own list/hash methods
+    would prefix the key a second time and pickle the values.
+    """
+
+    DOCTYPE = "Jazira App Daily Sales Import"
+
+    LOG_KEY = "daily_sales_import:{0}:log"
+    PROGRESS_KEY = "daily_sales_import:{0}:progress"
+    TTL = 2 * 24 * 3600
+
+    LEVELS = {"debug": 10, "info": 20, "warning": 30, "error": 40}
+
+    def __init__(self, doc_name: str):
+        self.doc_name = doc_name
+        # Lines below this level are dropped (site conf sales_import_log_level)
+        level = frappe.conf.get("sales_import_log_level") or "info"
+        self.min_level = self.LEVELS.get(level, self.LEVELS["info"])
+
+    def reset(self):
+        """Drop the log and counters of a previous run."""
+        pipe = self._pipeline()
+        pipe.delete(self._key(self.LOG_KEY), self._key(self.PROGRESS_KEY))
+        pipe.execute()
+
+    def log(self, msg: str, level: str = "info", publish: bool = True):
+        """
+        Append a log line and publish it.
+
+        Args:
+            msg: Log line
+            level: debug, info, warning or error
+            publish: Send the line over realtime
+        """
+        if self.LEVELS.get(level, self.LEVELS["info"]) < self.min_level:
+            return
+
+        key = self._key(self.LOG_KEY)
+        pipe = self._pipeline()
+        pipe.rpush(key, msg)
+        pipe.expire(key, self.TTL)
+        index, _ = pipe.execute()
+        if publish:
+            frappe.publish_realtime(
+                "restaurant_import_log",
+                {"doc_name": self.doc_name, "msg": msg, "level": level, "index": index},
+                doctype=self.DOCTYPE,
+                docname=self.doc_name
+            )
+
+    def set_total(self, total: int, stage: Optional[str] = None):
+        """Start a progress stage of `total` units."""
+        key = self._key(self.PROGRESS_KEY)
+        pipe = self._pipeline()
+        pipe.hset(key, mapping={"done": 0, "total": total, "stage": stage or ""})
+        pipe.expire(key, self.TTL)
+        pipe.execute()
+        self._publish_progress()
+
+    def advance(self, units: int = 1):
+        """Mark units of the current stage as done."""
+        pipe = self._pipeline()
+        pipe.hincrby(self._key(self.PROGRESS_KEY), "done", units)
+        pipe.execute()
+        self._publish_progress()
+
+    def get_progress(self) -> Dict:
+        """
+        Current progress counters.
+
+        Returns:
+            Dict with done, total, percent and stage
+        """
+        pipe = self._pipeline()
+        pipe.hgetall(self._key(self.PROGRESS_KEY))
+        raw, = pipe.execute()
+        values = {
+            (k.decode() if isinstance(k, bytes) else k): (v.decode() if isinstance(v, bytes) else v)
+            for k, v in raw.items()
+        }
+        done = int(values.get("done") or 0)
+        total = int(values.get("total") or 0)
+        return {
+            "done": done,
+            "total": total,
+            "percent": round(done * 100 / total) if total else 0,
+            "stage": values.get("stage") or "",
+        }
+
+    def lines(self, start: int = 0) -> List[str]:
+        """Log lines from position `start` on."""
+        pipe = self._pipeline()
+        pipe.lrange(self._key(self.LOG_KEY), start, -1)
+        raw, = pipe.execute()
+        return [line.decode() if isinstance(line, bytes) else line for line in raw]
+
+    def flush(self):
+        """Checkpoint: write the collected log to the import_log field."""
+        lines = self.lines()
+        if lines:
+            frappe.db.set_value(self.DOCTYPE, self.doc_name, "import_log", "\n".join(lines), update_modified=False)
+
+    def _publish_progress(self):
+        frappe.publish_realtime(
+            "restaurant_import_progress",
+            {"doc_name": self.doc_name, **self.get_progress()},
+            doctype=self.DOCTYPE,
+            docname=self.doc_name
+        )
+
+    def _pipeline(self):
+        return frappe.cache().pipeline()
+
+    def _key(self, template: str) -> str:
+        return frappe.cache().make_key(template.format(self.doc_name))
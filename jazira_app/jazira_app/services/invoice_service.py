@@ -97,6 +97,19 @@ class InvoiceService:
             
             return si.name
     
+    def submit_invoice(self, invoice_name: str) -> bool:
+        """
+        Submit a draft Sales Invoice.
+        """
+        with self._invoice_flags(mute_messages=True):
+            si = frappe.get_doc("Sales Invoice", invoice_name)
+            if si.docstatus == 0:
+                si.flags.ignore_permissions = True
+                si.submit()
+                return True
+        
+        return False
+    
     def cancel_invoice(self, invoice_name: str) -> bool:
         """
         Cancel a Sales Invoice.
@@ -0,0 +1,478 @@
+import json
+import math
+import re
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Set
+
+import frappe
+from frappe.utils import flt, now_datetime
+
+
+# Uzbek/Russian Cyrillic -> Latin, so "Пицца" and "Pitsa"-style spellings of
+# the same POS name fold to comparable keys
+TRANSLIT = {
+    "а": "a", "б": "b", "в": "v", "г": "g", "д": "d", "е": "e", "ё": "yo",
+    "ж": "j", "з": "z", "и": "i", "й": "y", "к": "k", "л": "l", "м": "m",
+    "н": "n", "о": "o", "п": "p", "р": "r", "с": "s", "т": "t", "у": "u",
+    "ф": "f", "х": "x", "ц": "ts", "ч": "ch", "ш": "sh", "щ": "sh", "ъ": "",
+    "ы": "i", "ь": "", "э": "e", "ю": "yu", "я": "ya", "ў": "o", "қ": "q",
+    "ғ": "g", "ҳ": "h",
+}
+_TRANSLIT_TABLE = str.maketrans(TRANSLIT)
+
+# Uzbek Latin apostrophes (o‘, g‘, ma'lumot) are dropped, everything else
+# that is not a letter or digit separates tokens
+_APOSTROPHES = re.compile(r"['‘’ʻʼ`]")
+_SEPARATORS = re.compile(r"[\W_]+")
+
+
+def normalize(text: str) -> str:
+    """
+    Fold an item name to its matching key.
+
+    Lowercases, transliterates Cyrillic to Latin and collapses whitespace and
+    punctuation, e.g. "Хот-дог  (стол)" -> "xot dog stol".
+    """
+    text = _APOSTROPHES.sub("", (text or "").casefold().translate(_TRANSLIT_TABLE))
+    return " ".join(_SEPARATORS.sub(" ", text).split())
+
+
+def trigrams(key: str) -> Set[str]:
+    """Character trigrams of a normalized key, padded so short words count."""
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+@dataclass(frozen=True)
+class ItemMatch:
+    """Result of resolving one POS item name."""
+    item_code: Optional[str]
+    # 1.0 for alias/exact/normalized hits, trigram similarity for fuzzy ones
+    score: float = 0.0
+    # alias, code, item_name, normalized, fuzzy or None (not matched)
+    method: Optional[str] = None
+    # Best fuzzy candidate below the auto-match score (not chosen)
+    candidate: Optional[str] = None
+
+
+class ItemIndex:
+    """
+    Exact, normalized and trigram indexes over Item code and item_name.
+
+    Keys map to lists of item codes, most recently modified first, so
+    duplicate names resolve the way frappe.db.get_value's default ordering
+    did. Items can be added and removed one by one (incremental refresh).
+    """
+
+    def __init__(self):
+        self.item_names: Dict[str, Optional[str]] = {}
+        self.names: Dict[str, List[str]] = {}
+        self.normalized: Dict[str, List[str]] = {}
+        self.trigrams: Dict[str, Set[str]] = {}
+        # item_code -> normalized item_name (trigram source) and its trigram count
+        self.keys: Dict[str, str] = {}
+        self.sizes: Dict[str, int] = {}
+
+    def add(self, item_code: str, item_name: Optional[str], newest: bool = True):
+        """Index an Item; newest=True puts it ahead of Items sharing its names."""
+        self.remove(item_code)
+        self.item_names[item_code] = item_name
+
+        if item_name:
+            self._push(self.names, item_name, item_code, newest)
+        for key in {normalize(item_code), normalize(item_name)}:
+            if key:
+                self._push(self.normalized, key, item_code, newest)
+
+        key = normalize(item_name or item_code)
+        grams = trigrams(key)
+        self.keys[item_code] = key
+        self.sizes[item_code] = len(grams)
+        for gram in grams:
+            self.trigrams.setdefault(gram, set()).add(item_code)
+
+    def remove(self, item_code: str):
+        if item_code not in self.item_names:
+            return
+        item_name = self.item_names.pop(item_code)
+
+        if item_name:
+            self._pull(self.names, item_name, item_code)
+        for key in {normalize(item_code), normalize(item_name)}:
+            self._pull(self.normalized, key, item_code)
+
+        self.sizes.pop(item_code)
+        for gram in trigrams(self.keys.pop(item_code)):
+            postings = self.trigrams.get(gram)
+            if postings is not None:
+                postings.discard(item_code)
+                if not postings:
+                    del self.trigrams[gram]
+
+    def lookup(self, name: str) -> ItemMatch:
+        """Exact code, exact item_name, then normalized code/item_name."""
+        if name in self.item_names:
+            return ItemMatch(name, 1.0, "code")
+        if name in self.names:
+            return ItemMatch(self.names[name][0], 1.0, "item_name")
+        codes = self.normalized.get(normalize(name))
+        if codes:
+            return ItemMatch(codes[0], 1.0, "normalized")
+        return ItemMatch(None)
+
+    def similar(self, name: str, limit: int = 5, min_score: float = 0.0) -> List[tuple]:
+        """
+        Items ranked by trigram similarity (Dice coefficient) to name.
+
+        Only Items sharing a trigram with name are scored (inverted index),
+        and only those sharing enough of them to possibly reach min_score.
+
+        Returns:
+            [(item_code, score)] best first
+        """
+        grams = trigrams(normalize(name))
+        if not grams:
+            return []
+
+        shared = Counter()
+        for gram in grams:
+            postings = self.trigrams.get(gram)
+            if postings:
+                shared.update(postings)
+
+        # Dice >= min_score needs at least min_score * |A| / (2 - min_score) shared trigrams
+        required = max(1, math.ceil(min_score * len(grams) / (2 - min_score) - 1e-9))
+        scored = []
+        for item_code, common in shared.items():
+            if common < required:
+                continue
+            score = 2 * common / (len(grams) + self.sizes[item_code])
+            if score >= min_score:
+                scored.append((item_code, round(score, 3)))
+
+        scored.sort(key=lambda s: (-s[1], s[0]))
+        return scored[:limit]
+
+    @staticmethod
+    def _push(index: Dict[str, List[str]], key: str, item_code: str, newest: bool):
+        codes = index.setdefault(key, [])
+        if newest:
+            codes.insert(0, item_code)
+        else:
+            codes.append(item_code)
+
+    @staticmethod
+    def _pull(index: Dict[str, List[str]], key: str, item_code: str):
+        codes = index.get(key)
+        if codes and item_code in codes:
+            codes.remove(item_code)
+            if not codes:
+                del index[key]
+
+
+class ItemMatcher:
+    """
+    In-memory resolver from POS item names to Item codes.
+
+    Learned POS name variants live in Sales Item Alias and are cached in
+    Redis as one hash map, so repeat imports resolve without queries. All
+    Item codes and names are loaded once per worker and site into an
+    ItemIndex; names it cannot resolve exactly go to a trigram fuzzy match
+    that is only accepted above AUTO_MATCH_SCORE. Weaker candidates are
+    reported, not chosen.
+
+    Item changes are published to Redis (item code, new item_name and a
+    sequence number); each worker applies the changes it has not seen on
+    its next lookup instead of reloading every Item. clear() forces a full
+    reload everywhere.
+    """
+
+    GENERATION_KEY = "item_matcher:generation"
+    ALIAS_CACHE_KEY = "item_matcher:aliases"
+
+    # Incremental refresh: sorted set item_code -> seq, hash item_code -> JSON item_name
+    SEQ_KEY = "item_matcher:seq"
+    CHANGES_KEY = "item_matcher:changes"
+    CHANGED_ITEMS_KEY = "item_matcher:changed_items"
+    # Highest seq trimmed from the change log; workers behind it reload
+    FLOOR_KEY = "item_matcher:floor"
+    MAX_CHANGES = 5000
+
+    # Fuzzy matches at or above this similarity are accepted (site config:
+    # sales_import_auto_match_score); weaker ones down to SUGGEST_SCORE are
+    # returned as candidates only
+    AUTO_MATCH_SCORE = 0.8
+    SUGGEST_SCORE = 0.4
+
+    # Sales Item Alias.alias is a Data field (also the document name)
+    MAX_ALIAS_LENGTH = 140
+
+    def __init__(self):
+        # site -> {"generation": token, "seq": int, "index": ItemIndex}
+        self._sites: Dict[str, Dict] = {}
+
+    def match(self, name: str) -> Optional[str]:
+        """Resolve a single item name (see match_many)."""
+        return self.match_many([name]).get(name)
+
+    def match_many(self, names: Iterable[str]) -> Dict[str, Optional[str]]:
+        """
+        Resolve item names to Item codes (see resolve).
+
+        Returns:
+            Dict of name -> item code (None if not found) for every name
+        """
+        return {name: match.item_code for name, match in self.resolve(names).items()}
+
+    def resolve(self, names: Iterable[str]) -> Dict[str, ItemMatch]:
+        """
+        Resolve item names with match details.
+
+        Lookup order per name: Sales Item Alias, exact Item code, exact
+        item_name, normalized code/item_name, then the best trigram match
+        if it scores at least AUTO_MATCH_SCORE. Read-only: accepted fuzzy
+        matches come back with method "fuzzy" and their score, the caller
+        stores them (learn_aliases) once an import using them succeeds.
+
+        Args:
+            names: POS item names
+
+        Returns:
+            Dict of name -> ItemMatch for every name
+        """
+        index = self._index()
+        aliases = self.get_aliases()
+        auto_score = flt(frappe.conf.get("sales_import_auto_match_score")) or self.AUTO_MATCH_SCORE
+        result = {}
+
+        for name in set(names):
+            if name in aliases:
+                result[name] = ItemMatch(aliases[name], 1.0, "alias")
+                continue
+
+            match = index.lookup(name)
+            if not match.item_code:
+                best = index.similar(name, limit=1, min_score=self.SUGGEST_SCORE)
+                if best and best[0][1] >= auto_score:
+                    match = ItemMatch(best[0][0], best[0][1], "fuzzy")
+                elif best:
+                    match = ItemMatch(None, best[0][1], candidate=best[0][0])
+
+            result[name] = match
+
+        return result
+
+    def suggest(self, name: str, limit: int = 5) -> List[Dict]:
+        """
+        Candidate Items for an unmatched name, ranked by trigram similarity.
+
+        Args:
+            name: POS item name
+            limit: Maximum candidates
+
+        Returns:
+            List of {"item_code", "item_name", "score"} (score 0..1), best first
+        """
+        index = self._index()
+        return [
+            {"item_code": item_code, "item_name": index.item_names.get(item_code), "score": score}
+            for item_code, score in index.similar(name, limit=limit, min_score=self.SUGGEST_SCORE)
+        ]
+
+    def get_aliases(self) -> Dict[str, str]:
+        """Sales Item Alias map (alias -> item code), cached in Redis."""
+        return frappe.cache().get_value(self.ALIAS_CACHE_KEY, generator=self._load_aliases)
+
+    def learn_aliases(self, mapping: Dict[str, str], source: str = "Confirmed", overwrite: bool = False):
+        """
+        Store POS name -> Item code aliases.
+
+        Runs in the caller's transaction; the cached alias map is dropped
+        once it commits.
+
+        Args:
+            mapping: {alias: item_code}
+            source: Sales Item Alias source (Confirmed, Partial Match, ...)
+            overwrite: Replace the Item of aliases that already exist
+        """
+        mapping = {
+            alias.strip(): item_code
+            for alias, item_code in mapping.items()
+            if alias and alias.strip() and len(alias.strip()) <= self.MAX_ALIAS_LENGTH
+        }
+        if not mapping:
+            return
+
+        if overwrite:
+            existing = frappe.get_all(
+                "Sales Item Alias",
+                filters={"name": ["in", list(mapping)]},
+                pluck="name"
+            )
+            for alias in existing:
+                frappe.db.set_value("Sales Item Alias", alias, {
+                    "item_code": mapping[alias],
+                    "item_name": self._item_name(mapping[alias]),
+                    "source": source,
+                })
+
+        now = now_datetime()
+        user = frappe.session.user
+        frappe.db.bulk_insert(
+            "Sales Item Alias",
+            fields=["name", "creation", "modified", "modified_by", "owner", "docstatus",
+                    "alias", "item_code", "item_name", "source"],
+            values=[
+                (alias, now, now, user, user, 0, alias, item_code, self._item_name(item_code), source)
+                for alias, item_code in mapping.items()
+            ],
+            ignore_duplicates=True
+        )
+        self.clear_aliases_after_commit()
+
+    def clear_aliases(self):
+        """Drop the cached alias map (Sales Item Alias changed)."""
+        frappe.cache().delete_value(self.ALIAS_CACHE_KEY)
+
+    def clear_aliases_after_commit(self):
+        """
+        Drop the cached alias map when the current transaction commits.
+
+        Clearing earlier lets a concurrent import re-cache the map without
+        the uncommitted aliases.
+        """
+        frappe.db.after_commit.add(self.clear_aliases)
+
+    def clear(self):
+        """Force every worker to reload the item indexes on its next request."""
+        frappe.cache().set_value(self.GENERATION_KEY, frappe.generate_hash(length=10))
+        self._sites.pop(frappe.local.site, None)
+
+    def record_changes(self, items: Dict[str, Optional[str]]):
+        """
+        Publish Item changes for incremental refresh.
+
+        Args:
+            items: {item_code: item_name}, item_name None for deleted Items
+        """
+        redis = frappe.cache()
+        seq = redis.incr(redis.make_key(self.SEQ_KEY))
+
+        changes_key = redis.make_key(self.CHANGES_KEY)
+        items_key = redis.make_key(self.CHANGED_ITEMS_KEY)
+        pipe = redis.pipeline()
+        pipe.hset(items_key, mapping={code: json.dumps(name) for code, name in items.items()})
+        pipe.zadd(changes_key, {code: seq for code in items})
+        pipe.zcard(changes_key)
+        size = pipe.execute()[-1]
+
+        if size > self.MAX_CHANGES:
+            trimmed = redis.zrange(changes_key, 0, size - self.MAX_CHANGES - 1, withscores=True)
+            if trimmed:
+                pipe = redis.pipeline()
+                pipe.zrem(changes_key, *[code for code, _ in trimmed])
+                pipe.hdel(items_key, *[code for code, _ in trimmed])
+                pipe.set(redis.make_key(self.FLOOR_KEY), int(max(score for _, score in trimmed)))
+                pipe.execute()
+
+    def _index(self) -> ItemIndex:
+        """Return this site's index, reloading or refreshing stale ones."""
+        site = frappe.local.site
+        # get_value is memoized per request, so this is one Redis GET per request
+        generation = frappe.cache().get_value(self.GENERATION_KEY)
+        redis = frappe.cache()
+        seq = int(redis.get(redis.make_key(self.SEQ_KEY)) or 0)
+
+        state = self._sites.get(site)
+        if state is None or state["generation"] != generation or not self._refresh(state, seq):
+            state = {"generation": generation, "seq": seq, "index": self._build()}
+            self._sites[site] = state
+
+        return state["index"]
+
+    def _refresh(self, state: Dict, seq: int) -> bool:
+        """Apply published Item changes newer than state["seq"]; False if a reload is needed."""
+        if seq == state["seq"]:
+            return True
+
+        redis = frappe.cache()
+        if int(redis.get(redis.make_key(self.FLOOR_KEY)) or 0) > state["seq"]:
+            return False
+
+        changed = redis.zrangebyscore(
+            redis.make_key(self.CHANGES_KEY), f"({state['seq']}", "+inf", withscores=True
+        )
+        if not changed:
+            return True
+
+        codes = [code.decode() if isinstance(code, bytes) else code for code, _ in changed]
+        names = redis.hmget(redis.make_key(self.CHANGED_ITEMS_KEY), codes)
+        index = state["index"]
+        for item_code, raw in zip(codes, names):
+            item_name = json.loads(raw) if raw is not None else None
+            if item_name is None:
+                index.remove(item_code)
+            else:
+                index.add(item_code, item_name)
+
+        # Highest seq actually seen: a change whose seq was taken but not yet
+        # written is picked up on the next lookup
+        state["seq"] = int(max(score for _, score in changed))
+        return True
+
+    def _item_name(self, item_code: str) -> Optional[str]:
+        return self._index().item_names.get(item_code)
+
+    @staticmethod
+    def _load_aliases() -> Dict[str, str]:
+        return dict(frappe.get_all("Sales Item Alias", fields=["alias", "item_code"], as_list=True))
+
+    @staticmethod
+    def _build() -> ItemIndex:
+        # Same order as frappe.db.get_value's default, so duplicate names
+        # resolve to the same Item as before
+        rows = frappe.get_all(
+            "Item",
+            fields=["name", "item_name"],
+            order_by="modified desc",
+            as_list=True,
+        )
+
+        index = ItemIndex()
+        for item_code, item_name in rows:
+            index.add(item_code, item_name, newest=False)
+        return index
+
+
+# Singleton instance
+item_matcher = ItemMatcher()
+
+
+def on_item_change(doc, method=None, *args):
+    """
+    Item doc_events hook: publish the change once the transaction commits.
+
+    Publishing from inside the transaction would let other workers apply a
+    save or delete that is later rolled back (e.g. a delete refused by the
+    link check). Aliases of a deleted Item are removed in on_trash, before
+    the link check, and roll back together with the delete.
+    """
+    if method == "on_trash":
+        frappe.db.delete("Sales Item Alias", {"item_code": doc.name})
+    elif method == "after_delete":
+        _publish_after_commit({doc.name: None}, clear_aliases=True)
+    elif method == "after_rename":
+        # args: old, new, merge
+        _publish_after_commit({args[0]: None, doc.name: doc.item_name or ""}, clear_aliases=True)
+    else:
+        _publish_after_commit({doc.name: doc.item_name or ""})
+
+
+def _publish_after_commit(items: Dict[str, Optional[str]], clear_aliases: bool = False):
+    def publish():
+        item_matcher.record_changes(items)
+        if clear_aliases:
+            item_matcher.clear_aliases()
+
+    frappe.db.after_commit.add(publish)
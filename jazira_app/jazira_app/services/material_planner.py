@@ -0,0 +1,133 @@
+from array import array
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from jazira_app.jazira_app.services.bom_service import bom_service
+
+try:
+    import numpy
+except ImportError:  # optional, the pure-Python product gives the same result
+    numpy = None
+
+
+@dataclass(frozen=True)
+class MaterialPlan:
+    """Raw-material requirement for a set of (finished item, qty) lines."""
+    # Raw material columns and their stock UOMs
+    materials: List[str]
+    uoms: Dict[str, str]
+    # Aligned with the input lines: {material: qty} (empty without BOM)
+    per_line: List[Dict[str, float]]
+    # Total consumption per material over all lines
+    totals: Dict[str, float]
+
+    def by_item(self, lines: List[Tuple[str, float]]) -> Dict[str, Dict[str, float]]:
+        """Per-line requirements summed by finished item code."""
+        result = {}
+        for (item_code, _), materials in zip(lines, self.per_line):
+            target = result.setdefault(item_code, {})
+            for material, qty in materials.items():
+                target[material] = target.get(material, 0) + qty
+        return result
+
+
+class MaterialPlanner:
+    """
+    Batch raw-material requirement for a sales day.
+
+    Flattened recipes (BOMService.get_flat_recipes) form a sparse coefficient
+    matrix R, one row per BOM and one column per leaf material, stored as
+    CSR arrays. For lines (item_code, qty) the total consumption is the
+    sparse product R^T * q, where q sums the line quantities per BOM; the
+    per-line requirement is the line's row of R scaled by its qty. NumPy is
+    used when installed, otherwise the same product runs over typed arrays.
+    """
+
+    def plan(
+        self,
+        lines: Iterable[Tuple[str, float]],
+        boms: Optional[Dict[str, Optional[str]]] = None
+    ) -> MaterialPlan:
+        """
+        Compute raw-material requirements for finished-item lines.
+
+        Args:
+            lines: (item_code, qty) pairs, e.g. one per sales row of a date
+            boms: item_code -> BOM name; default BOMs are resolved if omitted
+
+        Returns:
+            MaterialPlan with per-line and total requirements
+        """
+        lines = list(lines)
+        if boms is None:
+            boms = bom_service.get_default_boms(item_code for item_code, _ in lines)
+
+        bom_names = sorted({boms[item_code] for item_code, _ in lines if boms.get(item_code)})
+        recipes = bom_service.get_flat_recipes(bom_names)
+
+        # CSR coefficient matrix: BOM rows x material columns
+        materials = []
+        columns = {}
+        uoms = {}
+        indptr = array("l", [0])
+        indices = array("l")
+        data = array("d")
+        rows = {}
+        for bom in bom_names:
+            rows[bom] = len(rows)
+            for material, (per_unit, uom) in recipes.get(bom, {}).items():
+                if material not in columns:
+                    columns[material] = len(materials)
+                    materials.append(material)
+                    uoms[material] = uom
+                indices.append(columns[material])
+                data.append(per_unit)
+            indptr.append(len(indices))
+
+        # Sales vector: quantity per BOM row
+        line_rows = [rows.get(boms.get(item_code)) for item_code, _ in lines]
+        sales = array("d", [0.0]) * len(rows)
+        for (_, qty), row in zip(lines, line_rows):
+            if row is not None:
+                sales[row] += qty
+
+        totals = self._product(indptr, indices, data, sales, len(materials))
+
+        per_line = []
+        for (_, qty), row in zip(lines, line_rows):
+            if row is None:
+                per_line.append({})
+                continue
+            start, end = indptr[row], indptr[row + 1]
+            per_line.append({
+                materials[indices[k]]: data[k] * qty
+                for k in range(start, end)
+            })
+
+        return MaterialPlan(
+            materials=materials,
+            uoms=uoms,
+            per_line=per_line,
+            totals=dict(zip(materials, totals)),
+        )
+
+    @staticmethod
+    def _product(indptr, indices, data, sales, size: int) -> List[float]:
+        """R^T * sales for CSR arrays."""
+        if numpy is not None and size:
+            # array.array exposes the buffer protocol: no copies
+            row_of = numpy.repeat(numpy.arange(len(sales)), numpy.diff(numpy.asarray(indptr)))
+            weights = numpy.asarray(data) * numpy.asarray(sales)[row_of]
+            return numpy.bincount(numpy.asarray(indices), weights=weights, minlength=size).tolist()
+
+        totals = [0.0] * size
+        for row, qty in enumerate(sales):
+            if not qty:
+                continue
+            for k in range(indptr[row], indptr[row + 1]):
+                totals[indices[k]] += data[k] * qty
+        return totals
+
+
+# Singleton instance (not named after the module, which the package would shadow)
+planning_service = MaterialPlanner()
@@ -0,0 +1,244 @@
+import csv
+import os
+import zipfile
+from datetime import datetime
+from typing import Iterator, List, Optional, Tuple
+
+import frappe
+from frappe import _
+
+
+class SalesReader:
+    """
+    Base class for sales report readers.
+
+    A reader turns one file format into a stream of row value tuples;
+    ExcelService does header detection and row parsing on top of it, so
+    every format produces the same SalesRow stream.
+    """
+
+    # Registry name, also used in error messages
+    name = ""
+
+    def detect(self, head: bytes, file_path: str) -> bool:
+        """True if the file (first bytes in `head`) is in this format."""
+        raise NotImplementedError
+
+    def iter_rows(self, file_path: str) -> Iterator[Tuple]:
+        """Yield the first sheet's rows as tuples of cell values."""
+        raise NotImplementedError
+
+
+class XlsxReader(SalesReader):
+    """Office Open XML workbook via openpyxl (read-only, values only)."""
+
+    name = "xlsx"
+
+    def detect(self, head: bytes, file_path: str) -> bool:
+        return head.startswith(b"PK\x03\x04") and _zip_has(file_path, "xl/workbook.xml")
+
+    def iter_rows(self, file_path: str) -> Iterator[Tuple]:
+        from openpyxl import load_workbook
+
+        wb = load_workbook(file_path, read_only=True, data_only=True)
+        try:
+            yield from wb.active.iter_rows(values_only=True)
+        finally:
+            wb.close()
+
+
+class OdsReader(SalesReader):
+    """OpenDocument spreadsheet, streamed from content.xml with iterparse."""
+
+    name = "ods"
+
+    TABLE_NS = "urn:oasis:names:tc:opendocument:xmlns:table:1.0"
+    OFFICE_NS = "urn:oasis:names:tc:opendocument:xmlns:office:1.0"
+    TEXT_NS = "urn:oasis:names:tc:opendocument:xmlns:text:1.0"
+
+    # Repeated empty rows/cells pad sheets up to 1M rows; never expand those
+    MAX_REPEAT = 1000
+
+    def detect(self, head: bytes, file_path: str) -> bool:
+        if not head.startswith(b"PK\x03\x04"):
+            return False
+        try:
+            with zipfile.ZipFile(file_path) as zf:
+                return zf.read("mimetype").startswith(b"application/vnd.oasis.opendocument.spreadsheet")
+        except (KeyError, zipfile.BadZipFile):
+            return False
+
+    def iter_rows(self, file_path: str) -> Iterator[Tuple]:
+        from xml.etree.ElementTree import iterparse
+
+        table = f"{{{self.TABLE_NS}}}table"
+        row_tag = f"{{{self.TABLE_NS}}}table-row"
+        cell_tags = (f"{{{self.TABLE_NS}}}table-cell", f"{{{self.TABLE_NS}}}covered-table-cell")
+        repeated = f"{{{self.TABLE_NS}}}number-columns-repeated"
+        rows_repeated = f"{{{self.TABLE_NS}}}number-rows-repeated"
+
+        with zipfile.ZipFile(file_path) as zf, zf.open("content.xml") as content:
+            for event, elem in iterparse(content, events=("end",)):
+                if elem.tag == row_tag:
+                    values = []
+                    for cell in elem:
+                        if cell.tag not in cell_tags:
+                            continue
+                        value = self._cell_value(cell)
+                        count = int(cell.get(repeated, 1))
+                        values.extend([value] * (count if value is not None else min(count, self.MAX_REPEAT)))
+
+                    while values and values[-1] is None:
+                        values.pop()
+                    row = tuple(values)
+                    count = int(elem.get(rows_repeated, 1))
+                    for _ in range(count if row else min(count, self.MAX_REPEAT)):
+                        yield row
+                    elem.clear()
+                elif elem.tag == table:
+                    # First sheet only
+                    return
+
+    def _cell_value(self, cell):
+        value_type = cell.get(f"{{{self.OFFICE_NS}}}value-type")
+        if value_type in ("float", "currency", "percentage"):
+            return float(cell.get(f"{{{self.OFFICE_NS}}}value"))
+        if value_type == "date":
+            return datetime.fromisoformat(cell.get(f"{{{self.OFFICE_NS}}}date-value"))
+
+        text = "\n".join("".join(p.itertext()) for p in cell.iter(f"{{{self.TEXT_NS}}}p"))
+        return text or None
+
+
+class XlsReader(SalesReader):
+    """Legacy BIFF .xls workbook via xlrd (optional dependency)."""
+
+    name = "xls"
+
+    OLE2_MAGIC = b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1"
+
+    def detect(self, head: bytes, file_path: str) -> bool:
+        return head.startswith(self.OLE2_MAGIC)
+
+    def iter_rows(self, file_path: str) -> Iterator[Tuple]:
+        try:
+            import xlrd
+        except ImportError:
+            frappe.throw(_("xlrd not installed. Run: pip install xlrd (or save the report as .xlsx/.csv)"))
+
+        book = xlrd.open_workbook(file_path, on_demand=True)
+        try:
+            sheet = book.sheet_by_index(0)
+            for row_idx in range(sheet.nrows):
+                values = []
+                for cell in sheet.row(row_idx):
+                    if cell.ctype == xlrd.XL_CELL_DATE:
+                        values.append(xlrd.xldate_as_datetime(cell.value, book.datemode))
+                    elif cell.ctype in (xlrd.XL_CELL_EMPTY, xlrd.XL_CELL_BLANK):
+                        values.append(None)
+                    else:
+                        values.append(cell.value)
+                yield tuple(values)
+        finally:
+            book.release_resources()
+
+
+class CsvReader(SalesReader):
+    """Delimited text export (POS CSV), streamed with the csv module."""
+
+    name = "csv"
+
+    # POS exports are UTF-8 (often with BOM) or Windows-1251
+    ENCODINGS = ("utf-8-sig", "cp1251")
+    DELIMITERS = ";,\t|"
+    SNIFF_BYTES = 64 * 1024
+    SNIFF_LINES = 200
+
+    def detect(self, head: bytes, file_path: str) -> bool:
+        # Fallback reader: any text file without NUL bytes
+        return b"\x00" not in head
+
+    def iter_rows(self, file_path: str) -> Iterator[Tuple]:
+        encoding, delimiter = self._sniff(file_path)
+        with open(file_path, newline="", encoding=encoding) as f:
+            for row in csv.reader(f, delimiter=delimiter):
+                yield tuple(value if value != "" else None for value in row)
+
+    def _sniff(self, file_path: str) -> Tuple[str, str]:
+        """Detect (encoding, delimiter) from the start of the file."""
+        with open(file_path, "rb") as f:
+            sample = f.read(self.SNIFF_BYTES)
+
+        for encoding in self.ENCODINGS:
+            try:
+                text = sample.decode(encoding)
+                break
+            except UnicodeDecodeError:
+                # A multi-byte character may be cut at the sample end
+                try:
+                    text = sample[:-4].decode(encoding)
+                    break
+                except UnicodeDecodeError:
+                    continue
+        else:
+            frappe.throw(_("CSV fayl kodirovkasi aniqlanmadi (UTF-8 yoki Windows-1251 kutilgan)"))
+
+        # csv.Sniffer is thrown off by title lines above the header; pick the
+        # delimiter present on most lines instead
+        lines = text.splitlines()[:self.SNIFF_LINES]
+        delimiter = max(
+            self.DELIMITERS,
+            key=lambda d: (sum(1 for line in lines if d in line), sum(line.count(d) for line in lines))
+        )
+        return encoding, delimiter
+
+
+class ReaderRegistry:
+    """Ordered registry of sales report readers, detected by magic bytes."""
+
+    HEAD_BYTES = 8
+
+    def __init__(self):
+        self._readers: List[SalesReader] = []
+
+    def register(self, reader: SalesReader, first: bool = False):
+        """Add a reader; first=True gives it priority over existing ones."""
+        if first:
+            self._readers.insert(0, reader)
+        else:
+            self._readers.append(reader)
+
+    def get(self, name: str) -> Optional[SalesReader]:
+        return next((r for r in self._readers if r.name == name), None)
+
+    def detect(self, file_path: str) -> SalesReader:
+        """Return the reader for a file, by content (not extension)."""
+        with open(file_path, "rb") as f:
+            head = f.read(self.HEAD_BYTES)
+
+        for reader in self._readers:
+            if reader.detect(head, file_path):
+                return reader
+
+        frappe.throw(_("Fayl formati qo'llab-quvvatlanmaydi: {0}").format(os.path.basename(file_path)))
+
+    @property
+    def names(self) -> List[str]:
+        return [r.name for r in self._readers]
+
+
+def _zip_has(file_path: str, member: str) -> bool:
+    try:
+        with zipfile.ZipFile(file_path) as zf:
+            zf.getinfo(member)
+            return True
+    except (KeyError, zipfile.BadZipFile):
+        return False
+
+
+# Singleton registry; CSV is the catch-all and must stay last
+reader_registry = ReaderRegistry()
+reader_registry.register(XlsxReader())
+reader_registry.register(OdsReader())
+reader_registry.register(XlsReader())
+reader_registry.register(CsvReader())
@@ -4,8 +4,10 @@ from contextlib import contextmanager
 
 import frappe
 from frappe import _
+from frappe.utils import flt
 
-from jazira_app.jazira_app.services.bom_service import bom_service
+from jazira_app.jazira_app.services.bom_service import bom_service, RawMaterial
+from jazira_app.jazira_app.services.material_planner import planning_service, MaterialPlan
 
 
 @dataclass
@@ -16,6 +18,8 @@ class StockEntryConfig:
     posting_date: str
     posting_time: str = "23:59:59"
     allow_negative_stock: bool = True
+    # One Repack entry for the whole date instead of one Manufacture per item
+    consolidated: bool = False
 
 
 class StockService:
@@ -25,6 +29,7 @@ class StockService:
     Handles Manufacture Stock Entry creation for restaurant workflow:
     - Single warehouse mode (Variant A)
     - Batched items (Multiple finished items in one Stock Entry if supported)
+    - Consolidated mode: one Repack Stock Entry per date and warehouse
     """
     
     @contextmanager
@@ -46,18 +51,22 @@ class StockService:
         items: List[Dict],
         config: StockEntryConfig,
         submit: bool = True,
+        boms: Optional[Dict[str, str]] = None,
         **kwargs
     ) -> List[str]:
         """
         Create Manufacture Stock Entries for items with BOM.
         
         Creates one Stock Entry per item (ERPNext requires exactly 1
-        finished item per Manufacture Stock Entry).
+        finished item per Manufacture Stock Entry), or a single Repack
+        entry for all items when config.consolidated is set.
         
         Args:
-            items: List of items with 'item_code', 'qty', 'bom' keys
+            items: Sales lines with 'item_code' and 'qty' (dicts or ImportLine)
             config: Stock entry configuration
             submit: Whether to submit entries
+            boms: item_code -> BOM (e.g. from categorize_items_by_bom);
+                defaults to each item's 'bom' key
             
         Returns:
             List of created Stock Entry names
@@ -66,10 +75,38 @@ class StockService:
             return []
         
         created_entries = []
+        if boms is None:
+            boms = {item.get("item_code"): item.get("bom") for item in items}
+
+        # Raw materials of every item in one batch (flattened BOMs x sales qty)
+        plan = planning_service.plan(
+            [(item.get("item_code"), item.get("qty", 0)) for item in items],
+            boms=boms
+        )
+        stock_uoms = dict(frappe.get_all(
+            "Item",
+            filters={"name": ["in", list({item.get("item_code") for item in items})]},
+            fields=["name", "stock_uom"],
+            as_list=True
+        ))
+
+        if config.consolidated:
+            with self._stock_flags(config.allow_negative_stock, mute_messages=True):
+                entry_name = self._create_consolidated_entry(items, boms, plan, stock_uoms, config, submit)
+            return [entry_name] if entry_name else []
         
-        for item in items:
+        for item, materials in zip(items, plan.per_line):
+            raw_materials = [
+                RawMaterial(item_code=code, qty=qty, uom=plan.uoms[code])
+                for code, qty in materials.items()
+            ]
             with self._stock_flags(config.allow_negative_stock, mute_messages=True):
-                entry_name = self._create_single_manufacture_entry(item, config, submit)
+                entry_name = self._create_single_manufacture_entry(
+                    item, config, submit,
+                    bom=boms.get(item.get("item_code")),
+                    raw_materials=raw_materials,
+                    stock_uom=stock_uoms.get(item.get("item_code"))
+                )
                 if entry_name:
                     created_entries.append(entry_name)
         
@@ -79,18 +116,22 @@ class StockService:
         self,
         item: Dict,
         config: StockEntryConfig,
-        submit: bool
+        submit: bool,
+        bom: Optional[str] = None,
+        raw_materials: Optional[List[RawMaterial]] = None,
+        stock_uom: Optional[str] = None
     ) -> Optional[str]:
         """Create a single Stock Entry for one finished item."""
         item_code = item.get("item_code")
         qty = item.get("qty", 0)
-        bom = item.get("bom")
+        bom = bom or item.get("bom")
         
         if not all([item_code, qty > 0, bom]):
             return None
         
-        # Get raw materials from BOM
-        raw_materials = bom_service.get_raw_materials(bom, qty)
+        # Get raw materials from BOM (unless planned by the caller)
+        if raw_materials is None:
+            raw_materials = bom_service.get_raw_materials(bom, qty)
         if not raw_materials:
             return None
         
@@ -118,7 +159,7 @@ class StockService:
             })
         
         # Add finished item (produced)
-        item_uom = frappe.db.get_value("Item", item_code, "stock_uom") or "Nos"
+        item_uom = stock_uom or frappe.db.get_value("Item", item_code, "stock_uom") or "Nos"
         se.append("items", {
             "item_code": item_code,
             "qty": qty,
@@ -139,6 +180,161 @@ class StockService:
             
         return se.name
 
+    def _create_consolidated_entry(
+        self,
+        items: List[Dict],
+        boms: Dict[str, str],
+        plan: MaterialPlan,
+        stock_uoms: Dict[str, str],
+        config: StockEntryConfig,
+        submit: bool
+    ) -> Optional[str]:
+        """
+        Create one Repack Stock Entry for all finished items of a date.
+
+        Raw materials are consumed as one row per material (plan totals) and
+        finished items received as one row per item and BOM. ERPNext cannot
+        split the consumed value between different finished items of a
+        Repack, so the draft carries each finished row's planned cost (its
+        BOM materials x current valuation rate) as a share only. The value
+        booked is the one ERPNext computes for the consumed rows at submit,
+        see _value_repack_from_consumption.
+        """
+        finished = {}
+        for item, materials in zip(items, plan.per_line):
+            item_code, qty = item.get("item_code"), item.get("qty", 0)
+            bom = boms.get(item_code)
+            if not (item_code and qty > 0 and bom and materials):
+                continue
+            row = finished.setdefault((item_code, bom), {"qty": 0, "materials": {}})
+            row["qty"] += qty
+            for code, material_qty in materials.items():
+                row["materials"][code] = row["materials"].get(code, 0) + material_qty
+
+        if not finished:
+            return None
+
+        consumed = {}
+        for row in finished.values():
+            for code, material_qty in row["materials"].items():
+                consumed[code] = consumed.get(code, 0) + material_qty
+        rates = self._valuation_rates(list(consumed), config.warehouse)
+
+        se = frappe.new_doc("Stock Entry")
+        se.stock_entry_type = "Repack"
+        se.purpose = "Repack"
+        se.set_posting_time = 1
+        se.company = config.company
+        se.posting_date = config.posting_date
+        se.posting_time = config.posting_time
+        se.from_warehouse = config.warehouse
+        se.to_warehouse = config.warehouse
+
+        for code, material_qty in consumed.items():
+            se.append("items", {
+                "item_code": code,
+                "qty": material_qty,
+                "uom": plan.uoms[code],
+                "s_warehouse": config.warehouse,
+                "t_warehouse": None,
+                "is_finished_item": 0,
+                "allow_zero_valuation_rate": 1
+            })
+
+        for (item_code, bom), row in finished.items():
+            cost = sum(material_qty * rates.get(code, 0) for code, material_qty in row["materials"].items())
+            se.append("items", {
+                "item_code": item_code,
+                "qty": row["qty"],
+                "uom": stock_uoms.get(item_code) or "Nos",
+                "s_warehouse": None,
+                "t_warehouse": config.warehouse,
+                "is_finished_item": 1,
+                "bom_no": bom,
+                "basic_rate": cost / row["qty"],
+                "set_basic_rate_manually": 1,
+                "allow_zero_valuation_rate": 1
+            })
+
+        se.flags.ignore_permissions = True
+        se.insert()
+
+        if submit:
+            self._value_repack_from_consumption(se)
+            se.submit()
+
+        return se.name
+
+    def _value_repack_from_consumption(self, se):
+        """
+        Value the finished rows of a consolidated Repack from the actual consumption.
+
+        Must run right before submit (drafts of parallel imports are built
+        before earlier dates post). ERPNext rates the consumed rows from the
+        stock ledger at the entry's posting time (FIFO / moving average,
+        backdated, negative stock); that value is split over the finished
+        rows by their planned cost share, so the entry has no value
+        difference and each item keeps its own cost.
+        """
+        consumed_value = se.set_rate_for_outgoing_items(reset_outgoing_rate=True, raise_error_if_no_rate=False)
+        finished = [row for row in se.get("items") if row.is_finished_item]
+        planned = [flt(row.basic_rate) * flt(row.qty) for row in finished]
+        total_planned = sum(planned)
+        total_qty = sum(flt(row.qty) for row in finished)
+
+        for row, cost in zip(finished, planned):
+            if not flt(row.qty):
+                continue
+            share = cost / total_planned if total_planned else flt(row.qty) / total_qty
+            row.basic_rate = flt(consumed_value) * share / flt(row.qty)
+            row.set_basic_rate_manually = 1
+
+    def _valuation_rates(self, item_codes: List[str], warehouse: str) -> Dict[str, float]:
+        """Current valuation rate per item in the warehouse (Item.valuation_rate fallback)."""
+        if not item_codes:
+            return {}
+
+        rates = dict(frappe.get_all(
+            "Bin",
+            filters={"item_code": ["in", item_codes], "warehouse": warehouse},
+            fields=["item_code", "valuation_rate"],
+            as_list=True
+        ))
+        missing = [code for code in item_codes if not rates.get(code)]
+        if missing:
+            rates.update(frappe.get_all(
+                "Item",
+                filters={"name": ["in", missing]},
+                fields=["name", "valuation_rate"],
+                as_list=True
+            ))
+        return {code: rate or 0 for code, rate in rates.items()}
+
+    def submit_stock_entries(self, entry_names: List[str], allow_negative_stock: bool = True) -> int:
+        """
+        Submit draft Stock Entries in the given order.
+
+        Used when drafts are built in parallel and posted later in date order.
+
+        Args:
+            entry_names: Draft Stock Entry names
+            allow_negative_stock: Allow negative stock while submitting
+
+        Returns:
+            Number of submitted entries
+        """
+        submitted = 0
+        with self._stock_flags(allow_negative_stock, mute_messages=True):
+            for name in entry_names:
+                se = frappe.get_doc("Stock Entry", name)
+                if se.docstatus == 0:
+                    se.flags.ignore_permissions = True
+                    if se.purpose == "Repack":
+                        self._value_repack_from_consumption(se)
+                    se.submit()
+                    submitted += 1
+        return submitted
+
     def cancel_stock_entries(self, entry_names: List[str]) -> int:
         """Cancel multiple Stock Entries."""
         cancelled = 0
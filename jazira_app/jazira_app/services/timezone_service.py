@@ -0,0 +1,122 @@
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List
+
+import frappe
+import pytz
+
+
+_UNIX_EPOCH = datetime(1970, 1, 1)
+
+
+class TimezoneService:
+    """
+    Service for converting UTC epochs to the site (System Settings) timezone.
+
+    The timezone is resolved once per worker and site and kept as a tzinfo
+    object. Saving System Settings rotates a generation token in Redis; each
+    worker compares it once per request and reloads when it changed.
+    """
+
+    GENERATION_KEY = "timezone_service:generation"
+
+    # Offsets are memoized per bucket; DST transitions fall on bucket edges
+    OFFSET_BUCKET = 3600  # seconds
+
+    def __init__(self):
+        # site -> {"generation": token, "name": str, "tzinfo": tzinfo}
+        self._sites: Dict[str, Dict] = {}
+
+    def get_timezone_name(self) -> str:
+        """Return the site timezone name (e.g. Asia/Tashkent)."""
+        return self._state()["name"]
+
+    def get_tzinfo(self):
+        """Return the cached tzinfo for the site timezone."""
+        return self._state()["tzinfo"]
+
+    def epoch_to_local(self, epoch: float) -> datetime:
+        """
+        Convert Unix epoch (UTC) to a naive datetime in the site timezone.
+
+        Args:
+            epoch: Unix timestamp in seconds (UTC)
+
+        Returns:
+            Naive datetime in system timezone for ERPNext storage
+        """
+        return self._to_local(epoch, self.get_tzinfo())
+
+    def epochs_to_local(self, epochs: Iterable[float]) -> List[datetime]:
+        """
+        Vectorized epoch_to_local for bulk and offline replay paths.
+
+        The UTC offset is computed once per hour bucket instead of once per
+        epoch; buckets that contain a DST transition fall back to the exact
+        per-epoch conversion.
+
+        Args:
+            epochs: Unix timestamps in seconds (UTC)
+
+        Returns:
+            Naive datetimes in system timezone, aligned with epochs
+        """
+        tz = self.get_tzinfo()
+        offsets = {}
+        result = []
+
+        for epoch in epochs:
+            bucket = int(epoch) // self.OFFSET_BUCKET
+            offset = offsets.get(bucket)
+            if offset is None:
+                start = bucket * self.OFFSET_BUCKET
+                first = self._utcoffset(start, tz)
+                last = self._utcoffset(start + self.OFFSET_BUCKET - 1, tz)
+                offset = first if first == last else False
+                offsets[bucket] = offset
+
+            if offset is False:
+                result.append(self._to_local(epoch, tz))
+            else:
+                result.append(_UNIX_EPOCH + timedelta(seconds=epoch) + offset)
+
+        return result
+
+    def clear(self):
+        """Force every worker to reload the timezone on its next request."""
+        frappe.cache().set_value(self.GENERATION_KEY, frappe.generate_hash(length=10))
+        self._sites.pop(frappe.local.site, None)
+
+    def _state(self) -> Dict:
+        """Return this site's cached timezone, reloading stale generations."""
+        site = frappe.local.site
+        # get_value is memoized per request, so this is one Redis GET per request
+        generation = frappe.cache().get_value(self.GENERATION_KEY)
+
+        state = self._sites.get(site)
+        if state is None or state["generation"] != generation:
+            name = frappe.db.get_single_value("System Settings", "time_zone") or "UTC"
+            state = {
+                "generation": generation,
+                "name": name,
+                "tzinfo": pytz.timezone(name),
+            }
+            self._sites[site] = state
+
+        return state
+
+    @staticmethod
+    def _to_local(epoch: float, tz) -> datetime:
+        return datetime.fromtimestamp(epoch, timezone.utc).astimezone(tz).replace(tzinfo=None)
+
+    @staticmethod
+    def _utcoffset(epoch: float, tz) -> timedelta:
+        return datetime.fromtimestamp(epoch, timezone.utc).astimezone(tz).utcoffset()
+
+
+# Singleton instance
+timezone_service = TimezoneService()
+
+
+def on_system_settings_change(doc, method=None):
+    """System Settings saved: the time zone may have changed."""
+    timezone_service.clear()
@@ -0,0 +1,191 @@
+"""
+Benchmarks for the daily sales import pipeline.
+
+    bench --site <site> bench-sales-import --rows 50000
+
+Generates a POS-style sales report of the requested size in the site's
+private files, runs each parser on it and reports wall time and peak
+Python memory (tracemalloc). The generated file is removed afterwards.
+The per-date item handling of the import loop is measured the same way.
+"""
+
+import copy
+import csv
+import itertools
+import os
+import random
+import time
+import tracemalloc
+from collections import defaultdict
+from datetime import date, timedelta
+from typing import Callable, Dict
+
+import frappe
+
+
+def sales_report_rows(rows: int, days: int = 7, items: int = 300, seed: int = 0):
+    """
+    Rows of a sales report in the same layout as the POS export.
+
+    Args:
+        rows: Data rows
+        days: Distinct dates in the "Sana" column
+        items: Distinct item names
+        seed: Random seed (reproducible files)
+    """
+    rnd = random.Random(seed)
+    start = date.today() - timedelta(days=days)
+
+    yield ["Kunlik savdo hisoboti"]
+    yield ["Nomi", "Soni", "Narxi", "Sana"]
+    for _ in range(rows):
+        yield [
+            f"Mahsulot {rnd.randrange(items):04d}",
+            rnd.randint(1, 5),
+            rnd.choice((15000, 22000, 35000, 48000)),
+            start + timedelta(days=rnd.randrange(days)),
+        ]
+    yield ["Jami", None, None, None]
+
+
+def make_sales_workbook(file_path: str, rows: int, **kwargs):
+    """Write a generated sales report as .xlsx (see sales_report_rows)."""
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Sotuvlar")
+    for row in sales_report_rows(rows, **kwargs):
+        ws.append(row)
+    wb.save(file_path)
+
+
+def make_sales_csv(file_path: str, rows: int, **kwargs):
+    """Write a generated sales report as a ;-separated POS CSV export."""
+    with open(file_path, "w", newline="", encoding="utf-8-sig") as f:
+        writer = csv.writer(f, delimiter=";")
+        for row in sales_report_rows(rows, **kwargs):
+            writer.writerow([
+                value.strftime("%d.%m.%Y") if isinstance(value, date) else value
+                for value in row
+            ])
+
+
+def measure(func: Callable, *args, **kwargs) -> Dict:
+    """Run func once; return seconds, peak traced memory (MB) and the result."""
+    tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        result = func(*args, **kwargs)
+    finally:
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    return {"seconds": round(elapsed, 3), "peak_mb": round(peak / 1024 / 1024, 1), "result": result}
+
+
+def benchmark_excel_parsers(rows: int = 50000) -> Dict:
+    """
+    Compare the legacy and streaming xlsx parsers, the CSV reader and a
+    parse cache hit on the same generated report.
+
+    Args:
+        rows: Data rows in the generated report
+
+    Returns:
+        {parser: {"seconds", "peak_mb", "items"}}
+    """
+    from jazira_app.jazira_app.services import excel_service
+
+    file_name = f"bench_sales_{frappe.generate_hash(length=8)}"
+    file_url = f"/private/files/{file_name}.xlsx"
+    file_path = frappe.get_site_path("private", "files", f"{file_name}.xlsx")
+    csv_url = f"/private/files/{file_name}.csv"
+    csv_path = frappe.get_site_path("private", "files", f"{file_name}.csv")
+
+    make_sales_workbook(file_path, rows)
+    make_sales_csv(csv_path, rows)
+    try:
+        report = {"rows": rows, "file_mb": round(os.path.getsize(file_path) / 1024 / 1024, 2)}
+        parsers = {
+            "legacy": lambda: excel_service.read_sales_report(file_url, streaming=False),
+            "streaming": lambda: excel_service.read_sales_report(file_url),
+            "csv": lambda: excel_service.read_sales_report(csv_url),
+            # load_sales_report after the first parse: Redis hit + decode
+            "cached": lambda: excel_service.load_sales_report(file_url),
+        }
+        excel_service.load_sales_report(file_url)
+        frappe.local.sales_report_cache = {}
+        for name, parser in parsers.items():
+            run = measure(parser)
+            report[name] = {
+                "seconds": run["seconds"],
+                "peak_mb": run["peak_mb"],
+                "items": len(run["result"]["items"]),
+            }
+        return report
+    finally:
+        os.remove(file_path)
+        os.remove(csv_path)
+
+
+def benchmark_date_loop(rows: int = 11000, days: int = 30) -> Dict:
+    """
+    Item handling of the per-date import loop: the former deep copy of
+    each date's item dicts vs shared ImportLine records with the index
+    partitions of categorize_items_by_bom. BOM lookups are warmed up first,
+    so both runs measure only item allocation.
+
+    Args:
+        rows: Sales lines
+        days: Distinct dates
+
+    Returns:
+        {"deepcopy": {...}, "records": {...}} with seconds and peak_mb
+    """
+    from jazira_app.jazira_app.services import bom_service, ImportLine
+
+    def make_dicts():
+        data = itertools.islice(sales_report_rows(rows, days=days), 2, rows + 2)
+        return [
+            {
+                "item_name": name, "item_code": name, "qty": qty, "rate": rate,
+                "row_num": row_num, "date": str(day),
+                "match_score": 1.0, "match_method": "exact", "found": True,
+            }
+            for row_num, (name, qty, rate, day) in enumerate(data, 3)
+        ]
+
+    items = make_dicts()
+    lines = [ImportLine.from_item(item) for item in items]
+    boms = bom_service.get_default_boms(item["item_code"] for item in items)
+
+    def by_date(records):
+        grouped = defaultdict(list)
+        for record in records:
+            grouped[record.get("date")].append(record)
+        return grouped
+
+    def deepcopy_loop():
+        for date_items in by_date(items).values():
+            date_items_copy = copy.deepcopy(date_items)
+            for item in date_items_copy:
+                item["bom"] = boms.get(item["item_code"])
+                item["has_bom"] = bool(item["bom"])
+
+    def records_loop():
+        for date_items in by_date(lines).values():
+            categorized = bom_service.categorize_items_by_bom(date_items)
+            [date_items[i] for i in categorized["with_bom"]]
+
+    report = {
+        "rows": rows,
+        "days": days,
+        # Retained size of the item list itself
+        "dicts_mb": measure(make_dicts)["peak_mb"],
+        "records_mb": measure(lambda: [ImportLine.from_item(item) for item in items])["peak_mb"],
+    }
+    for name, loop in (("deepcopy", deepcopy_loop), ("records", records_loop)):
+        run = measure(loop)
+        report[name] = {"seconds": run["seconds"], "peak_mb": run["peak_mb"]}
+    return report
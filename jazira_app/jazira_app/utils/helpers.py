@@ -1,7 +1,20 @@
 import hashlib
+import os
+import threading
+from collections import OrderedDict
 from typing import Any, Optional
 
 import frappe
+from frappe import _
+
+
+# File hashing: streamed in chunks, memoized per worker by (path, size, mtime)
+HASH_CHUNK_SIZE = 1024 * 1024
+HASH_MEMO_SIZE = 256
+HASH_ALGORITHMS = ("md5", "xxh3")
+_hash_memo: "OrderedDict[tuple, str]" = OrderedDict()
+# Shared by the threads of a gunicorn/RQ worker
+_hash_memo_lock = threading.Lock()
 
 
 def parse_numeric(value: Any) -> float:
@@ -67,26 +80,82 @@ def parse_numeric(value: Any) -> float:
         return 0.0
 
 
-def calculate_file_hash(file_url: str) -> str:
+def calculate_file_hash(file_url: str, algorithm: Optional[str] = None) -> str:
     """
-    Calculate MD5 hash of a file for duplicate detection.
+    Calculate content hash of a file for duplicate detection.
+    
+    The file is streamed in HASH_CHUNK_SIZE chunks (constant memory) and the
+    result is memoized per worker by (path, size, mtime), so repeated calls
+    for an unchanged file cost one stat().
     
     Args:
         file_url: Frappe file URL (e.g., /private/files/test.xlsx)
+        algorithm: "md5" (default) or "xxh3" (faster, non-cryptographic;
+            needs the xxhash package). Defaults to site_config
+            "sales_import_hash_algorithm". xxh3 hashes are prefixed
+            ("xxh3:...") so they never match stored md5 values; imports
+            hashed before a switch are not detected as duplicates.
         
     Returns:
-        str: MD5 hash string, empty string if file not found
+        str: Hash string, empty string if file not found
+    
+    Raises:
+        frappe.ValidationError: Unknown algorithm, or xxh3 without xxhash
+            (no silent fallback, which would change every hash)
     """
     file_path = get_file_path(file_url)
     
     if not file_path:
         return ""
     
+    algorithm = algorithm or frappe.conf.get("sales_import_hash_algorithm") or "md5"
+    if algorithm not in HASH_ALGORITHMS:
+        frappe.throw(_("Noma'lum hash algoritmi: {0}").format(algorithm))
+    
     try:
-        with open(file_path, "rb") as f:
-            return hashlib.md5(f.read()).hexdigest()
+        stat = os.stat(file_path)
+        key = (file_path, stat.st_size, stat.st_mtime_ns, algorithm)
+        with _hash_memo_lock:
+            cached = _hash_memo.get(key)
+            if cached is not None:
+                _hash_memo.move_to_end(key)
+                return cached
+        
+        # Hash outside the lock; a concurrent miss only hashes twice
+        digest = _hash_file(file_path, algorithm)
     except (IOError, OSError):
         return ""
+    
+    with _hash_memo_lock:
+        _hash_memo[key] = digest
+        if len(_hash_memo) > HASH_MEMO_SIZE:
+            _hash_memo.popitem(last=False)
+    
+    return digest
+
+
+def _hash_file(file_path: str, algorithm: str) -> str:
+    """Stream a file through the hasher into a reused buffer."""
+    prefix = ""
+    if algorithm == "xxh3":
+        try:
+            import xxhash
+        except ImportError:
+            frappe.throw(_("sales_import_hash_algorithm = xxh3 uchun xxhash paketi o'rnatilmagan"))
+        hasher, prefix = xxhash.xxh3_128(), "xxh3:"
+    else:
+        hasher = hashlib.md5()
+    
+    buffer = bytearray(HASH_CHUNK_SIZE)
+    view = memoryview(buffer)
+    with open(file_path, "rb", buffering=0) as f:
+        while True:
+            size = f.readinto(buffer)
+            if not size:
+                break
+            hasher.update(view[:size])
+    
+    return prefix + hasher.hexdigest()
 
 
 def get_file_path(file_url: str) -> Optional[str]:
@@ -6,21 +6,6 @@ class ValidationError(Exception):
     """Custom exception for validation errors."""
     pass
 
-# Hardcoded mapping for known misspellings or common variations
-ITEM_MAPPING = {
-    'Картошка чипс 100 гр': 'Картошка чипс зг',
-    'Ок соус (собой)': 'Ок соус (стол)',
-    'Пицца гуштли катта': 'Пицца гуштли',
-    'Кизил соус (собой)': 'Кизил соус (стол)',
-
-    'Фанта 2л (товар)': 'Фанта 2л',
-    'Пизза Пеперони': 'Пицца Пеперони',
-    'Пизза Пеперони кичик': 'Пицца Пеперони кичик',
-    'Бардак чой чойнак': 'Бардак чой',
-    'гошт 100 гр': 'гошт 50 гр', # Closest match if 100 is not there
-    'Хот-дог булочкали (15000)': 'Хот-дог',
-}
-
 def validate_import_prerequisites(
     company: str,
     source_warehouse: str,
@@ -53,50 +38,49 @@ def validate_warehouse_company(warehouse: str, company: str):
         )
 
 def validate_items_exist(items: List[Dict]) -> Dict:
-    """Validate that all items exist in ERPNext, with mapping support."""
+    """Validate that all items exist in ERPNext, with Sales Item Alias support."""
+    # services import utils at module level
+    from jazira_app.jazira_app.services.item_matcher import item_matcher
+
     valid_items = []
     errors = []
-    
-    # Cache for found items to speed up 11k rows
-    item_cache = {}
-    
+
+    # Resolve every distinct name at once (aliases and in-memory indexes)
+    names = {item.get("item_name", "").strip() for item in items}
+    names.discard("")
+    matches = item_matcher.resolve(names)
+
     for item in items:
         original_name = item.get("item_name", "").strip()
         row_num = item.get("row_num", 0)
-        
+
         if not original_name:
             continue
 
-        if original_name in item_cache:
-            item_code = item_cache[original_name]
-        else:
-            # 1. Apply mapping
-            search_name = ITEM_MAPPING.get(original_name, original_name)
-            
-            # 2. Try exact match on name (Item Code)
-            item_code = frappe.db.get_value("Item", {"name": search_name}, "name")
-            
-            # 3. Try exact match on item_name
-            if not item_code:
-                item_code = frappe.db.get_value("Item", {"item_name": search_name}, "name")
-            
-            # 4. Try partial match if still not found
-            if not item_code:
-                item_code = frappe.db.get_value("Item", {"item_name": ["like", f"%{search_name}%"]}, "name")
-            
-            item_cache[original_name] = item_code
+        match = matches[original_name]
+        item["match_score"] = match.score
+        item["match_method"] = match.method
 
-        if item_code:
-            item["item_code"] = item_code
+        if match.item_code:
+            item["item_code"] = match.item_code
             item["found"] = True
             valid_items.append(item)
         else:
-            errors.append({
+            error = {
                 "row": row_num,
+                "rows": item.get("row_nums") or [row_num],
                 "item_name": original_name,
                 "error": _("Item topilmadi: '{0}'").format(original_name)
-            })
-    
+            }
+            if match.candidate:
+                # Low-confidence fuzzy match: shown to the user, never chosen
+                item["suggested_item_code"] = match.candidate
+                error["suggested_item_code"] = match.candidate
+                error["error"] = _("Item topilmadi: '{0}' (ehtimol: {1}, {2}%)").format(
+                    original_name, match.candidate, round(match.score * 100)
+                )
+            errors.append(error)
+
     return {
         "valid_items": valid_items,
         "errors": errors,
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2026, Jazira App
+# License: MIT
+
+"""
+Patch: Sales Item Alias jadvalini to'ldirish
+============================================
+
+Daily sales import avval POS nomi variantlarini validators.ITEM_MAPPING
+lug'atida saqlardi. Endi ular Sales Item Alias doctype'ida; bu patch eski
+lug'atni (source = Migrated) ko'chiradi. Maqsad nomi Item'ga mos kelmasa,
+alias yaratilmaydi.
+"""
+
+import frappe
+
+
+ITEM_MAPPING = {
+    'Картошка чипс 100 гр': 'Картошка чипс зг',
+    'Ок соус (собой)': 'Ок соус (стол)',
+    'Пицца гуштли катта': 'Пицца гуштли',
+    'Кизил соус (собой)': 'Кизил соус (стол)',
+
+    'Фанта 2л (товар)': 'Фанта 2л',
+    'Пизза Пеперони': 'Пицца Пеперони',
+    'Пизза Пеперони кичик': 'Пицца Пеперони кичик',
+    'Бардак чой чойнак': 'Бардак чой',
+    'гошт 100 гр': 'гошт 50 гр',
+    'Хот-дог булочкали (15000)': 'Хот-дог',
+}
+
+
+def execute():
+    from jazira_app.jazira_app.services.item_matcher import item_matcher
+
+    targets = item_matcher.match_many(ITEM_MAPPING.values())
+    item_matcher.learn_aliases(
+        {alias: targets[target] for alias, target in ITEM_MAPPING.items() if targets.get(target)},
+        source="Migrated"
+    )